@@ -0,0 +1,50 @@
+-- Summary views behind /admin/analytics.
+-- Each view has a unique index so it can be refreshed with
+-- REFRESH MATERIALIZED VIEW CONCURRENTLY without blocking readers.
+
+CREATE MATERIALIZED VIEW analytics_book_utilization AS
+SELECT b.book_id,
+       b.title,
+       COALESCE(b.genre, 'unknown') AS genre,
+       b.units,
+       COUNT(r.reservation_id) FILTER (WHERE r.end_time > NOW()) AS active_reservations,
+       COUNT(r.reservation_id) AS total_reservations,
+       COALESCE(SUM(r.price), 0) AS revenue
+FROM books b
+LEFT JOIN reservations r ON r.book_id = b.book_id
+GROUP BY b.book_id;
+
+CREATE UNIQUE INDEX idx_analytics_book_utilization ON analytics_book_utilization(book_id);
+
+CREATE MATERIALIZED VIEW analytics_genre_revenue AS
+SELECT COALESCE(b.genre, 'unknown') AS genre,
+       COUNT(r.reservation_id) AS reservations,
+       COALESCE(SUM(r.price), 0) AS revenue
+FROM books b
+LEFT JOIN reservations r ON r.book_id = b.book_id
+GROUP BY COALESCE(b.genre, 'unknown');
+
+CREATE UNIQUE INDEX idx_analytics_genre_revenue ON analytics_genre_revenue(genre);
+
+CREATE MATERIALIZED VIEW analytics_queue_depth AS
+SELECT book_id,
+       COUNT(*) AS waiting
+FROM reservation_queue
+GROUP BY book_id;
+
+CREATE UNIQUE INDEX idx_analytics_queue_depth ON analytics_queue_depth(book_id);
+
+CREATE MATERIALIZED VIEW analytics_tier_mix AS
+SELECT COALESCE(subscription_model, 'free') AS subscription_model,
+       COUNT(*) AS customers
+FROM customers
+GROUP BY COALESCE(subscription_model, 'free');
+
+CREATE UNIQUE INDEX idx_analytics_tier_mix ON analytics_tier_mix(subscription_model);
+
+-- When the views above were last refreshed, by whichever worker did it.
+-- A single row; the id check keeps it that way.
+CREATE TABLE analytics_refresh (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    refreshed_at TIMESTAMP NOT NULL
+);
@@ -6,3 +6,5 @@ CREATE TABLE authors (
     bank_account_number VARCHAR(50),
     bio TEXT
 );
+
+CREATE UNIQUE INDEX idx_authors_user_id ON authors(user_id);
@@ -1,7 +1,12 @@
 CREATE TABLE cities (
     city_id SERIAL PRIMARY KEY,
     name VARCHAR(100) NOT NULL,
-    province VARCHAR(100),
+    -- NOT NULL so the (name, province) key matches cities without a province too
+    province VARCHAR(100) NOT NULL DEFAULT '',
     country VARCHAR(100) DEFAULT 'Iran',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
\ No newline at end of file
+);
+
+CREATE INDEX idx_cities_name_id ON cities(name, city_id);
+
+CREATE UNIQUE INDEX idx_cities_name_province ON cities(name, province);
@@ -0,0 +1,40 @@
+-- Brings an existing cities table in line with cities.sql: province becomes
+-- NOT NULL DEFAULT '' and (name, province) unique. Duplicate cities are
+-- merged into the one with the lowest city_id before the index is built.
+BEGIN;
+
+UPDATE cities SET province = '' WHERE province IS NULL;
+
+CREATE TEMP TABLE city_duplicates ON COMMIT DROP AS
+SELECT city_id, keep_id
+FROM (
+    SELECT city_id, MIN(city_id) OVER (PARTITION BY name, province) AS keep_id
+    FROM cities
+) ranked
+WHERE city_id <> keep_id;
+
+-- Older schemas store the author's city as text; only city_id needs repointing
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'authors' AND column_name = 'city_id'
+    ) THEN
+        UPDATE authors a
+        SET city_id = d.keep_id
+        FROM city_duplicates d
+        WHERE a.city_id = d.city_id;
+    END IF;
+END $$;
+
+DELETE FROM cities c
+USING city_duplicates d
+WHERE c.city_id = d.city_id;
+
+ALTER TABLE cities
+    ALTER COLUMN province SET DEFAULT '',
+    ALTER COLUMN province SET NOT NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_cities_name_province ON cities(name, province);
+
+COMMIT;
@@ -3,4 +3,6 @@ CREATE TABLE genres (
     name VARCHAR(50) NOT NULL UNIQUE,
     description TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
\ No newline at end of file
+);
+
+CREATE INDEX idx_genres_name_id ON genres(name, genre_id);
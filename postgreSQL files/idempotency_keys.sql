@@ -0,0 +1,12 @@
+CREATE TABLE idempotency_keys (
+    username VARCHAR(50) NOT NULL,
+    idempotency_key VARCHAR(255) NOT NULL,
+    endpoint VARCHAR(100) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    status_code INT NOT NULL,
+    response TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (username, idempotency_key)
+);
+
+CREATE INDEX idx_idempotency_keys_created_at ON idempotency_keys(created_at);
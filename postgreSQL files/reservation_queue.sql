@@ -0,0 +1,10 @@
+CREATE TABLE reservation_queue (
+    queue_id SERIAL PRIMARY KEY,
+    customer_id INT REFERENCES customers(customer_id),
+    book_id INT REFERENCES books(book_id),
+    days INT NOT NULL,
+    request_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_reservation_queue_book ON reservation_queue(book_id, request_time, queue_id);
+CREATE INDEX idx_reservation_queue_customer ON reservation_queue(customer_id);
@@ -5,4 +5,6 @@ CREATE TABLE reservations (
     start_time TIMESTAMP,
     end_time TIMESTAMP,
     price DECIMAL(10, 2)
-);
\ No newline at end of file
+);
+
+CREATE INDEX idx_reservations_book_active ON reservations(book_id, start_time, reservation_id);
@@ -2,10 +2,18 @@ from fastapi import HTTPException
 import asyncpg
 from typing import List, Optional
 from datetime import datetime
+from pagination import encode_cursor, decode_cursor, clamp_limit
+from singleflight import SingleFlight
+from outbox import record_event
+import json
 
 class AdminService:
     def __init__(self, pool: asyncpg.Pool):
         self.pool = pool
+        self.book_status_flight = SingleFlight("book_status")
+
+        # Upper bound on targets accepted by one bulk call
+        self.MAX_BULK_ITEMS = 1000
     
     async def revoke_user_token(self, admin_username: str, target_username: str) -> bool:
         """Revoke a user's token by admin"""
@@ -41,13 +49,18 @@ class AdminService:
                 )
             
             # Revoke token by recording in revoked_tokens table
-            await conn.execute(
-                """
-                INSERT INTO revoked_tokens (username, revoked_at, revoked_by)
-                VALUES ($1, $2, $3)
-                """,
-                target_username, datetime.now(), admin_username
-            )
+            async with conn.transaction():
+                await conn.execute(
+                    """
+                    INSERT INTO revoked_tokens (username, revoked_at, revoked_by)
+                    VALUES ($1, $2, $3)
+                    """,
+                    target_username, datetime.now(), admin_username
+                )
+                await record_event(conn, "token.revoked", {
+                    "username": target_username,
+                    "revoked_by": admin_username
+                })
             
             return True
     
@@ -110,66 +123,267 @@ class AdminService:
                     """,
                     reservation['book_id']
                 )
+                
+                await record_event(conn, "reservation.ended", {
+                    "reservation_id": reservation_id,
+                    "book_id": reservation['book_id'],
+                    "customer_id": reservation['customer_id'],
+                    "ended_by": admin_username
+                })
             
             return True
     
-    async def get_book_status(self, admin_username: str, book_id: int) -> dict:
-        """Get book status including current reservations and waiting queue"""
-        async with self.pool.acquire() as conn:
-            # Check admin access
-            admin = await conn.fetchrow(
-                "SELECT role FROM users WHERE username = $1",
-                admin_username
+    def _check_bulk_size(self, items: list, field: str):
+        if not items:
+            raise HTTPException(status_code=400, detail=f"{field} must not be empty")
+        if len(items) > self.MAX_BULK_ITEMS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {self.MAX_BULK_ITEMS} {field} can be processed per call"
             )
-            
-            if not admin or admin['role'] != 'admin':
-                raise HTTPException(
-                    status_code=403,
-                    detail="You don't have the required permissions for this operation"
+
+    async def revoke_user_tokens(self, admin_username: str, target_usernames: List[str]) -> List[dict]:
+        """Revoke the tokens of many users in one statement.
+
+        The caller is expected to have verified the admin role already
+        (see ``get_current_admin`` in main.py). Returns one outcome per
+        distinct username: ``revoked``, ``not_found`` or ``admin_protected``.
+        """
+        self._check_bulk_size(target_usernames, "usernames")
+
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                rows = await conn.fetch(
+                    """
+                    WITH targets AS (
+                        SELECT DISTINCT unnest($1::text[]) AS username
+                    ),
+                    revoked AS (
+                        INSERT INTO revoked_tokens (username, revoked_at, revoked_by)
+                        SELECT u.username, $2, $3
+                        FROM users u
+                        JOIN targets t ON t.username = u.username
+                        WHERE u.role != 'admin'
+                        RETURNING username
+                    ),
+                    events AS (
+                        INSERT INTO outbox (event_type, payload)
+                        SELECT 'token.revoked',
+                               jsonb_build_object('username', username, 'revoked_by', $3::text)
+                        FROM revoked
+                    )
+                    SELECT t.username,
+                           CASE
+                               WHEN r.username IS NOT NULL THEN 'revoked'
+                               WHEN u.username IS NULL THEN 'not_found'
+                               ELSE 'admin_protected'
+                           END AS outcome
+                    FROM targets t
+                    LEFT JOIN revoked r ON r.username = t.username
+                    LEFT JOIN users u ON u.username = t.username
+                    ORDER BY t.username
+                    """,
+                    target_usernames, datetime.now(), admin_username
                 )
-            
-            # Get book information
-            book = await conn.fetchrow(
-                "SELECT * FROM books WHERE book_id = $1",
-                book_id
+
+        return [dict(r) for r in rows]
+
+    async def end_reservations(self, admin_username: str, reservation_ids: List[int]) -> List[dict]:
+        """End many reservations in one statement.
+
+        Units are returned to ``books`` with a single aggregated update per
+        book. The caller is expected to have verified the admin role already.
+        Returns one outcome per distinct id: ``ended``, ``not_found`` or
+        ``already_ended``.
+        """
+        self._check_bulk_size(reservation_ids, "reservation_ids")
+
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                rows = await conn.fetch(
+                    """
+                    WITH targets AS (
+                        SELECT DISTINCT unnest($1::int[]) AS reservation_id
+                    ),
+                    ended AS (
+                        UPDATE reservations r
+                        SET end_time = NOW(),
+                            status = 'terminated_by_admin'
+                        FROM targets t
+                        WHERE r.reservation_id = t.reservation_id
+                          AND r.end_time > NOW()
+                        RETURNING r.reservation_id, r.book_id, r.customer_id
+                    ),
+                    events AS (
+                        INSERT INTO outbox (event_type, payload)
+                        SELECT 'reservation.ended',
+                               jsonb_build_object(
+                                   'reservation_id', reservation_id,
+                                   'book_id', book_id,
+                                   'customer_id', customer_id,
+                                   'ended_by', $2::text
+                               )
+                        FROM ended
+                    ),
+                    restocked AS (
+                        UPDATE books b
+                        SET units = b.units + e.returned
+                        FROM (
+                            SELECT book_id, COUNT(*) AS returned
+                            FROM ended
+                            GROUP BY book_id
+                        ) e
+                        WHERE b.book_id = e.book_id
+                    )
+                    SELECT t.reservation_id,
+                           e.book_id,
+                           CASE
+                               WHEN e.reservation_id IS NOT NULL THEN 'ended'
+                               WHEN r.reservation_id IS NULL THEN 'not_found'
+                               ELSE 'already_ended'
+                           END AS outcome
+                    FROM targets t
+                    LEFT JOIN ended e ON e.reservation_id = t.reservation_id
+                    LEFT JOIN reservations r ON r.reservation_id = t.reservation_id
+                    ORDER BY t.reservation_id
+                    """,
+                    reservation_ids, admin_username
+                )
+
+        return [dict(r) for r in rows]
+
+    async def get_book_status(self, book_id: int, limit: int = 50,
+                              active_after: Optional[str] = None,
+                              waiting_after: Optional[str] = None) -> dict:
+        """Get book status including current reservations and waiting queue.
+
+        The whole snapshot is read with one composite query. Both lists are
+        keyset-paginated; pass the returned ``next_cursor`` values back to
+        fetch the following page. Each list's ``total`` is counted on its
+        first page only and is null on later pages, so paging through a
+        long queue does not recount it every time. The caller is expected
+        to have verified the admin role already (see ``get_current_admin``
+        in main.py).
+        """
+        limit = clamp_limit(limit)
+        active_cursor = decode_cursor(active_after, 2) or [None, None]
+        waiting_cursor = decode_cursor(waiting_after, 3) or [None, None, None]
+        int_slots = []
+        try:
+            if active_after:
+                active_cursor[0] = datetime.fromisoformat(active_cursor[0])
+                int_slots.append(active_cursor[1])
+            if waiting_after:
+                waiting_cursor[1] = datetime.fromisoformat(waiting_cursor[1])
+                int_slots += (waiting_cursor[0], waiting_cursor[2])
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+        # Anything else in an ::int slot fails in asyncpg as a 500
+        if any(type(value) is not int or not -2**31 <= value < 2**31 for value in int_slots):
+            raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+        # Admins opening the same page of the same book at once share one query
+        return await self.book_status_flight.do(
+            (book_id, limit, active_after, waiting_after),
+            lambda: self._read_book_status(book_id, limit, active_cursor, waiting_cursor),
+            share=not self.pool.wrote_recently()
+        )
+
+    async def _read_book_status(self, book_id: int, limit: int,
+                                active_cursor: list, waiting_cursor: list) -> dict:
+        # A cursor adds its list's predicate, and drops that list's count,
+        # only when present, giving one statement per combination. An OR'd
+        # "$n IS NULL" test would keep a generic plan from using the index
+        # range for deep pages.
+        args = [book_id, limit]
+        active_after = waiting_after = ""
+        active_count = "(SELECT COUNT(*) FROM reservations WHERE book_id = $1 AND end_time > NOW())"
+        waiting_count = "(SELECT COUNT(*) FROM reservation_queue WHERE book_id = $1)"
+        if active_cursor[0] is not None:
+            active_count = "NULL::bigint"
+            args += active_cursor
+            active_after = (
+                f"AND (r.start_time, r.reservation_id)"
+                f" > (${len(args) - 1}::timestamp, ${len(args)}::int)"
             )
-            
-            if not book:
-                raise HTTPException(
-                    status_code=404,
-                    detail="Book not found"
+        if waiting_cursor[0] is not None:
+            waiting_count = "NULL::bigint"
+            args += waiting_cursor
+            waiting_after = (
+                f"WHERE (w.priority, w.request_time, w.queue_id)"
+                f" > (${len(args) - 2}::int, ${len(args) - 1}::timestamp, ${len(args)}::int)"
+            )
+        async with self.pool.acquire_read() as conn:
+            status = await conn.fetchrow(
+                f"""
+                WITH active AS (
+                    SELECT r.*, u.username, u.email
+                    FROM reservations r
+                    JOIN customers c ON r.customer_id = c.customer_id
+                    JOIN users u ON c.user_id = u.user_id
+                    WHERE r.book_id = $1 AND r.end_time > NOW()
+                      {active_after}
+                    ORDER BY r.start_time, r.reservation_id
+                    LIMIT $2 + 1
+                ),
+                waiting AS (
+                    SELECT *
+                    FROM (
+                        SELECT q.*, u.username, u.email, c.subscription_model,
+                               CASE WHEN c.subscription_model = 'premium' THEN 0 ELSE 1 END AS priority
+                        FROM reservation_queue q
+                        JOIN customers c ON q.customer_id = c.customer_id
+                        JOIN users u ON c.user_id = u.user_id
+                        WHERE q.book_id = $1
+                    ) w
+                    {waiting_after}
+                    ORDER BY w.priority, w.request_time, w.queue_id
+                    LIMIT $2 + 1
                 )
-            
-            # Get active reservations
-            active_reservations = await conn.fetch(
-                """
-                SELECT r.*, u.username, u.email 
-                FROM reservations r
-                JOIN customers c ON r.customer_id = c.customer_id
-                JOIN users u ON c.user_id = u.user_id
-                WHERE r.book_id = $1 AND r.end_time > NOW()
-                ORDER BY r.start_time
+                SELECT row_to_json(b) AS book,
+                       {active_count} AS active_count,
+                       {waiting_count} AS waiting_count,
+                       (SELECT COALESCE(json_agg(a ORDER BY a.start_time, a.reservation_id), '[]')
+                        FROM active a) AS active_reservations,
+                       (SELECT COALESCE(json_agg(w ORDER BY w.priority, w.request_time, w.queue_id), '[]')
+                        FROM waiting w) AS waiting_list
+                FROM books b
+                WHERE b.book_id = $1
                 """,
-                book_id
+                *args
             )
-            
-            # Get waiting list
-            waiting_list = await conn.fetch(
-                """
-                SELECT q.*, u.username, u.email, c.subscription_model
-                FROM reservation_queue q
-                JOIN customers c ON q.customer_id = c.customer_id
-                JOIN users u ON c.user_id = u.user_id
-                WHERE q.book_id = $1
-                ORDER BY 
-                    CASE WHEN c.subscription_model = 'premium' THEN 0 ELSE 1 END,
-                    q.request_time
-                """,
-                book_id
+
+        if not status:
+            raise HTTPException(
+                status_code=404,
+                detail="Book not found"
             )
-            
-            return {
-                "book": dict(book),
-                "active_reservations": [dict(r) for r in active_reservations],
-                "waiting_list": [dict(w) for w in waiting_list]
-            }
\ No newline at end of file
+
+        active = json.loads(status['active_reservations'])
+        waiting = json.loads(status['waiting_list'])
+
+        active_next = None
+        if len(active) > limit:
+            active = active[:limit]
+            last = active[-1]
+            active_next = encode_cursor([last['start_time'], last['reservation_id']])
+
+        waiting_next = None
+        if len(waiting) > limit:
+            waiting = waiting[:limit]
+            last = waiting[-1]
+            waiting_next = encode_cursor([last['priority'], last['request_time'], last['queue_id']])
+
+        return {
+            "book": json.loads(status['book']),
+            "active_reservations": {
+                "total": status['active_count'],
+                "items": active,
+                "next_cursor": active_next
+            },
+            "waiting_list": {
+                "total": status['waiting_count'],
+                "items": waiting,
+                "next_cursor": waiting_next
+            }
+        }
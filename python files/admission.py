@@ -0,0 +1,143 @@
+"""Load shedding and per-user rate limits.
+
+``admission_middleware`` turns requests away with 503 and Retry-After
+before they queue for a database connection: when too many requests are
+in flight, or when requests are already waiting on the primary pool and
+either the queue is long or recent waits have been slow. Shedding early
+keeps latency bounded for the requests that are admitted, instead of
+letting every request wait until its acquire times out.
+
+``rate_limits`` holds token buckets for the expensive endpoints. The routes
+call ``check`` themselves, because the user is only known after the body
+or token has been parsed. Login is keyed on the client address and the
+submitted username together, so failed logins sent by someone else cannot
+lock a user out. Buckets are per process, so with
+several workers the effective limit is multiplied by the worker count.
+"""
+import math
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+import config
+from exceptions import RateLimitError
+from metrics import metrics
+
+class TokenBuckets:
+    """One token bucket per key, stored as a (tokens, updated_at) tuple.
+
+    The dict is kept in least-recently-used order. Past ``max_keys`` the
+    oldest entry is dropped; an idle bucket has refilled anyway, so this only
+    forgets users that have not been seen for a while.
+    """
+    __slots__ = ('rate', 'burst', 'max_keys', 'limited', '_buckets')
+
+    def __init__(self, per_minute: float, burst: int, max_keys: int = 100000):
+        self.rate = per_minute / 60.0
+        self.burst = float(max(burst, 1))
+        self.max_keys = max_keys
+        self.limited = 0
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def take(self, key: str) -> float:
+        """Spend a token: 0 if one was available, else seconds until there is one"""
+        now = time.monotonic()
+        entry = self._buckets.pop(key, None)
+        if entry is None:
+            tokens = self.burst
+        else:
+            tokens = min(self.burst, entry[0] + (now - entry[1]) * self.rate)
+
+        if tokens >= 1.0:
+            self._buckets[key] = (tokens - 1.0, now)
+            wait = 0.0
+        else:
+            self._buckets[key] = (tokens, now)
+            wait = (1.0 - tokens) / self.rate
+
+        if len(self._buckets) > self.max_keys:
+            del self._buckets[next(iter(self._buckets))]
+        return wait
+
+    def check(self, key: str):
+        """Raise RateLimitError when ``key`` has no token left; a zero rate disables the limit"""
+        if self.rate <= 0:
+            return
+        wait = self.take(key)
+        if wait:
+            self.limited += 1
+            raise RateLimitError(
+                message="Too many requests, please retry later",
+                retry_after=max(1, math.ceil(wait))
+            )
+
+class AdmissionController:
+    def __init__(self, max_in_flight: int, max_pool_waiting: int,
+                 max_pool_wait_ms: float, retry_after: int, exempt_paths=()):
+        self.max_in_flight = max_in_flight
+        self.max_pool_waiting = max_pool_waiting
+        self.max_pool_wait = max_pool_wait_ms / 1000
+        self.retry_after = retry_after
+        self.exempt_paths = frozenset(exempt_paths)
+        self.shed = {"in_flight": 0, "pool": 0}
+
+    def reason(self, stats) -> Optional[str]:
+        """Why a new request should be shed right now, or None to admit it"""
+        # metrics.in_flight already includes the request being checked
+        if self.max_in_flight and metrics.in_flight > self.max_in_flight:
+            return "in_flight"
+        # Only shed on pool pressure while someone is actually waiting, so a
+        # stale slow average cannot keep the service closed once load drops
+        if stats is not None and stats.waiting:
+            if (self.max_pool_waiting and stats.waiting >= self.max_pool_waiting) or \
+                    (self.max_pool_wait and stats.recent_wait > self.max_pool_wait):
+                return "pool"
+        return None
+
+admission = AdmissionController(
+    config.ADMISSION_MAX_IN_FLIGHT,
+    config.ADMISSION_MAX_POOL_WAITING,
+    config.ADMISSION_MAX_POOL_WAIT_MS,
+    config.ADMISSION_RETRY_AFTER_SECONDS,
+    exempt_paths=("/metrics", "/admin/pool-stats")
+)
+
+rate_limits = {
+    "login": TokenBuckets(
+        config.RATE_LIMIT_LOGIN_PER_MINUTE,
+        config.RATE_LIMIT_LOGIN_BURST,
+        config.RATE_LIMIT_MAX_KEYS
+    ),
+    "reservations": TokenBuckets(
+        config.RATE_LIMIT_RESERVATIONS_PER_MINUTE,
+        config.RATE_LIMIT_RESERVATIONS_BURST,
+        config.RATE_LIMIT_MAX_KEYS
+    ),
+}
+
+def login_key(request: Request, username: str) -> str:
+    """Login bucket key: the peer address as seen by the server, plus the username"""
+    host = request.client.host if request.client is not None else "unknown"
+    return f"{host}|{username}"
+
+async def admission_middleware(request: Request, call_next):
+    if request.url.path not in admission.exempt_paths:
+        pool = getattr(request.app.state, "pool", None)
+        reason = admission.reason(pool.primary.stats if pool is not None else None)
+        if reason is not None:
+            admission.shed[reason] += 1
+            return JSONResponse(
+                status_code=503,
+                content={
+                    "error": True,
+                    "message": "Server is busy, please retry later",
+                    "details": {"retry_after": admission.retry_after},
+                    "path": request.url.path,
+                    "timestamp": datetime.now().isoformat()
+                },
+                headers={"Retry-After": str(admission.retry_after)}
+            )
+    return await call_next(request)
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import asyncpg
+from typing import Optional
+from pagination import clamp_limit
+
+logger = logging.getLogger(__name__)
+
+# pg_try_advisory_lock key held for the duration of a refresh
+REFRESH_LOCK_KEY = 4242001
+
+class AnalyticsService:
+    """Admin dashboard figures served from materialized summary views.
+
+    The views are defined in ``postgreSQL files/analytics.sql`` and refreshed
+    concurrently on a schedule, so dashboard reads never scan the raw
+    reservation history. Every worker runs the schedule, but an advisory
+    lock lets only one refresh at a time, and a worker skips its turn when
+    another refreshed within the last half interval.
+    """
+
+    VIEWS = (
+        "analytics_book_utilization",
+        "analytics_genre_revenue",
+        "analytics_queue_depth",
+        "analytics_tier_mix",
+    )
+
+    def __init__(self, pool: asyncpg.Pool, refresh_interval: int = 300):
+        self.pool = pool
+        self.refresh_interval = refresh_interval
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def refresh(self, force: bool = False) -> bool:
+        """Refresh every summary view without blocking concurrent readers.
+
+        Returns False when another process holds the refresh lock or, unless
+        ``force`` is set, refreshed the views within the last half interval.
+        """
+        async with self.pool.acquire() as conn:
+            if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", REFRESH_LOCK_KEY):
+                return False
+            try:
+                fresh = await conn.fetchval(
+                    """
+                    SELECT refreshed_at > NOW() - make_interval(secs => $1)
+                    FROM analytics_refresh
+                    """,
+                    self.refresh_interval / 2
+                )
+                if fresh and not force:
+                    return False
+                for view in self.VIEWS:
+                    await conn.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+                await conn.execute(
+                    """
+                    INSERT INTO analytics_refresh (refreshed_at) VALUES (NOW())
+                    ON CONFLICT (id) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at
+                    """
+                )
+                return True
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock($1)", REFRESH_LOCK_KEY)
+
+    async def _refresh_loop(self):
+        # First pass right away so a fresh deployment does not wait a full interval
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                # Anything but cancellation: log it and keep the schedule alive
+                logger.exception("Analytics refresh failed")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    async def get_analytics(self, top: int = 20) -> dict:
+        """Read the dashboard snapshot from the summary views"""
+        top = clamp_limit(top)
+        async with self.pool.acquire_read() as conn:
+            utilization = await conn.fetch(
+                """
+                SELECT book_id, title, genre, units, active_reservations,
+                       total_reservations, revenue,
+                       ROUND(active_reservations::numeric
+                             / NULLIF(active_reservations + GREATEST(units, 0), 0), 4) AS utilization
+                FROM analytics_book_utilization
+                ORDER BY utilization DESC NULLS LAST, book_id
+                LIMIT $1
+                """,
+                top
+            )
+            genres = await conn.fetch(
+                "SELECT genre, reservations, revenue FROM analytics_genre_revenue ORDER BY revenue DESC"
+            )
+            queues = await conn.fetch(
+                """
+                SELECT book_id, waiting FROM analytics_queue_depth
+                ORDER BY waiting DESC, book_id
+                LIMIT $1
+                """,
+                top
+            )
+            tiers = await conn.fetch(
+                "SELECT subscription_model, customers FROM analytics_tier_mix ORDER BY subscription_model"
+            )
+            # Possibly refreshed by another worker
+            refreshed_at = await conn.fetchval("SELECT refreshed_at FROM analytics_refresh")
+
+        return {
+            "refreshed_at": refreshed_at,
+            "book_utilization": [dict(r) for r in utilization],
+            "revenue_per_genre": [dict(r) for r in genres],
+            "queue_depth": [dict(r) for r in queues],
+            "tier_mix": [dict(r) for r in tiers]
+        }
@@ -0,0 +1,93 @@
+from fastapi import HTTPException
+import asyncpg
+from typing import Any, Dict, List, Optional
+from exceptions import BookStoreException
+from queries import registry
+
+class BatchService:
+    """Runs several read operations for one user on a single connection.
+
+    The caller is authenticated once by the route, the customer row is
+    looked up once, and every operation then uses a prepared registry
+    statement on the same pooled connection. asyncpg runs one query at a
+    time per connection, so the operations execute back to back; the
+    saving is in the shared auth, principal lookup and acquire. Each
+    operation reports its own status, and one failing does not stop the rest.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, reservation_service):
+        self.pool = pool
+        self.reservation_service = reservation_service
+
+        # Upper bound on operations accepted by one batch
+        self.MAX_OPERATIONS = 20
+
+        self.OPERATIONS = {
+            "subscription_info": self._subscription_info,
+            "wallet_balance": self._wallet_balance,
+            "books": self._books,
+            "queue_status": self._queue_status,
+        }
+
+    async def run(self, username: str, operations: List[dict]) -> List[dict]:
+        if not operations:
+            raise HTTPException(status_code=400, detail="No operations given")
+        if len(operations) > self.MAX_OPERATIONS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {self.MAX_OPERATIONS} operations are allowed per batch"
+            )
+
+        results = []
+        async with self.pool.acquire_read() as conn:
+            customer = await registry.fetchrow(conn, "customer_by_username", username)
+            for operation in operations:
+                name = operation['op']
+                handler = self.OPERATIONS.get(name)
+                if handler is None:
+                    results.append({
+                        "op": name,
+                        "status": 400,
+                        "error": f"Unknown operation; expected one of {sorted(self.OPERATIONS)}"
+                    })
+                    continue
+                try:
+                    body = await handler(conn, customer, operation.get('params') or {})
+                    results.append({"op": name, "status": 200, "body": body})
+                except HTTPException as e:
+                    results.append({"op": name, "status": e.status_code, "error": e.detail})
+                except BookStoreException as e:
+                    results.append({"op": name, "status": e.status_code, "error": e.message})
+                except asyncpg.exceptions.PostgresError as e:
+                    results.append({"op": name, "status": 500, "error": f"Database error: {str(e)}"})
+        return results
+
+    def _require_customer(self, customer: Optional[asyncpg.Record]) -> int:
+        if not customer:
+            raise HTTPException(status_code=404, detail="Customer not found")
+        return customer['customer_id']
+
+    async def _subscription_info(self, conn, customer, params: Dict[str, Any]):
+        info = await registry.fetchrow(
+            conn, "subscription_info", self._require_customer(customer)
+        )
+        if not info:
+            raise HTTPException(status_code=404, detail="Customer not found")
+        return info
+
+    async def _wallet_balance(self, conn, customer, params: Dict[str, Any]):
+        balance = await registry.fetchval(
+            conn, "customer_wallet", self._require_customer(customer)
+        )
+        return {"balance": balance}
+
+    async def _books(self, conn, customer, params: Dict[str, Any]):
+        return await registry.fetch(conn, "books_list")
+
+    async def _queue_status(self, conn, customer, params: Dict[str, Any]):
+        book_id = params.get('book_id')
+        if book_id is not None and not isinstance(book_id, int):
+            raise HTTPException(status_code=400, detail="book_id must be an integer")
+        return await self.reservation_service.queue_positions(
+            conn, self._require_customer(customer), book_id
+        )
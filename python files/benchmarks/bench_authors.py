@@ -0,0 +1,81 @@
+"""CPU cost of turning author rows into responses, per 1,000 authors.
+
+Compares the old row_to_json projection, where asyncpg hands back the user
+and city as JSON text that has to be parsed again, with the typed column
+projection decoded by ``author_from_record``. Rows are synthesized in memory
+so the numbers isolate Python-side work from the database.
+
+    python benchmarks/bench_authors.py [--rounds 200]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crud_services import author_from_record
+
+AUTHORS = 1000
+
+def legacy_rows():
+    """Rows shaped like SELECT a.*, row_to_json(u.*), row_to_json(c.*)"""
+    rows = []
+    for i in range(AUTHORS):
+        user = {
+            "user_id": i, "username": f"author{i}", "first_name": "First",
+            "last_name": "Last", "phone": "09120000000",
+            "email": f"author{i}@example.com",
+            "password": "$2b$12$" + "x" * 53, "role": "author"
+        }
+        city = {
+            "city_id": i % 50, "name": "Tehran", "province": "Tehran",
+            "country": "Iran", "created_at": "2024-01-01T00:00:00"
+        }
+        rows.append({
+            "author_id": i, "user_id": i, "city_id": i % 50,
+            "goodreads_link": None, "bank_account_number": "IR000000000000000000000000",
+            "bio": "Writes books.", "user": json.dumps(user), "city": json.dumps(city)
+        })
+    return rows
+
+def typed_rows():
+    """Rows shaped like SELECT AUTHOR_COLUMNS"""
+    return [{
+        "author_id": i, "user_id": i, "city_id": i % 50,
+        "goodreads_link": None, "bank_account_number": "IR000000000000000000000000",
+        "bio": "Writes books.", "username": f"author{i}",
+        "email": f"author{i}@example.com", "first_name": "First",
+        "last_name": "Last", "role": "author", "city_name": "Tehran",
+        "city_province": "Tehran", "city_country": "Iran"
+    } for i in range(AUTHORS)]
+
+def legacy_decode(rows):
+    return [{**row, "user": json.loads(row["user"]), "city": json.loads(row["city"])} for row in rows]
+
+def typed_decode(rows):
+    return [author_from_record(row) for row in rows]
+
+def measure(fn, rows, rounds: int) -> float:
+    """Mean CPU milliseconds per call"""
+    fn(rows)
+    start = time.process_time()
+    for _ in range(rounds):
+        fn(rows)
+    return (time.process_time() - start) * 1000 / rounds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    legacy = measure(legacy_decode, legacy_rows(), args.rounds)
+    typed = measure(typed_decode, typed_rows(), args.rounds)
+    print(f"row_to_json + json.loads : {legacy:8.3f} ms CPU / {AUTHORS} authors")
+    print(f"typed projection         : {typed:8.3f} ms CPU / {AUTHORS} authors")
+    print(f"speedup                  : {legacy / typed:8.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,503 @@
+"""Synthetic dataset generator for scale testing.
+
+Generates customers, authors, books and reservations against the schema in
+``postgreSQL files/`` and loads them with binary COPY over parallel streams,
+one connection per worker process.
+
+    python benchmarks/generate_dataset.py --truncate --customers 1000000 \\
+        --books 200000 --reservations 10000000 --streams 8
+
+Distributions:
+    book popularity   Zipfian over a seeded ranking of books (--zipf-s)
+    tiers             --tier-mix, e.g. free=0.3,plus=0.5,premium=0.2
+    reservations      --reservations returned reservations spread over
+                      --history-days, plus active ones for paying customers
+                      (about --active-per-customer each, capped by tier and
+                      by each book's stock)
+    queues            books left with no free units get a reservation_queue
+
+The output is deterministic for a given --seed and --as-of: every row is
+derived from the seed and its own index, so the stream count and scheduling
+do not change what gets written. With --truncate the ids are reproducible as
+well; without it the ids continue from the current maximums.
+
+Rows respect what ReservationService enforces: free customers hold no
+reservations, active reservations stay within 5/7 days (plus) and 10/14 days
+(premium), prices follow the per-day rates, no book has more active
+reservations than copies, and ``books.units`` is the stock left after them. Generated rows are tagged with the ``synth_``
+username and ``SY-`` ISBN prefixes.
+"""
+import argparse
+import asyncio
+from array import array
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import accumulate
+from typing import Dict, Iterator, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncpg
+
+import auth
+import config
+
+USER_PREFIX = "synth_"
+ISBN_PREFIX = "SY-"
+PASSWORD = "synthetic-password"
+
+# tier -> (max simultaneous reservations, max days, price per day)
+TIERS = {
+    "free": (0, 0, 0),
+    "plus": (5, 7, 1000),
+    "premium": (10, 14, 2000),
+}
+GENRES = ["fiction", "history", "science", "poetry", "philosophy", "children", "biography", "fantasy"]
+CITIES = [
+    ("Tehran", "Tehran"), ("Mashhad", "Razavi Khorasan"), ("Isfahan", "Isfahan"),
+    ("Shiraz", "Fars"), ("Tabriz", "East Azerbaijan"), ("Rasht", "Gilan"),
+]
+FIRST_NAMES = ["Ali", "Sara", "Reza", "Maryam", "Hossein", "Zahra", "Mehdi", "Fatemeh", "Amir", "Neda"]
+LAST_NAMES = ["Ahmadi", "Hosseini", "Karimi", "Moradi", "Rezaei", "Jafari", "Mohammadi", "Sadeghi"]
+BOOK_PRICES = [Decimal(p) for p in ("45000.00", "80000.00", "125000.00", "190000.00", "260000.00")]
+MAX_STOCK = 5
+# Draws per active reservation before it is dropped for lack of stock
+ACTIVE_REDRAWS = 8
+CHUNK_SIZE = 100_000
+
+def unit(spec: dict, index: int, salt: int) -> float:
+    """Deterministic value in [0, 1) for a row index, independent of chunking"""
+    x = (index * 0x9E3779B1 + salt * 0x85EBCA77 + spec["seed"]) & 0xFFFFFFFF
+    x ^= x >> 16
+    x = (x * 0x45D9F3B) & 0xFFFFFFFF
+    x ^= x >> 16
+    x = (x * 0x45D9F3B) & 0xFFFFFFFF
+    x ^= x >> 16
+    return x / 2 ** 32
+
+def tier_of(spec: dict, customer: int) -> str:
+    u = unit(spec, customer, 1)
+    for tier, bound in spec["tier_bounds"]:
+        if u < bound:
+            return tier
+    return spec["tier_bounds"][-1][0]
+
+def active_count(spec: dict, customer: int) -> int:
+    limit = TIERS[tier_of(spec, customer)][0]
+    if not limit:
+        return 0
+    u = unit(spec, customer, 2)
+    return min(limit, int(-spec["active_per_customer"] * math.log(1.0 - u)))
+
+def stock_of(spec: dict, book: int) -> int:
+    """Copies of a book before active reservations, derived from its index alone"""
+    return 1 + int(unit(spec, book, 3) * MAX_STOCK)
+
+def chunk_rng(spec: dict, table: str, start: int) -> random.Random:
+    return random.Random(f"{spec['seed']}:{table}:{start}")
+
+_popularity: Tuple[List[int], List[float]] = None
+
+def popularity(spec: dict) -> Tuple[List[int], List[float]]:
+    """Book ids in popularity order and their cumulative Zipf weights"""
+    global _popularity
+    if _popularity is None:
+        ranking = [spec["book_base"] + 1 + i for i in range(spec["books"])]
+        random.Random(f"{spec['seed']}:popularity").shuffle(ranking)
+        s = spec["zipf_s"]
+        weights = accumulate(1.0 / (rank ** s) for rank in range(1, len(ranking) + 1))
+        _popularity = (ranking, list(weights))
+    return _popularity
+
+def paying_customer(spec: dict, rng: random.Random) -> Tuple[int, str]:
+    while True:
+        customer = rng.randrange(spec["customers"])
+        tier = tier_of(spec, customer)
+        if tier != "free":
+            return customer, tier
+
+def price_for(tier: str, days: int) -> Decimal:
+    return _PRICES[(tier, days)]
+
+_PRICES = {
+    (tier, days): Decimal(rate * days)
+    for tier, (_, max_days, rate) in TIERS.items() if max_days
+    for days in range(1, max_days + 1)
+}
+
+def gen_users(spec: dict, start: int, count: int) -> Iterator[tuple]:
+    rng = chunk_rng(spec, "users", start)
+    for i in range(start, start + count):
+        if i < spec["customers"]:
+            username, role = f"{USER_PREFIX}c{i}", "customer"
+        else:
+            username, role = f"{USER_PREFIX}a{i - spec['customers']}", "author"
+        yield (
+            spec["user_base"] + 1 + i, username,
+            rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+            f"0912{rng.randrange(10 ** 7):07d}", f"{username}@example.com",
+            spec["password_hash"], role
+        )
+
+def gen_customers(spec: dict, start: int, count: int) -> Iterator[tuple]:
+    rng = chunk_rng(spec, "customers", start)
+    as_of = spec["as_of"]
+    for i in range(start, start + count):
+        tier = tier_of(spec, i)
+        end_time = None if tier == "free" else as_of + timedelta(days=rng.randint(1, 30))
+        wallet = Decimal(rng.randrange(0, 2_000_000, 1000))
+        yield (spec["customer_base"] + 1 + i, spec["user_base"] + 1 + i, tier, end_time, None, wallet)
+
+def gen_authors(spec: dict, start: int, count: int) -> Iterator[tuple]:
+    rng = chunk_rng(spec, "authors", start)
+    cities = spec["cities"]
+    for j in range(start, start + count):
+        city = rng.choice(cities)
+        yield (
+            spec["author_base"] + 1 + j, spec["user_base"] + 1 + spec["customers"] + j,
+            city, f"https://www.goodreads.com/author/show/{j}",
+            f"IR{rng.randrange(10 ** 24):024d}", None
+        )
+
+def gen_books(spec: dict, start: int, count: int) -> Iterator[tuple]:
+    rng = chunk_rng(spec, "books", start)
+    genres = spec["genres"]
+    for i in range(start, start + count):
+        yield (
+            spec["book_base"] + 1 + i, f"Synthetic book {i}", f"{ISBN_PREFIX}{i:09d}",
+            rng.choice(BOOK_PRICES), rng.choice(genres), None, stock_of(spec, i)
+        )
+
+def gen_book_authors(spec: dict, start: int, count: int) -> Iterator[tuple]:
+    rng = chunk_rng(spec, "book_authors", start)
+    created_at = spec["as_of"] - timedelta(days=spec["history_days"])
+    for i in range(start, start + count):
+        book_id = spec["book_base"] + 1 + i
+        first = rng.randrange(spec["authors"])
+        yield (book_id, spec["author_base"] + 1 + first, created_at)
+        if rng.random() < 0.2:
+            second = rng.randrange(spec["authors"])
+            if second != first:
+                yield (book_id, spec["author_base"] + 1 + second, created_at)
+
+def gen_history(spec: dict, start: int, count: int) -> Iterator[tuple]:
+    """Returned reservations, all ended before --as-of"""
+    rng = chunk_rng(spec, "history", start)
+    ranking, weights = popularity(spec)
+    books = rng.choices(ranking, cum_weights=weights, k=count)
+    as_of, history = spec["as_of"], spec["history_days"] * 86400
+    for offset, book_id in enumerate(books):
+        customer, tier = paying_customer(spec, rng)
+        days = rng.randint(1, TIERS[tier][1])
+        start_time = as_of - timedelta(seconds=days * 86400 + rng.random() * history)
+        yield (
+            spec["reservation_base"] + 1 + start + offset, spec["customer_base"] + 1 + customer,
+            book_id, start_time, start_time + timedelta(days=days), price_for(tier, days)
+        )
+
+def gen_active(spec: dict, start: int, count: int) -> Iterator[tuple]:
+    """Reservations still running at --as-of for customers [start, start + count)"""
+    rng = chunk_rng(spec, "active", start)
+    as_of = spec["as_of"]
+    reservation_id = spec["active_offsets"][start]
+    customers, books = spec["active_plan"][start]
+    for customer, book_id in zip(customers, books):
+        tier = tier_of(spec, customer)
+        days = rng.randint(1, TIERS[tier][1])
+        start_time = as_of - timedelta(seconds=rng.random() * days * 86400)
+        reservation_id += 1
+        yield (
+            reservation_id, spec["customer_base"] + 1 + customer, book_id,
+            start_time, start_time + timedelta(days=days), price_for(tier, days)
+        )
+
+RESERVATION_COLUMNS = ["reservation_id", "customer_id", "book_id", "start_time", "end_time", "price"]
+
+# table -> (target table, columns, row generator, spec key holding the row count)
+TASKS = {
+    "users": ("users", ["user_id", "username", "first_name", "last_name", "phone", "email", "password", "role"],
+              gen_users, "user_count"),
+    "customers": ("customers", ["customer_id", "user_id", "subscription_model", "subscription_end_time",
+                                "wallet_money", "wallet"], gen_customers, "customers"),
+    "authors": ("authors", None, gen_authors, "authors"),
+    "books": ("books", ["book_id", "title", "isbn", "price", "genre", "description", "units"],
+              gen_books, "books"),
+    "book_authors": ("book_authors", ["book_id", "author_id", "created_at"], gen_book_authors, "books"),
+    "history": ("reservations", RESERVATION_COLUMNS, gen_history, "reservations"),
+    "active": ("reservations", RESERVATION_COLUMNS, gen_active, "customers"),
+}
+
+# Tables in one phase only depend on tables loaded by earlier phases
+PHASES = [["users"], ["customers", "authors", "books"], ["book_authors", "history", "active"]]
+
+_loop = None
+_conn = None
+
+def _init_worker(connect_kwargs: dict):
+    global _loop, _conn
+    _loop = asyncio.new_event_loop()
+    _conn = _loop.run_until_complete(asyncpg.connect(**connect_kwargs))
+    _loop.run_until_complete(_conn.execute("SET synchronous_commit = off"))
+
+def _copy_chunk(job: Tuple[str, int, int, dict]) -> Tuple[str, int]:
+    name, start, count, spec = job
+    table, columns, generate, _ = TASKS[name]
+    if columns is None:
+        columns = spec["author_columns"]
+    result = _loop.run_until_complete(
+        _conn.copy_records_to_table(table, records=generate(spec, start, count), columns=columns)
+    )
+    return name, int(result.split()[-1])
+
+def connect_kwargs() -> dict:
+    return dict(
+        user=config.DB_USER, password=config.DB_PASSWORD, database=config.DB_NAME,
+        host=config.DB_HOST, port=config.DB_PORT
+    )
+
+async def prepare(spec: dict, truncate: bool):
+    """Reset or check the target tables and record id bases and reference data"""
+    conn = await asyncpg.connect(**connect_kwargs())
+    try:
+        if truncate:
+            await conn.execute(
+                """
+                TRUNCATE users, customers, authors, books, book_authors,
+                         reservations, reservation_queue, revoked_tokens
+                RESTART IDENTITY CASCADE
+                """
+            )
+        elif await conn.fetchval(
+            "SELECT EXISTS (SELECT 1 FROM users WHERE username LIKE $1 || '%')", USER_PREFIX
+        ):
+            raise SystemExit("Synthetic rows already exist; rerun with --truncate to replace them")
+
+        await conn.execute(
+            "INSERT INTO genres (name) SELECT unnest($1::varchar[]) ON CONFLICT (name) DO NOTHING",
+            GENRES
+        )
+        await conn.execute(
+            """
+            INSERT INTO cities (name, province)
+            SELECT * FROM unnest($1::varchar[], $2::varchar[])
+            ON CONFLICT (name, province) DO NOTHING
+            """,
+            [name for name, _ in CITIES], [province for _, province in CITIES]
+        )
+        spec["genres"] = GENRES
+
+        # The application reads authors.city_id; older schemas still carry a city name
+        columns = {
+            r["column_name"] for r in await conn.fetch(
+                "SELECT column_name FROM information_schema.columns WHERE table_name = 'authors'"
+            )
+        }
+        city_column = "city_id" if "city_id" in columns else "city"
+        spec["author_columns"] = ["author_id", "user_id", city_column, "goodreads_link",
+                                  "bank_account_number", "bio"]
+        if city_column == "city_id":
+            rows = await conn.fetch(
+                "SELECT city_id FROM cities WHERE (name, province) IN "
+                "(SELECT * FROM unnest($1::varchar[], $2::varchar[])) ORDER BY city_id",
+                [name for name, _ in CITIES], [province for _, province in CITIES]
+            )
+            spec["cities"] = [r["city_id"] for r in rows]
+        else:
+            spec["cities"] = [name for name, _ in CITIES]
+
+        for key, table, column in (
+            ("user_base", "users", "user_id"),
+            ("customer_base", "customers", "customer_id"),
+            ("author_base", "authors", "author_id"),
+            ("book_base", "books", "book_id"),
+            ("reservation_base", "reservations", "reservation_id"),
+        ):
+            spec[key] = await conn.fetchval(f"SELECT COALESCE(MAX({column}), 0) FROM {table}")
+    finally:
+        await conn.close()
+
+def plan_active(spec: dict, chunk_size: int) -> Tuple[int, Dict[int, tuple]]:
+    """Pick the books of active reservations, never past a book's stock.
+
+    One pass in customer order, so chunking does not change the result. A
+    draw on a sold-out book is redrawn uniformly, then dropped. Returns the
+    count kept and each chunk's (customers, books); chunk start ids go in
+    the spec.
+    """
+    rng = random.Random(f"{spec['seed']}:active")
+    ranking, weights = popularity(spec)
+    remaining = [stock_of(spec, i) for i in range(spec["books"])]
+    base = spec["book_base"] + 1
+    offsets, plan = {}, {}
+    next_id = spec["reservation_base"] + spec["reservations"]
+    for start in range(0, spec["customers"], chunk_size):
+        offsets[start] = next_id
+        customers, books = array("i"), array("i")
+        for customer in range(start, min(start + chunk_size, spec["customers"])):
+            for book_id in rng.choices(ranking, cum_weights=weights, k=active_count(spec, customer)):
+                for _ in range(ACTIVE_REDRAWS):
+                    if remaining[book_id - base]:
+                        break
+                    # Sold out: spill over to a uniformly chosen title
+                    book_id = ranking[rng.randrange(len(ranking))]
+                if not remaining[book_id - base]:
+                    continue
+                remaining[book_id - base] -= 1
+                customers.append(customer)
+                books.append(book_id)
+        plan[start] = (customers, books)
+        next_id += len(customers)
+    spec["active_offsets"] = offsets
+    return next_id - spec["reservation_base"] - spec["reservations"], plan
+
+async def finish(spec: dict, max_queue: int):
+    """Derive units from active reservations, queue hot titles and fix sequences"""
+    conn = await asyncpg.connect(**connect_kwargs())
+    try:
+        first_book = spec["book_base"] + 1
+        last_book = spec["book_base"] + spec["books"]
+        await conn.execute(
+            """
+            UPDATE books b SET units = b.units - a.active
+            FROM (
+                SELECT book_id, COUNT(*) AS active
+                FROM reservations
+                WHERE end_time > $1 AND book_id BETWEEN $2 AND $3
+                GROUP BY book_id
+            ) a
+            WHERE b.book_id = a.book_id
+            """,
+            spec["as_of"], first_book, last_book
+        )
+        hot = await conn.fetch(
+            """
+            SELECT b.book_id, COUNT(*) AS active
+            FROM books b
+            JOIN reservations r ON r.book_id = b.book_id AND r.end_time > $1
+            WHERE b.book_id BETWEEN $2 AND $3 AND b.units = 0
+            GROUP BY b.book_id
+            ORDER BY b.book_id
+            """,
+            spec["as_of"], first_book, last_book
+        )
+
+        rng = random.Random(f"{spec['seed']}:queue")
+        queue = []
+        for book in hot:
+            for _ in range(min(max_queue, max(1, book["active"] // 2))):
+                customer, tier = paying_customer(spec, rng)
+                queue.append((
+                    spec["customer_base"] + 1 + customer, book["book_id"],
+                    rng.randint(1, TIERS[tier][1]),
+                    spec["as_of"] - timedelta(seconds=rng.random() * 3 * 86400)
+                ))
+        queue.sort(key=lambda item: item[3])
+        if queue:
+            await conn.copy_records_to_table(
+                "reservation_queue", records=queue,
+                columns=["customer_id", "book_id", "days", "request_time"]
+            )
+
+        for table, column in (
+            ("users", "user_id"), ("customers", "customer_id"), ("authors", "author_id"),
+            ("books", "book_id"), ("reservations", "reservation_id"),
+        ):
+            await conn.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), "
+                f"(SELECT GREATEST(MAX({column}), 1) FROM {table}))"
+            )
+        await conn.execute(
+            "ANALYZE users, customers, authors, books, book_authors, reservations, reservation_queue"
+        )
+        return len(hot), len(queue)
+    finally:
+        await conn.close()
+
+def parse_tier_mix(value: str) -> List[Tuple[str, float]]:
+    shares = {}
+    for part in value.split(","):
+        tier, _, share = part.partition("=")
+        if tier.strip() not in TIERS:
+            raise argparse.ArgumentTypeError(f"Unknown tier: {tier}")
+        shares[tier.strip()] = float(share)
+    total = sum(shares.values())
+    if total <= 0:
+        raise argparse.ArgumentTypeError("Tier shares must add up to more than zero")
+    return [(tier, bound / total) for tier, bound in zip(shares, accumulate(shares.values()))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic bookstore dataset")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--as-of", type=datetime.fromisoformat,
+                        default=datetime.now().replace(hour=0, minute=0, second=0, microsecond=0),
+                        help="reference time for active reservations (default: today, midnight)")
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--authors", type=int, default=5_000)
+    parser.add_argument("--books", type=int, default=50_000)
+    parser.add_argument("--reservations", type=int, default=1_000_000,
+                        help="returned reservations; active ones are added on top")
+    parser.add_argument("--active-per-customer", type=float, default=1.0)
+    parser.add_argument("--history-days", type=int, default=365)
+    parser.add_argument("--tier-mix", type=parse_tier_mix, default="free=0.3,plus=0.5,premium=0.2")
+    parser.add_argument("--zipf-s", type=float, default=1.1, help="Zipf exponent for book popularity")
+    parser.add_argument("--max-queue", type=int, default=20, help="longest queue on a hot title")
+    parser.add_argument("--streams", type=int, default=os.cpu_count() or 4,
+                        help="parallel COPY streams (worker processes)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--truncate", action="store_true",
+                        help="empty the application tables first (destroys existing data)")
+    args = parser.parse_args()
+    if args.customers < 1 or args.authors < 1 or args.books < 1:
+        parser.error("--customers, --authors and --books must be at least 1")
+
+    spec = {
+        "seed": args.seed,
+        "as_of": args.as_of,
+        "customers": args.customers,
+        "authors": args.authors,
+        "user_count": args.customers + args.authors,
+        "books": args.books,
+        "reservations": args.reservations,
+        "active_per_customer": args.active_per_customer,
+        "history_days": args.history_days,
+        "tier_bounds": args.tier_mix,
+        "zipf_s": args.zipf_s,
+        "password_hash": auth.get_password_hash(PASSWORD),
+    }
+    started = time.perf_counter()
+    asyncio.run(prepare(spec, args.truncate))
+    active, active_plan = plan_active(spec, args.chunk_size)
+    print(f"Generating {spec['user_count']} users, {args.books} books, "
+          f"{args.reservations} returned and {active} active reservations "
+          f"over {args.streams} streams")
+
+    loaded: Dict[str, int] = {}
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(args.streams, initializer=_init_worker, initargs=(connect_kwargs(),)) as pool:
+        for phase in PHASES:
+            phase_started = time.perf_counter()
+            # Each active chunk only carries its own part of the plan
+            jobs = [
+                (name, start, min(args.chunk_size, spec[TASKS[name][3]] - start),
+                 {**spec, "active_plan": {start: active_plan[start]}} if name == "active" else spec)
+                for name in phase
+                for start in range(0, spec[TASKS[name][3]], args.chunk_size)
+            ]
+            for name, rows in pool.imap_unordered(_copy_chunk, jobs):
+                loaded[name] = loaded.get(name, 0) + rows
+            print(f"  {', '.join(phase)}: {time.perf_counter() - phase_started:.1f}s")
+
+    hot, queued = asyncio.run(finish(spec, args.max_queue))
+    for name, rows in loaded.items():
+        print(f"  {name:<13} {rows:>12} rows")
+    print(f"  {hot} hot titles with {queued} queued requests")
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
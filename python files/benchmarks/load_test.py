@@ -0,0 +1,320 @@
+"""End-to-end load test for the login and reservation hot paths.
+
+Seeds load-test users and books into the database configured in config.py,
+starts the API in-process under uvicorn and drives it with an asyncio HTTP
+client. The server runs in the same process so the harness can read OTP codes
+from ``auth.otp_storage`` instead of an SMS gateway.
+
+    python benchmarks/load_test.py --concurrency 50 --duration 30
+    python benchmarks/load_test.py --save-baseline      # record a new baseline
+    python benchmarks/load_test.py --scenarios books,wallet_charge
+
+Operations:
+    login_flow     POST /login/ -> POST /verify-otp/ -> POST /reservations/
+    upgrade        POST /subscription/upgrade/
+    wallet_charge  POST /wallet/charge/
+    books          GET /books/
+
+Reports throughput and p50/p95/p99 latency per operation. When a baseline
+file exists the run fails (exit status 1) if any operation's p95 latency or
+throughput regresses by more than --tolerance.
+
+Requires httpx and uvicorn, and a Postgres database with the schema from
+``postgreSQL files/``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncpg
+import httpx
+import uvicorn
+
+import auth
+import config
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "load_test.json")
+USER_PREFIX = "loadtest_"
+ISBN_PREFIX = "LT-"
+PASSWORD = "loadtest-password"
+SCENARIOS = ("login_flow", "upgrade", "wallet_charge", "books")
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, operation: str, elapsed: float, ok: bool):
+        if ok:
+            self.latencies.setdefault(operation, []).append(elapsed)
+        else:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    def summary(self, duration: float) -> Dict[str, dict]:
+        result = {}
+        for operation in sorted(set(self.latencies) | set(self.errors)):
+            samples = sorted(self.latencies.get(operation, []))
+            result[operation] = {
+                "ok": len(samples),
+                "errors": self.errors.get(operation, 0),
+                "throughput": round(len(samples) / duration, 2),
+                "p50_ms": percentile(samples, 50),
+                "p95_ms": percentile(samples, 95),
+                "p99_ms": percentile(samples, 99),
+            }
+        return result
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, round(pct / 100 * len(samples)) - 1))
+    return round(samples[index] * 1000, 3)
+
+async def seed(conn, customers: int, books: int):
+    """Replace previous load-test rows with fresh premium customers and books"""
+    password_hash = auth.get_password_hash(PASSWORD)
+    async with conn.transaction():
+        await conn.execute(
+            """
+            DELETE FROM reservations WHERE customer_id IN (
+                SELECT c.customer_id FROM customers c
+                JOIN users u ON u.user_id = c.user_id
+                WHERE u.username LIKE $1 || '%'
+            )
+            """,
+            USER_PREFIX
+        )
+        await conn.execute(
+            """
+            DELETE FROM reservations WHERE book_id IN (
+                SELECT book_id FROM books WHERE isbn LIKE $1 || '%'
+            )
+            """,
+            ISBN_PREFIX
+        )
+        await conn.execute(
+            "DELETE FROM revoked_tokens WHERE username LIKE $1 || '%'", USER_PREFIX
+        )
+        await conn.execute(
+            """
+            DELETE FROM customers WHERE user_id IN (
+                SELECT user_id FROM users WHERE username LIKE $1 || '%'
+            )
+            """,
+            USER_PREFIX
+        )
+        await conn.execute("DELETE FROM users WHERE username LIKE $1 || '%'", USER_PREFIX)
+        await conn.execute("DELETE FROM books WHERE isbn LIKE $1 || '%'", ISBN_PREFIX)
+
+        await conn.execute(
+            """
+            INSERT INTO users (username, email, password, role)
+            SELECT $1 || i, $1 || i || '@example.com', $2, 'customer'
+            FROM generate_series(1, $3) AS i
+            """,
+            USER_PREFIX, password_hash, customers
+        )
+        await conn.execute(
+            """
+            INSERT INTO customers (user_id, subscription_model, subscription_end_time, wallet)
+            SELECT user_id, 'premium', NOW() + INTERVAL '365 days', 50000000
+            FROM users WHERE username LIKE $1 || '%'
+            """,
+            USER_PREFIX
+        )
+        await conn.execute(
+            """
+            INSERT INTO books (title, isbn, price, genre, description, units)
+            SELECT 'Load test book ' || i, $1 || i, 10000, 'fiction', 'Seeded by load_test.py', 1000000
+            FROM generate_series(1, $2) AS i
+            """,
+            ISBN_PREFIX, books
+        )
+        return await conn.fetch("SELECT book_id FROM books WHERE isbn LIKE $1 || '%'", ISBN_PREFIX)
+
+async def janitor(conn, stop: asyncio.Event):
+    """End load-test reservations continuously so per-customer limits never trip"""
+    while not stop.is_set():
+        await conn.execute(
+            """
+            UPDATE reservations SET end_time = NOW()
+            WHERE end_time > NOW() AND book_id IN (
+                SELECT book_id FROM books WHERE isbn LIKE $1 || '%'
+            )
+            """,
+            ISBN_PREFIX
+        )
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=1.0)
+        except asyncio.TimeoutError:
+            pass
+
+async def timed(recorder: Recorder, operation: str, request):
+    start = time.perf_counter()
+    try:
+        response = await request
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        response, ok = None, False
+    recorder.record(operation, time.perf_counter() - start, ok)
+    return response if ok else None
+
+async def login(client: httpx.AsyncClient, recorder: Recorder, username: str):
+    response = await timed(recorder, "login", client.post(
+        "/login/", json={"username": username, "password": PASSWORD}
+    ))
+    if response is None:
+        return None
+    otp = auth.otp_storage.get(username)
+    response = await timed(recorder, "verify_otp", client.post(
+        "/verify-otp/", json={"username": username, "otp": otp}
+    ))
+    return response.json()["access_token"] if response is not None else None
+
+async def worker(client: httpx.AsyncClient, recorder: Recorder, usernames: List[str],
+                 book_ids: List[int], scenarios: List[str], deadline: float):
+    rng = random.Random()
+    token = None
+    while time.monotonic() < deadline:
+        scenario = rng.choice(scenarios)
+        username = rng.choice(usernames)
+        if scenario == "login_flow" or token is None:
+            start = time.perf_counter()
+            token = await login(client, recorder, username)
+            if token is None:
+                recorder.record("login_flow", 0.0, False)
+                continue
+            response = await timed(recorder, "reservation", client.post(
+                "/reservations/",
+                json={"book_id": rng.choice(book_ids), "days": 1},
+                headers={"Authorization": f"Bearer {token}"}
+            ))
+            recorder.record("login_flow", time.perf_counter() - start, response is not None)
+            continue
+
+        headers = {"Authorization": f"Bearer {token}"}
+        if scenario == "upgrade":
+            await timed(recorder, "upgrade", client.post(
+                "/subscription/upgrade/", json={"new_model": "premium", "months": 1}, headers=headers
+            ))
+        elif scenario == "wallet_charge":
+            await timed(recorder, "wallet_charge", client.post(
+                "/wallet/charge/", json={"amount": "1000"}, headers=headers
+            ))
+        elif scenario == "books":
+            await timed(recorder, "books", client.get("/books/", headers=headers))
+
+def compare(summary: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    failures = []
+    for operation, expected in baseline.items():
+        actual = summary.get(operation)
+        if actual is None:
+            failures.append(f"{operation}: missing from this run")
+            continue
+        if expected["p95_ms"] and actual["p95_ms"] > expected["p95_ms"] * (1 + tolerance):
+            failures.append(
+                f"{operation}: p95 {actual['p95_ms']} ms vs baseline {expected['p95_ms']} ms"
+            )
+        if actual["throughput"] < expected["throughput"] * (1 - tolerance):
+            failures.append(
+                f"{operation}: throughput {actual['throughput']}/s vs baseline {expected['throughput']}/s"
+            )
+    return failures
+
+async def run(args) -> int:
+    # OTPs are read from auth.otp_storage; skip the SMS print on every login
+    auth.SMSService.send_sms = staticmethod(lambda phone, message: None)
+
+    conn = await asyncpg.connect(
+        user=config.DB_USER, password=config.DB_PASSWORD, database=config.DB_NAME,
+        host=config.DB_HOST, port=config.DB_PORT
+    )
+    books = await seed(conn, args.customers, args.books)
+    book_ids = [b["book_id"] for b in books]
+    usernames = [f"{USER_PREFIX}{i}" for i in range(1, args.customers + 1)]
+
+    server = uvicorn.Server(uvicorn.Config("main:app", host="127.0.0.1", port=args.port,
+                                           log_level="warning", access_log=False))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    stop = asyncio.Event()
+    janitor_task = asyncio.create_task(janitor(conn, stop))
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}",
+                                     limits=limits, timeout=30.0) as client:
+            if args.warmup:
+                await asyncio.gather(*(
+                    worker(client, Recorder(), usernames, book_ids, args.scenarios,
+                           time.monotonic() + args.warmup)
+                    for _ in range(args.concurrency)
+                ))
+            started = time.monotonic()
+            deadline = started + args.duration
+            await asyncio.gather(*(
+                worker(client, recorder, usernames, book_ids, args.scenarios, deadline)
+                for _ in range(args.concurrency)
+            ))
+            elapsed = time.monotonic() - started
+    finally:
+        stop.set()
+        await janitor_task
+        server.should_exit = True
+        await server_task
+        await conn.close()
+
+    summary = recorder.summary(elapsed)
+    print(f"{'operation':<14} {'ok':>8} {'errors':>7} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for operation, row in summary.items():
+        print(f"{operation:<14} {row['ok']:>8} {row['errors']:>7} {row['throughput']:>9} "
+              f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            failures = compare(summary, json.load(f), args.tolerance)
+        if failures:
+            print("Regressions against baseline:")
+            for failure in failures:
+                print(f"  {failure}")
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the bookstore API")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before the run")
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--books", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--scenarios", type=lambda s: s.split(","), default=list(SCENARIOS))
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative regression before the run fails")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    sys.exit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Micro-benchmarks for pure-Python hot spots, independent of the database.
+
+    python benchmarks/microbench.py                      # run all, compare to baseline
+    python benchmarks/microbench.py --only jwt_decode    # run one case in isolation
+    python benchmarks/microbench.py --save-baseline
+    python benchmarks/microbench.py --only books_response_default --flamegraph books.folded
+
+Each case is timed with auto-calibrated loops; the best of --repeat runs is
+reported as time per call. A baseline in benchmarks/baselines/ makes the
+run fail when a case slows down by more than --tolerance.
+
+--flamegraph samples the main thread's stack while the selected cases run
+and writes folded stacks ("frame;frame;frame count"), which flamegraph.pl,
+speedscope or inferno can render.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Callable, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from auth import create_access_token
+from crud_services import author_from_record
+from main import decode_token
+from models import ReservationResponse
+from responses import FastJSONResponse
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "microbench.json")
+
+def case_jwt_encode() -> Callable:
+    data = {"sub": "benchmark_user"}
+    expires = timedelta(minutes=30)
+    return lambda: create_access_token(data, expires)
+
+def case_jwt_decode() -> Callable:
+    token = create_access_token({"sub": "benchmark_user"}, timedelta(minutes=30))
+    return lambda: decode_token(token)
+
+def case_reservation_response() -> Callable:
+    now = datetime.now()
+    data = {
+        "reservation_id": 1, "book_id": 2, "customer_id": 3,
+        "start_time": now, "end_time": now + timedelta(days=7),
+        "price": 14000.0, "status": "instant"
+    }
+    return lambda: ReservationResponse(**data)
+
+def book_rows(count: int):
+    """Rows shaped like SELECT * FROM books; asyncpg Records cannot be built
+    outside a connection, so plain dicts stand in for them"""
+    return [{
+        "book_id": i, "title": f"Book {i}", "isbn": f"978-0-{i:09d}",
+        "price": Decimal("125000.00"), "genre": "fiction",
+        "description": "A book used for benchmarks.", "units": i % 5
+    } for i in range(count)]
+
+def case_books_serialization(count: int = 1000) -> Callable:
+    rows = book_rows(count)
+    return lambda: jsonable_encoder(rows)
+
+def case_books_response_default(count: int = 10000) -> Callable:
+    """The default path: jsonable_encoder, then JSONResponse's json.dumps"""
+    rows = book_rows(count)
+    return lambda: JSONResponse(jsonable_encoder(rows)).body
+
+def case_books_response_fast(count: int = 10000) -> Callable:
+    rows = book_rows(count)
+    return lambda: FastJSONResponse(rows).body
+
+def case_author_decode(count: int = 1000) -> Callable:
+    rows = [{
+        "author_id": i, "user_id": i, "city_id": 1, "goodreads_link": None,
+        "bank_account_number": "IR000000000000000000000000", "bio": None,
+        "username": f"author{i}", "email": f"author{i}@example.com",
+        "first_name": None, "last_name": None, "role": "author",
+        "city_name": "Tehran", "city_province": "Tehran", "city_country": "Iran"
+    } for i in range(count)]
+    return lambda: [author_from_record(row) for row in rows]
+
+CASES: Dict[str, Callable[[], Callable]] = {
+    "jwt_encode": case_jwt_encode,
+    "jwt_decode": case_jwt_decode,
+    "reservation_response": case_reservation_response,
+    "books_serialization": case_books_serialization,
+    "books_response_default": case_books_response_default,
+    "books_response_fast": case_books_response_fast,
+    "author_decode": case_author_decode,
+}
+
+def measure(fn: Callable, repeat: int, target: float = 0.2) -> float:
+    """Best seconds per call over ``repeat`` runs of auto-calibrated loops"""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - start >= target / 10:
+            break
+        loops *= 2
+    loops = max(1, int(loops * target / max(time.perf_counter() - start, 1e-9) / 10))
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval into folded stacks"""
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.samples = Counter()
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for pure-Python hot spots")
+    parser.add_argument("--only", action="append", choices=sorted(CASES),
+                        help="run only this case; may be repeated")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown before the run fails")
+    parser.add_argument("--flamegraph", metavar="PATH",
+                        help="write folded stacks sampled while the cases run")
+    args = parser.parse_args()
+
+    names = args.only or list(CASES)
+    sampler = StackSampler() if args.flamegraph else None
+    results = {}
+    if sampler:
+        sampler.__enter__()
+    try:
+        for name in names:
+            results[name] = measure(CASES[name](), args.repeat)
+            print(f"{name:<22} {results[name] * 1e6:12.3f} us/call")
+    finally:
+        if sampler:
+            sampler.__exit__(None, None, None)
+            sampler.write(args.flamegraph)
+            print(f"Folded stacks written to {args.flamegraph}")
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update({name: round(seconds * 1e6, 3) for name, seconds in results.items()})
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    failures = [
+        f"{name}: {seconds * 1e6:.3f} us vs baseline {baseline[name]:.3f} us"
+        for name, seconds in results.items()
+        if name in baseline and seconds * 1e6 > baseline[name] * (1 + args.tolerance)
+    ]
+    for failure in failures:
+        print(f"Regression: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import os
+from typing import Optional
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+def _env_float(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    return float(value)
+
+# Database connection settings
+DB_USER = os.environ.get("BOOKSTORE_DB_USER", "postgres")
+DB_PASSWORD = os.environ.get("BOOKSTORE_DB_PASSWORD", "1497")
+DB_NAME = os.environ.get("BOOKSTORE_DB_NAME", "bookstore_db")
+DB_HOST = os.environ.get("BOOKSTORE_DB_HOST", "localhost")
+DB_PORT = _env_int("BOOKSTORE_DB_PORT", 5432)
+
+# Connection pool settings
+DB_POOL_MIN_SIZE = _env_int("BOOKSTORE_DB_POOL_MIN_SIZE", 10)
+DB_POOL_MAX_SIZE = _env_int("BOOKSTORE_DB_POOL_MAX_SIZE", 10)
+DB_POOL_MAX_QUERIES = _env_int("BOOKSTORE_DB_POOL_MAX_QUERIES", 50000)
+DB_POOL_MAX_INACTIVE_LIFETIME = _env_float("BOOKSTORE_DB_POOL_MAX_INACTIVE_LIFETIME", 300.0)
+DB_STATEMENT_CACHE_SIZE = _env_int("BOOKSTORE_DB_STATEMENT_CACHE_SIZE", 100)
+DB_COMMAND_TIMEOUT = _env_float("BOOKSTORE_DB_COMMAND_TIMEOUT", 30.0)
+DB_POOL_WARMUP = os.environ.get("BOOKSTORE_DB_POOL_WARMUP", "1") == "1"
+
+# Read replica. Leave BOOKSTORE_REPLICA_HOST empty to serve reads from the primary.
+REPLICA_HOST = os.environ.get("BOOKSTORE_REPLICA_HOST", "")
+REPLICA_PORT = _env_int("BOOKSTORE_REPLICA_PORT", 5432)
+REPLICA_POOL_MIN_SIZE = _env_int("BOOKSTORE_REPLICA_POOL_MIN_SIZE", DB_POOL_MIN_SIZE)
+REPLICA_POOL_MAX_SIZE = _env_int("BOOKSTORE_REPLICA_POOL_MAX_SIZE", DB_POOL_MAX_SIZE)
+REPLICA_MAX_LAG_SECONDS = _env_float("BOOKSTORE_REPLICA_MAX_LAG_SECONDS", 5.0)
+REPLICA_LAG_CHECK_SECONDS = _env_float("BOOKSTORE_REPLICA_LAG_CHECK_SECONDS", 1.0)
+# After a session writes, its reads stay on the primary for this long
+READ_YOUR_WRITES_SECONDS = _env_float("BOOKSTORE_READ_YOUR_WRITES_SECONDS", 10.0)
+
+# Server processes. WEB_CONCURRENCY is uvicorn's own default for --workers.
+SERVER_HOST = os.environ.get("BOOKSTORE_HOST", "0.0.0.0")
+SERVER_PORT = _env_int("BOOKSTORE_PORT", 8000)
+WORKERS = _env_int("BOOKSTORE_WORKERS", _env_int("WEB_CONCURRENCY", 1))
+# Total connections all workers may open against one database server.
+# When set, each worker's pool max size is its share of this budget, less
+# the connections it opens outside the pool (see server.SIDE_CONNECTIONS).
+DB_CONNECTION_BUDGET = _env_int("BOOKSTORE_DB_CONNECTION_BUDGET", 0)
+# The same for the replica; defaults to the primary's budget
+REPLICA_CONNECTION_BUDGET = _env_int("BOOKSTORE_REPLICA_CONNECTION_BUDGET", DB_CONNECTION_BUDGET)
+# Opt in to running several workers with process-local state, e.g. behind
+# a load balancer with sticky sessions.
+ALLOW_PROCESS_LOCAL_STATE = os.environ.get("BOOKSTORE_ALLOW_PROCESS_LOCAL_STATE", "0") == "1"
+
+# Logging. Records go through a queue to a listener thread that writes
+# JSON lines to a size-rotated file.
+LOG_FILE = os.environ.get("BOOKSTORE_LOG_FILE", "error.log")
+LOG_LEVEL = os.environ.get("BOOKSTORE_LOG_LEVEL", "WARNING")
+LOG_MAX_BYTES = _env_int("BOOKSTORE_LOG_MAX_BYTES", 10 * 1024 * 1024)
+LOG_BACKUP_COUNT = _env_int("BOOKSTORE_LOG_BACKUP_COUNT", 5)
+# Identical errors: log the first LOG_SAMPLE_BURST per window, then 1 in LOG_SAMPLE_RATE
+LOG_SAMPLE_WINDOW_SECONDS = _env_float("BOOKSTORE_LOG_SAMPLE_WINDOW_SECONDS", 60.0)
+LOG_SAMPLE_BURST = _env_int("BOOKSTORE_LOG_SAMPLE_BURST", 5)
+LOG_SAMPLE_RATE = _env_int("BOOKSTORE_LOG_SAMPLE_RATE", 100)
+
+# Slow query capture. Statements slower than the threshold get an
+# EXPLAIN (ANALYZE, BUFFERS) sample, at most once per cooldown per statement.
+SLOW_QUERY_THRESHOLD_MS = _env_float("BOOKSTORE_SLOW_QUERY_THRESHOLD_MS", 100.0)
+SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS = _env_float("BOOKSTORE_SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS", 300.0)
+
+# Admission control: shed with 503 when more requests are in flight than
+# this, or while requests wait on the primary pool and the queue is this
+# long or recent waits exceed the limit. 0 disables a check.
+ADMISSION_MAX_IN_FLIGHT = _env_int("BOOKSTORE_ADMISSION_MAX_IN_FLIGHT", 512)
+ADMISSION_MAX_POOL_WAITING = _env_int("BOOKSTORE_ADMISSION_MAX_POOL_WAITING", 50)
+ADMISSION_MAX_POOL_WAIT_MS = _env_float("BOOKSTORE_ADMISSION_MAX_POOL_WAIT_MS", 250.0)
+ADMISSION_RETRY_AFTER_SECONDS = _env_int("BOOKSTORE_ADMISSION_RETRY_AFTER_SECONDS", 1)
+
+# Per-user token buckets for /login/ and /reservations/. A rate of 0
+# disables the limit.
+RATE_LIMIT_LOGIN_PER_MINUTE = _env_float("BOOKSTORE_RATE_LIMIT_LOGIN_PER_MINUTE", 10.0)
+RATE_LIMIT_LOGIN_BURST = _env_int("BOOKSTORE_RATE_LIMIT_LOGIN_BURST", 5)
+RATE_LIMIT_RESERVATIONS_PER_MINUTE = _env_float("BOOKSTORE_RATE_LIMIT_RESERVATIONS_PER_MINUTE", 30.0)
+RATE_LIMIT_RESERVATIONS_BURST = _env_int("BOOKSTORE_RATE_LIMIT_RESERVATIONS_BURST", 10)
+RATE_LIMIT_MAX_KEYS = _env_int("BOOKSTORE_RATE_LIMIT_MAX_KEYS", 100000)
+
+# Idempotency keys for reservation, upgrade and wallet-charge requests
+IDEMPOTENCY_TTL_SECONDS = _env_float("BOOKSTORE_IDEMPOTENCY_TTL_SECONDS", 86400.0)
+IDEMPOTENCY_CACHE_SIZE = _env_int("BOOKSTORE_IDEMPOTENCY_CACHE_SIZE", 10000)
+IDEMPOTENCY_PURGE_SECONDS = _env_float("BOOKSTORE_IDEMPOTENCY_PURGE_SECONDS", 3600.0)
+
+# Outbox dispatcher: events claimed per batch, idle poll interval,
+# deliveries tried before an event is left as a dead letter, and how long a
+# claimed batch stays hidden from other dispatchers
+OUTBOX_BATCH_SIZE = _env_int("BOOKSTORE_OUTBOX_BATCH_SIZE", 100)
+OUTBOX_POLL_SECONDS = _env_float("BOOKSTORE_OUTBOX_POLL_SECONDS", 1.0)
+OUTBOX_MAX_ATTEMPTS = _env_int("BOOKSTORE_OUTBOX_MAX_ATTEMPTS", 10)
+OUTBOX_LEASE_SECONDS = _env_float("BOOKSTORE_OUTBOX_LEASE_SECONDS", 60.0)
+
+# Queue events over SSE: messages buffered per slow client, keepalive
+# comment interval and how often the LISTEN connection is checked
+QUEUE_EVENTS_MAX_PENDING = _env_int("BOOKSTORE_QUEUE_EVENTS_MAX_PENDING", 100)
+QUEUE_EVENTS_KEEPALIVE_SECONDS = _env_float("BOOKSTORE_QUEUE_EVENTS_KEEPALIVE_SECONDS", 15.0)
+QUEUE_EVENTS_RECONNECT_SECONDS = _env_float("BOOKSTORE_QUEUE_EVENTS_RECONNECT_SECONDS", 5.0)
+
+# Background jobs
+ANALYTICS_REFRESH_SECONDS = _env_int("BOOKSTORE_ANALYTICS_REFRESH_SECONDS", 300)
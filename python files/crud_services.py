@@ -2,10 +2,43 @@ from fastapi import HTTPException
 import asyncpg
 from datetime import datetime
 from typing import List, Optional
+from pagination import decode_cursor, clamp_limit, keyset_page
+from reference_cache import ReferenceDataCache, publish_reference_change
+from queries import registry
+
+# Upper bound on rows accepted by one bulk upsert call
+MAX_BULK_ROWS = 5000
+
+def check_bulk_rows(rows: list):
+    if not rows:
+        raise HTTPException(status_code=400, detail="No rows to upsert")
+    if len(rows) > MAX_BULK_ROWS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BULK_ROWS} rows can be upserted per call"
+        )
+
+def dedupe_rows(rows: List[dict], key: tuple):
+    """Keep the last row per conflict key; earlier ones are reported as duplicates.
+
+    A single INSERT ... ON CONFLICT DO UPDATE cannot touch the same row twice,
+    so duplicates have to be removed before the statement runs.
+    """
+    latest = {}
+    for index, row in enumerate(rows):
+        latest[tuple(row[column] for column in key)] = index
+    kept = sorted(latest.values())
+    kept_set = set(kept)
+    results = [
+        {"index": index, "status": "duplicate_in_batch"}
+        for index in range(len(rows)) if index not in kept_set
+    ]
+    return kept, results
 
 class CityService:
-    def __init__(self, pool: asyncpg.Pool):
+    def __init__(self, pool: asyncpg.Pool, cache: Optional[ReferenceDataCache] = None):
         self.pool = pool
+        self.cache = cache
 
     async def create_city(self, name: str, province: str, country: str = "Iran") -> dict:
         async with self.pool.acquire() as conn:
@@ -18,24 +51,43 @@ class CityService:
                     """,
                     name, province, country
                 )
+                if self.cache:
+                    self.cache.city_changed(dict(city))
+                    await publish_reference_change(conn, "cities", [city['city_id']])
                 return dict(city)
             except asyncpg.UniqueViolationError:
                 raise HTTPException(status_code=400, detail="This city has already been registered")
 
-    async def get_cities(self, skip: int = 0, limit: int = 10) -> List[dict]:
-        async with self.pool.acquire() as conn:
-            cities = await conn.fetch(
-                """
-                SELECT * FROM cities
-                ORDER BY name
-                LIMIT $1 OFFSET $2
-                """,
-                limit, skip
-            )
-            return [dict(city) for city in cities]
+    async def get_cities(self, limit: int = 10, after: Optional[str] = None) -> dict:
+        """List cities ordered by (name, city_id) using keyset pagination"""
+        if self.cache:
+            return self.cache.list_cities(limit, after)
+        limit = clamp_limit(limit)
+        cursor = decode_cursor(after, 2)
+        async with self.pool.acquire_read() as conn:
+            # Two statements rather than "$1 IS NULL OR ...": a generic plan
+            # for the OR'd form cannot scan the (name, city_id) index range
+            if cursor is None:
+                cities = await conn.fetch(
+                    "SELECT * FROM cities ORDER BY name, city_id LIMIT $1",
+                    limit + 1
+                )
+            else:
+                cities = await conn.fetch(
+                    """
+                    SELECT * FROM cities
+                    WHERE (name, city_id) > ($1::varchar, $2::int)
+                    ORDER BY name, city_id
+                    LIMIT $3
+                    """,
+                    *cursor, limit + 1
+                )
+        return keyset_page([dict(city) for city in cities], limit, ('name', 'city_id'))
 
     async def get_city(self, city_id: int) -> Optional[dict]:
-        async with self.pool.acquire() as conn:
+        if self.cache:
+            return await self.cache.fetch_city(city_id)
+        async with self.pool.acquire_read() as conn:
             city = await conn.fetchrow(
                 "SELECT * FROM cities WHERE city_id = $1",
                 city_id
@@ -45,35 +97,84 @@ class CityService:
     async def update_city(self, city_id: int, name: str = None, 
                          province: str = None, country: str = None) -> Optional[dict]:
         async with self.pool.acquire() as conn:
-            # Build dynamic update query
-            updates = []
-            values = []
-            if name is not None:
-                updates.append("name = $1")
-                values.append(name)
-            if province is not None:
-                updates.append(f"province = ${len(values) + 1}")
-                values.append(province)
-            if country is not None:
-                updates.append(f"country = ${len(values) + 1}")
-                values.append(country)
-
-            if not updates:
+            if name is None and province is None and country is None:
                 return await self.get_city(city_id)
 
-            values.append(city_id)
-            query = f"""
-                UPDATE cities
-                SET {', '.join(updates)}
-                WHERE city_id = ${len(values)}
-                RETURNING *
-            """
-            
-            city = await conn.fetchrow(query, *values)
+            city = await registry.fetchrow(
+                conn, "update_city", city_id, name, province, country
+            )
             if not city:
                 raise HTTPException(status_code=404, detail="City not found")
+            if self.cache:
+                self.cache.city_changed(dict(city))
+                await publish_reference_change(conn, "cities", [city_id])
             return dict(city)
 
+    async def bulk_upsert_cities(self, cities: List[dict]) -> List[dict]:
+        """Insert or update many cities, matched on (name, province).
+
+        Returns a result per input row, in input order. A row without a
+        country leaves an existing city's country alone; a new city gets
+        the column default. Rows with and without a country are written
+        with one set-based INSERT ... ON CONFLICT each, in one transaction.
+        """
+        check_bulk_rows(cities)
+        # province is NOT NULL DEFAULT ''; a NULL would never match ON CONFLICT
+        for city in cities:
+            city['province'] = city.get('province') or ''
+        kept, results = dedupe_rows(cities, ('name', 'province'))
+        with_country = [i for i in kept if cities[i].get('country') is not None]
+        without_country = [i for i in kept if cities[i].get('country') is None]
+
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                rows = []
+                if with_country:
+                    rows += await conn.fetch(
+                        """
+                        INSERT INTO cities (name, province, country)
+                        SELECT * FROM unnest($1::varchar[], $2::varchar[], $3::varchar[])
+                        ON CONFLICT (name, province) DO UPDATE
+                        SET country = EXCLUDED.country
+                        RETURNING *, (xmax = 0) AS inserted
+                        """,
+                        [cities[i]['name'] for i in with_country],
+                        [cities[i]['province'] for i in with_country],
+                        [cities[i]['country'] for i in with_country]
+                    )
+                if without_country:
+                    # The no-op update makes RETURNING report existing rows too
+                    rows += await conn.fetch(
+                        """
+                        INSERT INTO cities (name, province)
+                        SELECT * FROM unnest($1::varchar[], $2::varchar[])
+                        ON CONFLICT (name, province) DO UPDATE
+                        SET country = cities.country
+                        RETURNING *, (xmax = 0) AS inserted
+                        """,
+                        [cities[i]['name'] for i in without_country],
+                        [cities[i]['province'] for i in without_country]
+                    )
+                if self.cache:
+                    await publish_reference_change(conn, "cities", [row['city_id'] for row in rows])
+
+        written = {}
+        for row in rows:
+            city = dict(row)
+            inserted = city.pop('inserted')
+            written[(city['name'], city['province'])] = (city, inserted)
+        if self.cache:
+            self.cache.cities_changed([city for city, _ in written.values()])
+
+        for index in kept:
+            city, inserted = written[(cities[index]['name'], cities[index]['province'])]
+            results.append({
+                "index": index,
+                "status": "inserted" if inserted else "updated",
+                "city_id": city['city_id']
+            })
+        return sorted(results, key=lambda r: r['index'])
+
     async def delete_city(self, city_id: int) -> bool:
         async with self.pool.acquire() as conn:
             # Check city usage in authors table
@@ -91,11 +192,15 @@ class CityService:
                 "DELETE FROM cities WHERE city_id = $1",
                 city_id
             )
+            if self.cache:
+                self.cache.city_deleted(city_id)
+                await publish_reference_change(conn, "cities", [city_id])
             return 'DELETE 1' in result
 
 class GenreService:
-    def __init__(self, pool: asyncpg.Pool):
+    def __init__(self, pool: asyncpg.Pool, cache: Optional[ReferenceDataCache] = None):
         self.pool = pool
+        self.cache = cache
 
     async def create_genre(self, name: str, description: Optional[str] = None) -> dict:
         async with self.pool.acquire() as conn:
@@ -108,24 +213,42 @@ class GenreService:
                     """,
                     name, description
                 )
+                if self.cache:
+                    self.cache.genre_changed(dict(genre))
+                    await publish_reference_change(conn, "genres", [genre['genre_id']])
                 return dict(genre)
             except asyncpg.UniqueViolationError:
                 raise HTTPException(status_code=400, detail="This genre has already been registered")
 
-    async def get_genres(self, skip: int = 0, limit: int = 10) -> List[dict]:
-        async with self.pool.acquire() as conn:
-            genres = await conn.fetch(
-                """
-                SELECT * FROM genres
-                ORDER BY name
-                LIMIT $1 OFFSET $2
-                """,
-                limit, skip
-            )
-            return [dict(genre) for genre in genres]
+    async def get_genres(self, limit: int = 10, after: Optional[str] = None) -> dict:
+        """List genres ordered by (name, genre_id) using keyset pagination"""
+        if self.cache:
+            return self.cache.list_genres(limit, after)
+        limit = clamp_limit(limit)
+        cursor = decode_cursor(after, 2)
+        async with self.pool.acquire_read() as conn:
+            # Two statements, as in CityService.get_cities
+            if cursor is None:
+                genres = await conn.fetch(
+                    "SELECT * FROM genres ORDER BY name, genre_id LIMIT $1",
+                    limit + 1
+                )
+            else:
+                genres = await conn.fetch(
+                    """
+                    SELECT * FROM genres
+                    WHERE (name, genre_id) > ($1::varchar, $2::int)
+                    ORDER BY name, genre_id
+                    LIMIT $3
+                    """,
+                    *cursor, limit + 1
+                )
+        return keyset_page([dict(genre) for genre in genres], limit, ('name', 'genre_id'))
 
     async def get_genre(self, genre_id: int) -> Optional[dict]:
-        async with self.pool.acquire() as conn:
+        if self.cache:
+            return await self.cache.fetch_genre(genre_id)
+        async with self.pool.acquire_read() as conn:
             genre = await conn.fetchrow(
                 "SELECT * FROM genres WHERE genre_id = $1",
                 genre_id
@@ -136,35 +259,63 @@ class GenreService:
                           name: Optional[str] = None, 
                           description: Optional[str] = None) -> dict:
         async with self.pool.acquire() as conn:
-            # Build dynamic update query
-            updates = []
-            values = []
-            if name is not None:
-                updates.append("name = $1")
-                values.append(name)
-            if description is not None:
-                updates.append(f"description = ${len(values) + 1}")
-                values.append(description)
-
-            if not updates:
+            if name is None and description is None:
                 return await self.get_genre(genre_id)
 
-            values.append(genre_id)
-            query = f"""
-                UPDATE genres
-                SET {', '.join(updates)}
-                WHERE genre_id = ${len(values)}
-                RETURNING *
-            """
-            
             try:
-                genre = await conn.fetchrow(query, *values)
+                genre = await registry.fetchrow(
+                    conn, "update_genre", genre_id, name, description
+                )
                 if not genre:
                     raise HTTPException(status_code=404, detail="Genre not found")
+                if self.cache:
+                    self.cache.genre_changed(dict(genre))
+                    await publish_reference_change(conn, "genres", [genre_id])
                 return dict(genre)
             except asyncpg.UniqueViolationError:
                 raise HTTPException(status_code=400, detail="This genre name has already been registered")
 
+    async def bulk_upsert_genres(self, genres: List[dict]) -> List[dict]:
+        """Insert or update many genres, matched on name.
+
+        Runs one set-based INSERT ... ON CONFLICT and returns a result per
+        input row, in input order.
+        """
+        check_bulk_rows(genres)
+        kept, results = dedupe_rows(genres, ('name',))
+
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                INSERT INTO genres (name, description)
+                SELECT * FROM unnest($1::varchar[], $2::text[])
+                ON CONFLICT (name) DO UPDATE
+                SET description = EXCLUDED.description
+                RETURNING *, (xmax = 0) AS inserted
+                """,
+                [genres[i]['name'] for i in kept],
+                [genres[i].get('description') for i in kept]
+            )
+            if self.cache:
+                await publish_reference_change(conn, "genres", [row['genre_id'] for row in rows])
+
+        written = {}
+        for row in rows:
+            genre = dict(row)
+            inserted = genre.pop('inserted')
+            written[genre['name']] = (genre, inserted)
+        if self.cache:
+            self.cache.genres_changed([genre for genre, _ in written.values()])
+
+        for index in kept:
+            genre, inserted = written[genres[index]['name']]
+            results.append({
+                "index": index,
+                "status": "inserted" if inserted else "updated",
+                "genre_id": genre['genre_id']
+            })
+        return sorted(results, key=lambda r: r['index'])
+
     async def delete_genre(self, genre_id: int) -> bool:
         async with self.pool.acquire() as conn:
             # Check genre usage in books table
@@ -182,11 +333,58 @@ class GenreService:
                 "DELETE FROM genres WHERE genre_id = $1",
                 genre_id
             )
+            if self.cache:
+                self.cache.genre_deleted(genre_id)
+                await publish_reference_change(conn, "genres", [genre_id])
             return 'DELETE 1' in result
 
+# Typed projection for author responses. Sensitive user columns such as the
+# password hash are never selected.
+AUTHOR_COLUMNS = """
+    a.author_id, a.user_id, a.city_id, a.goodreads_link,
+    a.bank_account_number, a.bio,
+    u.username, u.email, u.first_name, u.last_name, u.role,
+    c.name AS city_name, c.province AS city_province, c.country AS city_country
+"""
+
+def author_from_record(record) -> dict:
+    """Build the nested author response straight from a flat AUTHOR_COLUMNS record"""
+    return {
+        'author_id': record['author_id'],
+        'user_id': record['user_id'],
+        'city_id': record['city_id'],
+        'goodreads_link': record['goodreads_link'],
+        'bank_account_number': record['bank_account_number'],
+        'bio': record['bio'],
+        'user': {
+            'user_id': record['user_id'],
+            'username': record['username'],
+            'email': record['email'],
+            'first_name': record['first_name'],
+            'last_name': record['last_name'],
+            'role': record['role']
+        },
+        'city': {
+            'city_id': record['city_id'],
+            'name': record['city_name'],
+            'province': record['city_province'],
+            'country': record['city_country']
+        }
+    }
+
 class AuthorService:
-    def __init__(self, pool: asyncpg.Pool):
+    def __init__(self, pool: asyncpg.Pool, cache: Optional[ReferenceDataCache] = None):
         self.pool = pool
+        self.cache = cache
+
+    async def _get_city(self, conn, city_id: int) -> Optional[dict]:
+        if self.cache:
+            return await self.cache.fetch_city(city_id)
+        city = await conn.fetchrow(
+            "SELECT * FROM cities WHERE city_id = $1",
+            city_id
+        )
+        return dict(city) if city else None
 
     async def create_author(self, user_id: int, city_id: int,
                           bank_account_number: str,
@@ -195,17 +393,17 @@ class AuthorService:
         async with self.pool.acquire() as conn:
             # Check user existence
             user = await conn.fetchrow(
-                "SELECT * FROM users WHERE user_id = $1",
+                """
+                SELECT user_id, username, email, first_name, last_name, role
+                FROM users WHERE user_id = $1
+                """,
                 user_id
             )
             if not user:
                 raise HTTPException(status_code=404, detail="User not found")
 
             # Check city existence
-            city = await conn.fetchrow(
-                "SELECT * FROM cities WHERE city_id = $1",
-                city_id
-            )
+            city = await self._get_city(conn, city_id)
             if not city:
                 raise HTTPException(status_code=404, detail="City not found")
 
@@ -232,8 +430,8 @@ class AuthorService:
                 
                 return {
                     **dict(author),
-                    'user': dict(user),
-                    'city': dict(city)
+                    'user': {**dict(user), 'role': 'author'},
+                    'city': city
                 }
             except asyncpg.UniqueViolationError:
                 raise HTTPException(
@@ -241,30 +439,115 @@ class AuthorService:
                     detail="This user is already registered as an author"
                 )
 
-    async def get_authors(self, skip: int = 0, limit: int = 10) -> List[dict]:
+    async def bulk_upsert_authors(self, authors: List[dict]) -> List[dict]:
+        """Insert or update many authors, matched on user_id.
+
+        User and city references are validated with one set-based lookup
+        per table; rows that fail validation are reported and skipped.
+        Valid rows are written with one INSERT ... ON CONFLICT, and newly
+        registered authors get the author role. Validation and writes share
+        one transaction, and the referenced users and cities stay locked
+        against deletion until it commits.
+        """
+        check_bulk_rows(authors)
+        kept, results = dedupe_rows(authors, ('user_id',))
+
         async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                users = await conn.fetch(
+                    "SELECT user_id FROM users WHERE user_id = ANY($1::int[]) FOR KEY SHARE",
+                    [authors[i]['user_id'] for i in kept]
+                )
+                cities = await conn.fetch(
+                    "SELECT city_id FROM cities WHERE city_id = ANY($1::int[]) FOR KEY SHARE",
+                    [authors[i]['city_id'] for i in kept]
+                )
+                user_ids = {row['user_id'] for row in users}
+                city_ids = {row['city_id'] for row in cities}
+
+                valid = []
+                for index in kept:
+                    if authors[index]['user_id'] not in user_ids:
+                        results.append({"index": index, "status": "user_not_found"})
+                    elif authors[index]['city_id'] not in city_ids:
+                        results.append({"index": index, "status": "city_not_found"})
+                    else:
+                        valid.append(index)
+
+                if valid:
+                    rows = await conn.fetch(
+                        """
+                        WITH upserted AS (
+                            INSERT INTO authors (user_id, city_id, bank_account_number,
+                                                 goodreads_link, bio)
+                            SELECT * FROM unnest($1::int[], $2::int[], $3::varchar[],
+                                                 $4::varchar[], $5::text[])
+                            ON CONFLICT (user_id) DO UPDATE
+                            SET city_id = EXCLUDED.city_id,
+                                bank_account_number = EXCLUDED.bank_account_number,
+                                goodreads_link = EXCLUDED.goodreads_link,
+                                bio = EXCLUDED.bio
+                            RETURNING author_id, user_id, (xmax = 0) AS inserted
+                        ),
+                        promoted AS (
+                            UPDATE users u
+                            SET role = 'author'
+                            FROM upserted
+                            WHERE u.user_id = upserted.user_id AND upserted.inserted
+                        )
+                        SELECT * FROM upserted
+                        """,
+                        [authors[i]['user_id'] for i in valid],
+                        [authors[i]['city_id'] for i in valid],
+                        [authors[i]['bank_account_number'] for i in valid],
+                        [authors[i].get('goodreads_link') for i in valid],
+                        [authors[i].get('bio') for i in valid]
+                    )
+
+                    written = {row['user_id']: row for row in rows}
+                    for index in valid:
+                        row = written[authors[index]['user_id']]
+                        results.append({
+                            "index": index,
+                            "status": "inserted" if row['inserted'] else "updated",
+                            "author_id": row['author_id']
+                        })
+
+        return sorted(results, key=lambda r: r['index'])
+
+    async def get_authors(self, limit: int = 10, after: Optional[str] = None) -> dict:
+        """List authors ordered by username using keyset pagination.
+
+        Usernames are unique and a user has at most one author row, so the
+        username alone is the key. Pages are read in order from the unique
+        users.username index, so a deep page costs the same as the first.
+        """
+        limit = clamp_limit(limit)
+        cursor = decode_cursor(after, 1)
+        # Two statements, as in CityService.get_cities
+        after_cursor = "WHERE u.username > $2::varchar" if cursor is not None else ""
+        async with self.pool.acquire_read() as conn:
             authors = await conn.fetch(
-                """
-                SELECT a.*, 
-                       row_to_json(u.*) as user,
-                       row_to_json(c.*) as city
-                FROM authors a
-                JOIN users u ON a.user_id = u.user_id
+                f"""
+                SELECT {AUTHOR_COLUMNS}
+                FROM users u
+                JOIN authors a ON a.user_id = u.user_id
                 JOIN cities c ON a.city_id = c.city_id
+                {after_cursor}
                 ORDER BY u.username
-                LIMIT $1 OFFSET $2
+                LIMIT $1
                 """,
-                limit, skip
+                limit + 1, *(cursor or [])
             )
-            return [dict(author) for author in authors]
+        page = keyset_page(authors, limit, ('username',))
+        page['items'] = [author_from_record(author) for author in page['items']]
+        return page
 
     async def get_author(self, author_id: int) -> Optional[dict]:
-        async with self.pool.acquire() as conn:
+        async with self.pool.acquire_read() as conn:
             author = await conn.fetchrow(
-                """
-                SELECT a.*, 
-                       row_to_json(u.*) as user,
-                       row_to_json(c.*) as city
+                f"""
+                SELECT {AUTHOR_COLUMNS}
                 FROM authors a
                 JOIN users u ON a.user_id = u.user_id
                 JOIN cities c ON a.city_id = c.city_id
@@ -272,7 +555,7 @@ class AuthorService:
                 """,
                 author_id
             )
-            return dict(author) if author else None
+            return author_from_record(author) if author else None
 
     async def update_author(self, author_id: int, 
                           city_id: Optional[int] = None,
@@ -280,45 +563,20 @@ class AuthorService:
                           goodreads_link: Optional[str] = None,
                           bio: Optional[str] = None) -> dict:
         async with self.pool.acquire() as conn:
-            # Build dynamic update query
-            updates = []
-            values = []
-            
             if city_id is not None:
                 # Check city existence
-                city = await conn.fetchrow(
-                    "SELECT * FROM cities WHERE city_id = $1",
-                    city_id
-                )
+                city = await self._get_city(conn, city_id)
                 if not city:
                     raise HTTPException(status_code=404, detail="City not found")
-                updates.append("city_id = $1")
-                values.append(city_id)
-                
-            if bank_account_number is not None:
-                updates.append(f"bank_account_number = ${len(values) + 1}")
-                values.append(bank_account_number)
-                
-            if goodreads_link is not None:
-                updates.append(f"goodreads_link = ${len(values) + 1}")
-                values.append(goodreads_link)
-                
-            if bio is not None:
-                updates.append(f"bio = ${len(values) + 1}")
-                values.append(bio)
 
-            if not updates:
+            if (city_id is None and bank_account_number is None
+                    and goodreads_link is None and bio is None):
                 return await self.get_author(author_id)
 
-            values.append(author_id)
-            query = f"""
-                UPDATE authors
-                SET {', '.join(updates)}
-                WHERE author_id = ${len(values)}
-                RETURNING *
-            """
-            
-            author = await conn.fetchrow(query, *values)
+            author = await registry.fetchrow(
+                conn, "update_author", author_id,
+                city_id, bank_account_number, goodreads_link, bio
+            )
             if not author:
                 raise HTTPException(status_code=404, detail="Author not found")
             
@@ -0,0 +1,291 @@
+import asyncio
+import logging
+import time
+import asyncpg
+import config
+from contextvars import ContextVar
+from typing import Dict, Optional
+from queries import registry, RegistryConnection
+from metrics import metrics
+from query_stats import slow_queries
+
+logger = logging.getLogger(__name__)
+
+# Username of the authenticated caller, set by the auth dependencies.
+# Used to keep a session's reads on the primary right after it writes.
+current_session: ContextVar[Optional[str]] = ContextVar("current_session", default=None)
+
+# Weight of the newest sample in PoolStats.recent_wait
+RECENT_WAIT_ALPHA = 0.2
+
+class PoolStats:
+    """Counters for connection acquisition, updated on every acquire/release"""
+    __slots__ = ('acquires', 'timeouts', 'waiting', 'in_use', 'max_in_use',
+                 'wait_total', 'wait_max', 'recent_wait', 'hold_total', 'hold_max')
+
+    def __init__(self):
+        self.acquires = 0
+        self.timeouts = 0
+        self.waiting = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.recent_wait = 0.0  # moving average of the last few waits
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "acquires": self.acquires,
+            "timeouts": self.timeouts,
+            "waiting": self.waiting,
+            "in_use": self.in_use,
+            "max_in_use": self.max_in_use,
+            "mean_wait_ms": round(self.wait_total * 1000 / self.acquires, 3) if self.acquires else 0.0,
+            "max_wait_ms": round(self.wait_max * 1000, 3),
+            "recent_wait_ms": round(self.recent_wait * 1000, 3),
+            "mean_hold_ms": round(self.hold_total * 1000 / self.acquires, 3) if self.acquires else 0.0,
+            "max_hold_ms": round(self.hold_max * 1000, 3)
+        }
+
+class _InstrumentedAcquire:
+    __slots__ = ('_pool', '_timeout', '_context', '_acquired_at')
+
+    def __init__(self, pool: 'InstrumentedPool', timeout):
+        self._pool = pool
+        self._timeout = timeout
+        self._context = None
+        self._acquired_at = 0.0
+
+    async def __aenter__(self):
+        stats = self._pool.stats
+        stats.waiting += 1
+        start = time.perf_counter()
+        self._context = self._pool.pool.acquire(timeout=self._timeout)
+        try:
+            conn = await self._context.__aenter__()
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            raise
+        finally:
+            stats.waiting -= 1
+
+        self._acquired_at = time.perf_counter()
+        wait = self._acquired_at - start
+        stats.acquires += 1
+        metrics.pool_wait.observe(wait)
+        stats.wait_total += wait
+        if wait > stats.wait_max:
+            stats.wait_max = wait
+        stats.recent_wait += (wait - stats.recent_wait) * RECENT_WAIT_ALPHA
+        stats.in_use += 1
+        if stats.in_use > stats.max_in_use:
+            stats.max_in_use = stats.in_use
+        return conn
+
+    async def __aexit__(self, *exc):
+        stats = self._pool.stats
+        hold = time.perf_counter() - self._acquired_at
+        stats.in_use -= 1
+        stats.hold_total += hold
+        if hold > stats.hold_max:
+            stats.hold_max = hold
+        return await self._context.__aexit__(*exc)
+
+class InstrumentedPool:
+    """asyncpg pool wrapper that measures wait time, hold time and in-use count.
+
+    Only ``acquire`` is intercepted; everything else is delegated to the
+    wrapped pool, so services can use it as a drop-in ``asyncpg.Pool``.
+    """
+
+    def __init__(self, pool: asyncpg.Pool):
+        self.pool = pool
+        self.stats = PoolStats()
+
+    def acquire(self, *, timeout=None) -> _InstrumentedAcquire:
+        return _InstrumentedAcquire(self, timeout)
+
+    async def warm_up(self):
+        """Open and exercise min_size connections before serving traffic"""
+        async def touch():
+            async with self.pool.acquire() as conn:
+                await conn.execute("SELECT 1")
+        await asyncio.gather(*(touch() for _ in range(self.pool.get_min_size())))
+
+    def report(self) -> dict:
+        return {
+            **self.stats.as_dict(),
+            "size": self.pool.get_size(),
+            "idle": self.pool.get_idle_size(),
+            "min_size": self.pool.get_min_size(),
+            "max_size": self.pool.get_max_size()
+        }
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
+
+async def init_connection(conn):
+    """Pool ``init`` callback: prepare registry statements and time queries"""
+    await registry.init_connection(conn)
+    if hasattr(conn, 'add_query_logger'):
+        conn.add_query_logger(metrics.count_query)
+        conn.add_query_logger(slow_queries.record)
+
+async def create_pool(min_size: Optional[int] = None, max_size: Optional[int] = None,
+                      **overrides) -> InstrumentedPool:
+    """Create the instrumented application pool from the settings in config.py"""
+    settings = dict(
+        user=config.DB_USER,
+        password=config.DB_PASSWORD,
+        database=config.DB_NAME,
+        host=config.DB_HOST,
+        port=config.DB_PORT,
+        min_size=min_size if min_size is not None else config.DB_POOL_MIN_SIZE,
+        max_size=max_size if max_size is not None else config.DB_POOL_MAX_SIZE,
+        max_queries=config.DB_POOL_MAX_QUERIES,
+        max_inactive_connection_lifetime=config.DB_POOL_MAX_INACTIVE_LIFETIME,
+        statement_cache_size=config.DB_STATEMENT_CACHE_SIZE,
+        command_timeout=config.DB_COMMAND_TIMEOUT,
+        connection_class=RegistryConnection,
+        init=init_connection
+    )
+    settings.update(overrides)
+    pool = InstrumentedPool(await asyncpg.create_pool(**settings))
+    if config.DB_POOL_WARMUP:
+        await pool.warm_up()
+    return pool
+
+class PoolRouter:
+    """Routes read-only work to a replica pool and everything else to the primary.
+
+    ``acquire`` always returns a primary connection and is meant for work
+    that may write; it also records the current session as a recent writer.
+    ``acquire_read`` uses the replica unless there is none, its measured lag
+    is over ``max_lag``, or the current session wrote within the
+    read-your-writes window.
+    """
+
+    def __init__(self, primary: InstrumentedPool, replica: Optional[InstrumentedPool] = None,
+                 max_lag: float = 5.0, read_your_writes: float = 10.0,
+                 lag_check_interval: float = 1.0):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag = max_lag
+        self.read_your_writes = read_your_writes
+        self.lag_check_interval = lag_check_interval
+        self.replica_lag: Optional[float] = None
+        self.routed = {"primary": 0, "replica": 0}
+        self._recent_writes: Dict[str, float] = {}
+        self._lag_task: Optional[asyncio.Task] = None
+
+    def acquire(self, *, timeout=None):
+        session = current_session.get()
+        if session is not None:
+            now = time.monotonic()
+            self._recent_writes[session] = now
+            if len(self._recent_writes) > 10000:
+                self._prune(now)
+        self.routed["primary"] += 1
+        return self.primary.acquire(timeout=timeout)
+
+    def acquire_read(self, *, timeout=None):
+        if self._replica_usable():
+            self.routed["replica"] += 1
+            return self.replica.acquire(timeout=timeout)
+        self.routed["primary"] += 1
+        return self.primary.acquire(timeout=timeout)
+
+    def wrote_recently(self) -> bool:
+        """Whether the current session wrote within the read-your-writes window"""
+        session = current_session.get()
+        if session is None:
+            return False
+        written = self._recent_writes.get(session)
+        return written is not None and time.monotonic() - written < self.read_your_writes
+
+    def _replica_usable(self) -> bool:
+        if self.replica is None or self.replica_lag is None or self.replica_lag > self.max_lag:
+            return False
+        return not self.wrote_recently()
+
+    def _prune(self, now: float):
+        self._recent_writes = {
+            session: written for session, written in self._recent_writes.items()
+            if now - written < self.read_your_writes
+        }
+
+    async def check_replica_lag(self):
+        """Measure replay lag; an unreachable replica counts as unusable"""
+        try:
+            async with self.replica.acquire() as conn:
+                self.replica_lag = await conn.fetchval(
+                    """
+                    SELECT CASE
+                        WHEN NOT pg_is_in_recovery() THEN 0
+                        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+                    END::float8
+                    """
+                )
+        except Exception:
+            # Anything but cancellation, including interface errors and a
+            # closed pool: an unmeasured replica must not keep serving reads
+            logger.warning("Replica lag check failed; routing reads to the primary", exc_info=True)
+            self.replica_lag = None
+
+    async def _lag_loop(self):
+        while True:
+            await self.check_replica_lag()
+            await asyncio.sleep(self.lag_check_interval)
+
+    def start(self):
+        if self.replica is not None and self._lag_task is None:
+            self._lag_task = asyncio.create_task(self._lag_loop())
+
+    async def close(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            try:
+                await self._lag_task
+            except asyncio.CancelledError:
+                pass
+            self._lag_task = None
+        await self.primary.close()
+        if self.replica is not None:
+            await self.replica.close()
+
+    def report(self) -> dict:
+        return {
+            "primary": self.primary.report(),
+            "replica": self.replica.report() if self.replica is not None else None,
+            "replica_lag_seconds": self.replica_lag,
+            "routed": dict(self.routed)
+        }
+
+    def __getattr__(self, name):
+        return getattr(self.primary, name)
+
+async def create_router() -> PoolRouter:
+    """Create the primary pool and, if configured, the replica pool"""
+    primary = await create_pool()
+    replica = None
+    if config.REPLICA_HOST:
+        replica = await create_pool(
+            config.REPLICA_POOL_MIN_SIZE,
+            config.REPLICA_POOL_MAX_SIZE,
+            host=config.REPLICA_HOST,
+            port=config.REPLICA_PORT
+        )
+    router = PoolRouter(
+        primary,
+        replica,
+        max_lag=config.REPLICA_MAX_LAG_SECONDS,
+        read_your_writes=config.READ_YOUR_WRITES_SECONDS,
+        lag_check_interval=config.REPLICA_LAG_CHECK_SECONDS
+    )
+    if replica is not None:
+        await router.check_replica_lag()
+        router.start()
+    return router
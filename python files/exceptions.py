@@ -7,11 +7,13 @@ class BookStoreException(Exception):
         self, 
         message: str, 
         status_code: int = status.HTTP_400_BAD_REQUEST,
-        details: Optional[Dict[str, Any]] = None
+        details: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None
     ):
         self.message = message
         self.status_code = status_code
         self.details = details or {}
+        self.headers = headers
         super().__init__(self.message)
 
 class AuthenticationError(BookStoreException):
@@ -84,4 +86,23 @@ class DatabaseError(BookStoreException):
             message=message,
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             details=details
-        )
\ No newline at end of file
+        )
+
+class IdempotencyConflictError(BookStoreException):
+    """Idempotency key related errors"""
+    def __init__(self, message: str, details: Optional[Dict[str, Any]] = None):
+        super().__init__(
+            message=message,
+            status_code=status.HTTP_409_CONFLICT,
+            details=details
+        )
+
+class RateLimitError(BookStoreException):
+    """Per-user request rate related errors"""
+    def __init__(self, message: str, retry_after: int, details: Optional[Dict[str, Any]] = None):
+        super().__init__(
+            message=message,
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            details={**(details or {}), "retry_after": retry_after},
+            headers={"Retry-After": str(retry_after)}
+        )
@@ -0,0 +1,170 @@
+"""Idempotency-Key support for POST endpoints that move money.
+
+A client that retries ``POST /reservations/``, ``/subscription/upgrade/``
+or ``/wallet/charge/`` with the same ``Idempotency-Key`` header gets the
+first response back instead of a second charge.
+
+The response is written to ``idempotency_keys`` by the service, inside the
+same transaction as the reservation or wallet update, so either both are
+committed or neither is. A concurrent duplicate blocks on the key's primary
+key until the first transaction commits, then fails its own insert and
+rolls back. Replays are served from a small in-process LRU and fall back to
+the table, so they never touch books, customers or reservations. The LRU
+only caches committed rows and is safe with several workers.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import Any, Optional, Tuple
+
+import asyncpg
+from fastapi.responses import Response
+
+from exceptions import IdempotencyConflictError, ValidationError
+from queries import registry
+from responses import dumps
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+
+class DuplicateRequest(Exception):
+    """A concurrent request with the same key committed its response first"""
+
+class IdempotencyRecord:
+    """One keyed request. Services call ``save`` inside their write transaction"""
+    __slots__ = ('store', 'username', 'key', 'endpoint', 'request_hash', 'body')
+
+    def __init__(self, store: 'IdempotencyStore', username: str, key: str,
+                 endpoint: str, request_hash: str):
+        self.store = store
+        self.username = username
+        self.key = key
+        self.endpoint = endpoint
+        self.request_hash = request_hash
+        self.body: Optional[bytes] = None
+
+    async def save(self, conn, content: Any):
+        self.body = dumps(content)
+        saved = await registry.fetchval(
+            conn, "idempotency_record",
+            self.username, self.key, self.endpoint, self.request_hash,
+            200, self.body.decode('utf-8'), self.store.ttl
+        )
+        if saved is None:
+            raise DuplicateRequest()
+
+def transaction(conn, record: Optional[IdempotencyRecord]):
+    """A transaction when a response has to be saved with the write, else a no-op"""
+    return conn.transaction() if record is not None else nullcontext()
+
+class IdempotencyStore:
+    def __init__(self, pool, ttl_seconds: float = 86400, max_entries: int = 10000,
+                 purge_interval: float = 3600):
+        self.pool = pool
+        self.ttl = float(ttl_seconds)
+        self.max_entries = max_entries
+        self.purge_interval = purge_interval
+        # (username, key) -> (request_hash, status_code, body, expires_at)
+        self._cache: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()
+        self._purge_task: Optional[asyncio.Task] = None
+        self.hits = {"memory": 0, "database": 0}
+
+    def begin(self, username: str, key: str, endpoint: str, payload: dict) -> IdempotencyRecord:
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise ValidationError(
+                message="Invalid Idempotency-Key",
+                details={"max_length": MAX_KEY_LENGTH}
+            )
+        raw = json.dumps([endpoint, payload], sort_keys=True, default=str)
+        request_hash = hashlib.sha256(raw.encode()).hexdigest()
+        return IdempotencyRecord(self, username, key, endpoint, request_hash)
+
+    def _check(self, record: IdempotencyRecord, request_hash: str):
+        if request_hash != record.request_hash:
+            raise IdempotencyConflictError(
+                message="Idempotency-Key was already used with a different request",
+                details={"idempotency_key": record.key}
+            )
+
+    async def lookup(self, record: IdempotencyRecord) -> Optional[Response]:
+        """The stored response for this key, if the request was already completed"""
+        cache_key = (record.username, record.key)
+        entry = self._cache.get(cache_key)
+        if entry is not None:
+            request_hash, status_code, body, expires_at = entry
+            if expires_at > time.monotonic():
+                self._check(record, request_hash)
+                self._cache.move_to_end(cache_key)
+                self.hits["memory"] += 1
+                return Response(body, status_code=status_code, media_type="application/json")
+            del self._cache[cache_key]
+
+        # Always the primary: a replica may not have the row yet
+        async with self.pool.acquire() as conn:
+            row = await registry.fetchrow(
+                conn, "idempotency_lookup", record.username, record.key, self.ttl
+            )
+        if row is None:
+            return None
+        self._check(record, row['request_hash'])
+        body = row['response'].encode('utf-8')
+        self._remember(cache_key, row['request_hash'], row['status_code'], body, row['age'])
+        self.hits["database"] += 1
+        return Response(body, status_code=row['status_code'], media_type="application/json")
+
+    async def replay(self, record: IdempotencyRecord) -> Response:
+        """Response for a request that lost the race to a concurrent duplicate"""
+        response = await self.lookup(record)
+        if response is None:
+            raise IdempotencyConflictError(
+                message="A request with this Idempotency-Key is still in progress",
+                details={"idempotency_key": record.key}
+            )
+        return response
+
+    def complete(self, record: IdempotencyRecord) -> Response:
+        """Cache the committed response and return it to the first caller"""
+        self._remember((record.username, record.key), record.request_hash, 200, record.body, 0.0)
+        return Response(record.body, status_code=200, media_type="application/json")
+
+    def _remember(self, cache_key, request_hash: str, status_code: int, body: bytes, age: float):
+        self._cache[cache_key] = (
+            request_hash, status_code, body, time.monotonic() + self.ttl - age
+        )
+        self._cache.move_to_end(cache_key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def purge(self) -> int:
+        async with self.pool.acquire() as conn:
+            result = await conn.execute(
+                "DELETE FROM idempotency_keys WHERE created_at < NOW() - make_interval(secs => $1)",
+                self.ttl
+            )
+        return int(result.split()[-1])
+
+    async def _purge_loop(self):
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                await self.purge()
+            except (asyncpg.exceptions.PostgresError, OSError, asyncio.TimeoutError):
+                logger.exception("Purging expired idempotency keys failed")
+
+    def start(self):
+        if self._purge_task is None:
+            self._purge_task = asyncio.create_task(self._purge_loop())
+
+    async def stop(self):
+        if self._purge_task is not None:
+            self._purge_task.cancel()
+            try:
+                await self._purge_task
+            except asyncio.CancelledError:
+                pass
+            self._purge_task = None
@@ -0,0 +1,84 @@
+import asyncio
+import asyncpg
+from typing import Dict, Iterable, List
+
+class BookAuthorLoader:
+    """Request-scoped batch loader for the authors of books.
+
+    Calls to ``load`` made in the same event-loop tick are collected and
+    resolved together with a single ``= ANY($1)`` query over book_authors,
+    authors, users and cities. Results are memoized for the lifetime of the
+    loader, so create one per request.
+    """
+
+    def __init__(self, pool: asyncpg.Pool):
+        self.pool = pool
+        self._cache: Dict[int, asyncio.Future] = {}
+        self._pending: List[int] = []
+
+    def load(self, book_id: int) -> asyncio.Future:
+        future = self._cache.get(book_id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._cache[book_id] = future
+            if not self._pending:
+                loop.call_soon(lambda: asyncio.ensure_future(self._dispatch()))
+            self._pending.append(book_id)
+        return future
+
+    async def load_many(self, book_ids: Iterable[int]) -> Dict[int, List[dict]]:
+        book_ids = list(dict.fromkeys(book_ids))
+        results = await asyncio.gather(*(self.load(book_id) for book_id in book_ids))
+        return dict(zip(book_ids, results))
+
+    async def _dispatch(self):
+        book_ids, self._pending = self._pending, []
+        try:
+            authors = await self._fetch(book_ids)
+        except Exception as exc:
+            for book_id in book_ids:
+                future = self._cache.pop(book_id)
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for book_id in book_ids:
+            future = self._cache[book_id]
+            if not future.done():
+                future.set_result(authors.get(book_id, []))
+
+    async def _fetch(self, book_ids: List[int]) -> Dict[int, List[dict]]:
+        async with self.pool.acquire_read() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT ba.book_id, a.author_id, a.goodreads_link, a.bio,
+                       u.username, u.first_name, u.last_name,
+                       c.city_id, c.name AS city_name, c.province, c.country
+                FROM book_authors ba
+                JOIN authors a ON a.author_id = ba.author_id
+                JOIN users u ON u.user_id = a.user_id
+                LEFT JOIN cities c ON c.city_id = a.city_id
+                WHERE ba.book_id = ANY($1::int[])
+                ORDER BY ba.book_id, ba.created_at, a.author_id
+                """,
+                book_ids
+            )
+
+        authors: Dict[int, List[dict]] = {}
+        for row in rows:
+            authors.setdefault(row['book_id'], []).append({
+                "author_id": row['author_id'],
+                "username": row['username'],
+                "first_name": row['first_name'],
+                "last_name": row['last_name'],
+                "goodreads_link": row['goodreads_link'],
+                "bio": row['bio'],
+                "city": {
+                    "city_id": row['city_id'],
+                    "name": row['city_name'],
+                    "province": row['province'],
+                    "country": row['country']
+                } if row['city_id'] is not None else None
+            })
+        return authors
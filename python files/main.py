@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Depends, status
+from fastapi import FastAPI, Depends, HTTPException, Header, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -10,9 +10,44 @@ from decimal import Decimal
 from services import ReservationService
 from subscription_services import SubscriptionService
 from admin_services import AdminService
-from models import ReservationCreate, ReservationResponse, QueuePosition
-from middleware import error_handler
+from analytics_services import AnalyticsService
+from crud_services import CityService, GenreService, AuthorService
+from batch_services import BatchService
+from reference_cache import ReferenceDataCache, CHANNEL as REFERENCE_CHANNEL
+from loaders import BookAuthorLoader
+from queries import registry
+from db import create_router, current_session
+from server import check_worker_safety
+import config
+from models import (
+    ReservationCreate,
+    ReservationResponse,
+    QueuePosition,
+    BulkReservationEnd,
+    BulkTokenRevoke,
+    BatchRequest,
+    CityCreate,
+    CityUpdate,
+    GenreCreate,
+    GenreUpdate,
+    AuthorCreate,
+    AuthorUpdate,
+    CityBulkUpsert,
+    GenreBulkUpsert,
+    AuthorBulkUpsert
+)
+from middleware import error_handler, setup_logging, shutdown_logging
+from metrics import metrics, metrics_middleware
+from admission import admission, admission_middleware, login_key, rate_limits
+from query_stats import slow_queries
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from responses import FastJSONResponse
+from idempotency import IdempotencyStore, DuplicateRequest
+from singleflight import SingleFlight
+from outbox import OutboxDispatcher
+from queue_events import QueueEventHub
 from exceptions import (
+    BookStoreException,
     AuthenticationError,
     AuthorizationError,
     ResourceNotFoundError,
@@ -20,7 +55,9 @@ from exceptions import (
     InsufficientFundsError,
     SubscriptionError,
     ReservationError,
-    DatabaseError
+    DatabaseError,
+    IdempotencyConflictError,
+    RateLimitError
 )
 from auth import (
     get_password_hash,
@@ -45,26 +82,85 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Registration order is inside-out: metrics wraps admission so shed
+# requests are still counted
 app.middleware("http")(error_handler)
+app.middleware("http")(admission_middleware)
+app.middleware("http")(metrics_middleware)
 
-# Database connection settings
+# Database connection settings (see config.py)
 async def init_db():
     try:
-        return await asyncpg.create_pool(
-            user="postgres",
-            password="1497",
-            database="bookstore_db",
-            host="localhost"
-        )
+        return await create_router()
     except Exception as e:
         raise DatabaseError(f"Database connection error: {str(e)}")
 
+async def promote_waiting(event_type: str, payload: dict):
+    """Outbox consumer: hand a freed unit to the head of the book's queue"""
+    await app.state.reservation_service.promote_waiting(payload['book_id'])
+
 @app.on_event("startup")
 async def startup_event():
+    setup_logging()
+    check_worker_safety(config.WORKERS, config.ALLOW_PROCESS_LOCAL_STATE)
     app.state.pool = await init_db()
     app.state.reservation_service = ReservationService(app.state.pool)
     app.state.subscription_service = SubscriptionService(app.state.pool)
     app.state.admin_service = AdminService(app.state.pool)
+    app.state.batch_service = BatchService(
+        app.state.pool, app.state.reservation_service
+    )
+    app.state.analytics_service = AnalyticsService(
+        app.state.pool, config.ANALYTICS_REFRESH_SECONDS
+    )
+    app.state.reference_cache = ReferenceDataCache(app.state.pool)
+    await app.state.reference_cache.load()
+    app.state.city_service = CityService(app.state.pool, app.state.reference_cache)
+    app.state.genre_service = GenreService(app.state.pool, app.state.reference_cache)
+    app.state.author_service = AuthorService(app.state.pool, app.state.reference_cache)
+    app.state.idempotency = IdempotencyStore(
+        app.state.pool,
+        config.IDEMPOTENCY_TTL_SECONDS,
+        config.IDEMPOTENCY_CACHE_SIZE,
+        config.IDEMPOTENCY_PURGE_SECONDS
+    )
+    # Consumers subscribe with app.state.outbox.subscribe(event_type, consumer)
+    app.state.outbox = OutboxDispatcher(
+        app.state.pool,
+        config.OUTBOX_BATCH_SIZE,
+        config.OUTBOX_POLL_SECONDS,
+        config.OUTBOX_MAX_ATTEMPTS,
+        config.OUTBOX_LEASE_SECONDS
+    )
+    app.state.outbox.subscribe("reservation.ended", promote_waiting)
+    app.state.queue_events = QueueEventHub(
+        app.state.pool,
+        config.QUEUE_EVENTS_MAX_PENDING,
+        config.QUEUE_EVENTS_KEEPALIVE_SECONDS,
+        config.QUEUE_EVENTS_RECONNECT_SECONDS
+    )
+    # City and genre changes made by other workers arrive on the same LISTEN connection
+    app.state.queue_events.listen(
+        REFERENCE_CHANNEL,
+        app.state.reference_cache.on_notify,
+        app.state.reference_cache.resync
+    )
+    app.state.analytics_service.start()
+    app.state.reference_cache.start()
+    app.state.idempotency.start()
+    app.state.outbox.start()
+    app.state.queue_events.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await app.state.analytics_service.stop()
+    await app.state.idempotency.stop()
+    await app.state.outbox.stop()
+    await app.state.queue_events.stop()
+    await app.state.reference_cache.stop()
+    await app.state.pool.close()
+    await slow_queries.close()
+    shutdown_logging()
 
 # Base Models
 class Book(BaseModel):
@@ -101,31 +197,62 @@ class WalletCharge(BaseModel):
     amount: Decimal
 
 # Helper function to validate token
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+def decode_token(token: str):
+    """Decode a bearer token and return its subject and issue time"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise AuthenticationError("Invalid token")
-
-        # Check if token is revoked
-        async with app.state.pool.acquire() as conn:
-            revoked = await conn.fetchrow(
-                """
-                SELECT * FROM revoked_tokens 
-                WHERE username = $1 AND revoked_at > $2
-                """,
-                username, 
-                datetime.fromtimestamp(payload.get("iat", 0))
-            )
-            
-            if revoked:
-                raise AuthenticationError("Token has been revoked")
-                
-        return username
     except JWTError:
         raise AuthenticationError("Invalid token")
 
+    username: str = payload.get("sub")
+    if username is None:
+        raise AuthenticationError("Invalid token")
+
+    return username, datetime.fromtimestamp(payload.get("iat", 0))
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    username, issued_at = decode_token(token)
+
+    # Check if token is revoked
+    async with app.state.pool.acquire() as conn:
+        revoked = await registry.fetchrow(
+            conn, "token_revoked", username, issued_at
+        )
+        
+        if revoked:
+            raise AuthenticationError("Token has been revoked")
+
+    current_session.set(username)
+    return username
+
+async def get_current_admin(token: str = Depends(oauth2_scheme)):
+    """Validate token and require the admin role.
+
+    The role is read in the same query as the revocation check, so admin
+    routes pay a single round trip for authentication and authorization.
+    """
+    username, issued_at = decode_token(token)
+
+    async with app.state.pool.acquire() as conn:
+        user = await registry.fetchrow(
+            conn, "admin_principal", username, issued_at
+        )
+
+    if not user:
+        raise AuthenticationError("Invalid token")
+
+    if user['revoked']:
+        raise AuthenticationError("Token has been revoked")
+
+    if user['role'] != 'admin':
+        raise AuthorizationError(
+            message="You do not have the necessary permissions for this operation",
+            details={"required_role": "admin"}
+        )
+
+    current_session.set(username)
+    return username
+
 # Routes (Endpoints)
 @app.post("/users/")
 async def create_user(user: User):
@@ -176,12 +303,12 @@ async def create_user(user: User):
     return {"message": "User created successfully"}
 
 @app.post("/login/")
-async def login(user_data: UserLogin):
+async def login(user_data: UserLogin, request: Request):
+    rate_limits["login"].check(login_key(request, user_data.username))
     try:
         async with app.state.pool.acquire() as conn:
-            user = await conn.fetchrow(
-                "SELECT * FROM users WHERE username = $1",
-                user_data.username
+            user = await registry.fetchrow(
+                conn, "user_by_username", user_data.username
             )
 
         if not user or not verify_password(user_data.password, user['password']):
@@ -251,30 +378,59 @@ async def create_book(book: Book, username: str = Depends(get_current_user)):
         
     return {"message": "Book registered successfully"}
 
-@app.get("/books/")
-async def get_books(username: str = Depends(get_current_user)):
+books_flight = SingleFlight("books")
+
+async def read_books():
+    async with app.state.pool.acquire_read() as conn:
+        return await registry.fetch(conn, "books_list")
+
+def get_author_loader() -> BookAuthorLoader:
+    """Fresh batch loader per request, so memoized authors never go stale"""
+    return BookAuthorLoader(app.state.pool)
+
+@app.get("/books/", response_class=FastJSONResponse)
+async def get_books(
+    include_authors: bool = False,
+    username: str = Depends(get_current_user),
+    author_loader: BookAuthorLoader = Depends(get_author_loader)
+):
     try:
-        async with app.state.pool.acquire() as conn:
-            books = await conn.fetch("SELECT * FROM books")
-        return books
+        # Concurrent listings share one query; the rows are read-only
+        books = await books_flight.do(
+            "books_list", read_books, share=not app.state.pool.wrote_recently()
+        )
+        if include_authors:
+            authors = await author_loader.load_many(b['book_id'] for b in books)
+            return FastJSONResponse(
+                [{**dict(b), "authors": authors[b['book_id']]} for b in books]
+            )
+        return FastJSONResponse(books)
     except Exception as e:
         raise DatabaseError(f"Error in retrieving book list: {str(e)}")
 
 @app.post("/reservations/", response_model=ReservationResponse)
 async def create_reservation(
     reservation: ReservationCreate,
-    username: str = Depends(get_current_user)
+    username: str = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
 ):
+    record = None
+    if idempotency_key is not None:
+        record = app.state.idempotency.begin(
+            username, idempotency_key, "/reservations/", reservation.dict()
+        )
     try:
+        if record is not None:
+            replay = await app.state.idempotency.lookup(record)
+            if replay is not None:
+                return replay
+
+        # Only new work takes a token; a retry replayed above never sees a 429
+        rate_limits["reservations"].check(username)
+
         async with app.state.pool.acquire() as conn:
-            customer = await conn.fetchrow(
-                """
-                SELECT c.customer_id 
-                FROM customers c
-                JOIN users u ON c.user_id = u.user_id
-                WHERE u.username = $1
-                """,
-                username
+            customer = await registry.fetchrow(
+                conn, "customer_by_username", username
             )
             
             if not customer:
@@ -286,10 +442,17 @@ async def create_reservation(
             result = await app.state.reservation_service.create_reservation(
                 customer['customer_id'],
                 reservation.book_id,
-                reservation.days
+                reservation.days,
+                record
             )
             
+            if record is not None:
+                return app.state.idempotency.complete(record)
             return result
+    except DuplicateRequest:
+        return await app.state.idempotency.replay(record)
+    except (IdempotencyConflictError, RateLimitError) as e:
+        raise e
     except InsufficientFundsError as e:
         raise InsufficientFundsError(
             message="Insufficient funds",
@@ -304,21 +467,52 @@ async def create_reservation(
     except Exception as e:
         raise DatabaseError(f"Error in creating reservation: {str(e)}")
 
+@app.get("/reservations/queue/events")
+async def stream_queue_events(request: Request, username: str = Depends(get_current_user)):
+    """Server-sent events with queue position changes and promotions"""
+    try:
+        async with app.state.pool.acquire_read() as conn:
+            customer = await registry.fetchrow(
+                conn, "customer_by_username", username
+            )
+
+        if not customer:
+            raise ResourceNotFoundError(
+                message="Customer not found",
+                details={"username": username}
+            )
+
+        return StreamingResponse(
+            app.state.queue_events.stream(request, customer['customer_id']),
+            media_type="text/event-stream",
+            # Stop proxies from caching or buffering the stream
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in opening queue event stream: {str(e)}")
+
 @app.post("/subscription/upgrade/")
 async def upgrade_subscription(
     upgrade_data: SubscriptionUpgrade,
-    username: str = Depends(get_current_user)
+    username: str = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
 ):
+    record = None
+    if idempotency_key is not None:
+        record = app.state.idempotency.begin(
+            username, idempotency_key, "/subscription/upgrade/", upgrade_data.dict()
+        )
     try:
+        if record is not None:
+            replay = await app.state.idempotency.lookup(record)
+            if replay is not None:
+                return replay
+
         async with app.state.pool.acquire() as conn:
-            customer = await conn.fetchrow(
-                """
-                SELECT c.customer_id 
-                FROM customers c
-                JOIN users u ON c.user_id = u.user_id
-                WHERE u.username = $1
-                """,
-                username
+            customer = await registry.fetchrow(
+                conn, "customer_by_username", username
             )
             
             if not customer:
@@ -330,9 +524,16 @@ async def upgrade_subscription(
             result = await app.state.subscription_service.upgrade_subscription(
                 customer['customer_id'],
                 upgrade_data.new_model,
-                upgrade_data.months
+                upgrade_data.months,
+                record
             )
+            if record is not None:
+                return app.state.idempotency.complete(record)
             return result
+    except DuplicateRequest:
+        return await app.state.idempotency.replay(record)
+    except IdempotencyConflictError as e:
+        raise e
     except InsufficientFundsError as e:
         raise InsufficientFundsError(
             message="Insufficient funds",
@@ -349,18 +550,23 @@ async def upgrade_subscription(
 @app.post("/wallet/charge/")
 async def charge_wallet(
     charge_data: WalletCharge,
-    username: str = Depends(get_current_user)
+    username: str = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None)
 ):
+    record = None
+    if idempotency_key is not None:
+        record = app.state.idempotency.begin(
+            username, idempotency_key, "/wallet/charge/", charge_data.dict()
+        )
     try:
+        if record is not None:
+            replay = await app.state.idempotency.lookup(record)
+            if replay is not None:
+                return replay
+
         async with app.state.pool.acquire() as conn:
-            customer = await conn.fetchrow(
-                """
-                SELECT c.customer_id 
-                FROM customers c
-                JOIN users u ON c.user_id = u.user_id
-                WHERE u.username = $1
-                """,
-                username
+            customer = await registry.fetchrow(
+                conn, "customer_by_username", username
             )
             
             if not customer:
@@ -371,9 +577,16 @@ async def charge_wallet(
                 
             result = await app.state.subscription_service.add_wallet_balance(
                 customer['customer_id'],
-                charge_data.amount
+                charge_data.amount,
+                record
             )
+            if record is not None:
+                return app.state.idempotency.complete(record)
             return result
+    except DuplicateRequest:
+        return await app.state.idempotency.replay(record)
+    except IdempotencyConflictError as e:
+        raise e
     except ValidationError as e:
         raise ValidationError(
             message="Invalid charge amount",
@@ -382,18 +595,12 @@ async def charge_wallet(
     except Exception as e:
         raise DatabaseError(f"Error in charging wallet: {str(e)}")
 
-@app.get("/subscription/info/")
+@app.get("/subscription/info/", response_class=FastJSONResponse)
 async def get_subscription_info(username: str = Depends(get_current_user)):
     try:
-        async with app.state.pool.acquire() as conn:
-            customer = await conn.fetchrow(
-                """
-                SELECT c.customer_id 
-                FROM customers c
-                JOIN users u ON c.user_id = u.user_id
-                WHERE u.username = $1
-                """,
-                username
+        async with app.state.pool.acquire_read() as conn:
+            customer = await registry.fetchrow(
+                conn, "customer_by_username", username
             )
             
             if not customer:
@@ -402,8 +609,10 @@ async def get_subscription_info(username: str = Depends(get_current_user)):
                     details={"username": username}
                 )
                 
-            return await app.state.subscription_service.get_subscription_info(
-                customer['customer_id']
+            return FastJSONResponse(
+                await app.state.subscription_service.get_subscription_info(
+                    customer['customer_id']
+                )
             )
     except Exception as e:
         raise DatabaseError(f"Error in retrieving subscription info: {str(e)}")
@@ -411,15 +620,9 @@ async def get_subscription_info(username: str = Depends(get_current_user)):
 @app.get("/wallet/balance/")
 async def get_wallet_balance(username: str = Depends(get_current_user)):
     try:
-        async with app.state.pool.acquire() as conn:
-            customer = await conn.fetchrow(
-                """
-                SELECT c.customer_id 
-                FROM customers c
-                JOIN users u ON c.user_id = u.user_id
-                WHERE u.username = $1
-                """,
-                username
+        async with app.state.pool.acquire_read() as conn:
+            customer = await registry.fetchrow(
+                conn, "customer_by_username", username
             )
             
             if not customer:
@@ -436,6 +639,23 @@ async def get_wallet_balance(username: str = Depends(get_current_user)):
     except Exception as e:
         raise DatabaseError(f"Error in retrieving wallet balance: {str(e)}")
 
+@app.post("/batch", response_class=FastJSONResponse)
+async def run_batch(
+    batch: BatchRequest,
+    username: str = Depends(get_current_user)
+):
+    """Run several read operations with one authentication and one connection"""
+    try:
+        results = await app.state.batch_service.run(
+            username,
+            [operation.dict() for operation in batch.operations]
+        )
+        return FastJSONResponse({"results": results})
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in running batch: {str(e)}")
+
 @app.post("/admin/revoke-token/{username}")
 async def revoke_user_token(
     username: str,
@@ -512,42 +732,454 @@ async def end_reservation(
     except Exception as e:
         raise DatabaseError(f"Error in ending reservation: {str(e)}")
 
-@app.get("/admin/book-status/{book_id}")
+@app.post("/admin/revoke-tokens/")
+async def revoke_user_tokens(
+    revoke_data: BulkTokenRevoke,
+    current_user: str = Depends(get_current_admin)
+):
+    """Revoke the tokens of many users in one call"""
+    try:
+        results = await app.state.admin_service.revoke_user_tokens(
+            current_user,
+            revoke_data.usernames
+        )
+        return {
+            "revoked": sum(1 for r in results if r['outcome'] == 'revoked'),
+            "results": results
+        }
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in revoking user tokens: {str(e)}")
+
+@app.post("/admin/end-reservations/")
+async def end_reservations(
+    end_data: BulkReservationEnd,
+    current_user: str = Depends(get_current_admin)
+):
+    """End many reservations in one call"""
+    try:
+        results = await app.state.admin_service.end_reservations(
+            current_user,
+            end_data.reservation_ids
+        )
+        return {
+            "ended": sum(1 for r in results if r['outcome'] == 'ended'),
+            "results": results
+        }
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in ending reservations: {str(e)}")
+
+@app.get("/admin/book-status/{book_id}", response_class=FastJSONResponse)
 async def get_book_status(
     book_id: int,
-    current_user: str = Depends(get_current_user)
+    limit: int = 50,
+    active_after: Optional[str] = None,
+    waiting_after: Optional[str] = None,
+    current_user: str = Depends(get_current_admin)
 ):
     """Get the full status of a book"""
     try:
-        async with app.state.pool.acquire() as conn:
-            admin = await conn.fetchrow(
-                "SELECT role FROM users WHERE username = $1",
-                current_user
+        return FastJSONResponse(
+            await app.state.admin_service.get_book_status(
+                book_id,
+                limit,
+                active_after,
+                waiting_after
             )
-            if admin['role'] != 'admin':
-                raise AuthorizationError(
-                    message="You do not have the necessary permissions for this operation",
-                    details={"required_role": "admin"}
-                )
-            
-            book = await conn.fetchrow(
-                "SELECT * FROM books WHERE book_id = $1",
-                book_id
+        )
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in retrieving book status: {str(e)}")
+
+@app.get("/admin/analytics")
+async def get_analytics(
+    top: int = 20,
+    current_user: str = Depends(get_current_admin)
+):
+    """Utilization, revenue per genre, queue depth and tier mix"""
+    try:
+        return await app.state.analytics_service.get_analytics(top)
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in retrieving analytics: {str(e)}")
+
+# Cities
+@app.get("/cities/")
+async def get_cities(
+    limit: int = 10,
+    after: Optional[str] = None,
+    username: str = Depends(get_current_user)
+):
+    try:
+        return await app.state.city_service.get_cities(limit, after)
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in retrieving city list: {str(e)}")
+
+@app.get("/cities/{city_id}")
+async def get_city(city_id: int, username: str = Depends(get_current_user)):
+    try:
+        city = await app.state.city_service.get_city(city_id)
+    except Exception as e:
+        raise DatabaseError(f"Error in retrieving city: {str(e)}")
+    if not city:
+        raise ResourceNotFoundError(
+            message="City not found",
+            details={"city_id": city_id}
+        )
+    return city
+
+@app.post("/cities/")
+async def create_city(city: CityCreate, current_user: str = Depends(get_current_admin)):
+    try:
+        return await app.state.city_service.create_city(
+            city.name, city.province, city.country
+        )
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in registering city: {str(e)}")
+
+@app.post("/cities/bulk")
+async def bulk_upsert_cities(
+    upsert_data: CityBulkUpsert,
+    current_user: str = Depends(get_current_admin)
+):
+    try:
+        # Unset fields stay out, so an omitted country keeps the stored one
+        return {
+            "results": await app.state.city_service.bulk_upsert_cities(
+                [city.dict(exclude_unset=True) for city in upsert_data.cities]
             )
-            if not book:
-                raise ResourceNotFoundError(
-                    message="Book not found",
-                    details={"book_id": book_id}
-                )
-            
-            return await app.state.admin_service.get_book_status(
-                current_user,
-                book_id
+        }
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in upserting cities: {str(e)}")
+
+@app.put("/cities/{city_id}")
+async def update_city(
+    city_id: int,
+    city: CityUpdate,
+    current_user: str = Depends(get_current_admin)
+):
+    try:
+        updated = await app.state.city_service.update_city(
+            city_id, city.name, city.province, city.country
+        )
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in updating city: {str(e)}")
+    if not updated:
+        raise ResourceNotFoundError(
+            message="City not found",
+            details={"city_id": city_id}
+        )
+    return updated
+
+@app.delete("/cities/{city_id}")
+async def delete_city(city_id: int, current_user: str = Depends(get_current_admin)):
+    try:
+        deleted = await app.state.city_service.delete_city(city_id)
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in deleting city: {str(e)}")
+    if not deleted:
+        raise ResourceNotFoundError(
+            message="City not found",
+            details={"city_id": city_id}
+        )
+    return {"message": "City deleted successfully"}
+
+# Genres
+@app.get("/genres/")
+async def get_genres(
+    limit: int = 10,
+    after: Optional[str] = None,
+    username: str = Depends(get_current_user)
+):
+    try:
+        return await app.state.genre_service.get_genres(limit, after)
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in retrieving genre list: {str(e)}")
+
+@app.get("/genres/{genre_id}")
+async def get_genre(genre_id: int, username: str = Depends(get_current_user)):
+    try:
+        genre = await app.state.genre_service.get_genre(genre_id)
+    except Exception as e:
+        raise DatabaseError(f"Error in retrieving genre: {str(e)}")
+    if not genre:
+        raise ResourceNotFoundError(
+            message="Genre not found",
+            details={"genre_id": genre_id}
+        )
+    return genre
+
+@app.post("/genres/")
+async def create_genre(genre: GenreCreate, current_user: str = Depends(get_current_admin)):
+    try:
+        return await app.state.genre_service.create_genre(genre.name, genre.description)
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in registering genre: {str(e)}")
+
+@app.post("/genres/bulk")
+async def bulk_upsert_genres(
+    upsert_data: GenreBulkUpsert,
+    current_user: str = Depends(get_current_admin)
+):
+    try:
+        return {
+            "results": await app.state.genre_service.bulk_upsert_genres(
+                [genre.dict() for genre in upsert_data.genres]
             )
-    except (AuthorizationError, ResourceNotFoundError) as e:
+        }
+    except (BookStoreException, HTTPException) as e:
         raise e
     except Exception as e:
-        raise DatabaseError(f"Error in retrieving book status: {str(e)}")
+        raise DatabaseError(f"Error in upserting genres: {str(e)}")
+
+@app.put("/genres/{genre_id}")
+async def update_genre(
+    genre_id: int,
+    genre: GenreUpdate,
+    current_user: str = Depends(get_current_admin)
+):
+    try:
+        updated = await app.state.genre_service.update_genre(
+            genre_id, genre.name, genre.description
+        )
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in updating genre: {str(e)}")
+    if not updated:
+        raise ResourceNotFoundError(
+            message="Genre not found",
+            details={"genre_id": genre_id}
+        )
+    return updated
+
+@app.delete("/genres/{genre_id}")
+async def delete_genre(genre_id: int, current_user: str = Depends(get_current_admin)):
+    try:
+        deleted = await app.state.genre_service.delete_genre(genre_id)
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in deleting genre: {str(e)}")
+    if not deleted:
+        raise ResourceNotFoundError(
+            message="Genre not found",
+            details={"genre_id": genre_id}
+        )
+    return {"message": "Genre deleted successfully"}
+
+# Authors
+@app.get("/authors/")
+async def get_authors(
+    limit: int = 10,
+    after: Optional[str] = None,
+    username: str = Depends(get_current_user)
+):
+    try:
+        return await app.state.author_service.get_authors(limit, after)
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in retrieving author list: {str(e)}")
+
+@app.get("/authors/{author_id}")
+async def get_author(author_id: int, username: str = Depends(get_current_user)):
+    try:
+        author = await app.state.author_service.get_author(author_id)
+    except Exception as e:
+        raise DatabaseError(f"Error in retrieving author: {str(e)}")
+    if not author:
+        raise ResourceNotFoundError(
+            message="Author not found",
+            details={"author_id": author_id}
+        )
+    return author
+
+@app.post("/authors/")
+async def create_author(author: AuthorCreate, current_user: str = Depends(get_current_admin)):
+    try:
+        return await app.state.author_service.create_author(
+            author.user_id,
+            author.city_id,
+            author.bank_account_number,
+            author.goodreads_link,
+            author.bio
+        )
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in registering author: {str(e)}")
+
+@app.post("/authors/bulk")
+async def bulk_upsert_authors(
+    upsert_data: AuthorBulkUpsert,
+    current_user: str = Depends(get_current_admin)
+):
+    try:
+        return {
+            "results": await app.state.author_service.bulk_upsert_authors(
+                [author.dict() for author in upsert_data.authors]
+            )
+        }
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in upserting authors: {str(e)}")
+
+@app.put("/authors/{author_id}")
+async def update_author(
+    author_id: int,
+    author: AuthorUpdate,
+    current_user: str = Depends(get_current_admin)
+):
+    try:
+        updated = await app.state.author_service.update_author(
+            author_id,
+            author.city_id,
+            author.bank_account_number,
+            author.goodreads_link,
+            author.bio
+        )
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in updating author: {str(e)}")
+    if not updated:
+        raise ResourceNotFoundError(
+            message="Author not found",
+            details={"author_id": author_id}
+        )
+    return updated
+
+@app.delete("/authors/{author_id}")
+async def delete_author(author_id: int, current_user: str = Depends(get_current_admin)):
+    try:
+        deleted = await app.state.author_service.delete_author(author_id)
+    except (BookStoreException, HTTPException) as e:
+        raise e
+    except Exception as e:
+        raise DatabaseError(f"Error in deleting author: {str(e)}")
+    if not deleted:
+        raise ResourceNotFoundError(
+            message="Author not found",
+            details={"author_id": author_id}
+        )
+    return {"message": "Author deleted successfully"}
+
+@app.get("/admin/pool-stats")
+async def get_pool_stats(current_user: str = Depends(get_current_admin)):
+    """Connection pool wait time, hold time and in-use counts"""
+    return app.state.pool.report()
+
+@app.get("/admin/slow-queries")
+async def get_slow_queries(
+    limit: int = 20,
+    order: str = "total",
+    current_user: str = Depends(get_current_admin)
+):
+    """Top statements by total, mean or max time, with sampled EXPLAIN plans"""
+    return {
+        "threshold_ms": config.SLOW_QUERY_THRESHOLD_MS,
+        "queries": slow_queries.top(limit, order)
+    }
+
+@app.get("/admin/query-stats")
+async def get_query_stats(current_user: str = Depends(get_current_admin)):
+    """Prepare and execute statistics of the query registry and single-flight groups"""
+    try:
+        async with app.state.pool.acquire() as conn:
+            plan_cache = await registry.plan_cache_stats(conn)
+        return {
+            "statements": registry.report(),
+            "plan_cache": plan_cache,
+            "single_flight": {
+                name: group.report() for name, group in SingleFlight.groups.items()
+            }
+        }
+    except Exception as e:
+        raise DatabaseError(f"Error in retrieving query statistics: {str(e)}")
+
+@app.get("/admin/outbox")
+async def get_outbox_stats(current_user: str = Depends(get_current_admin)):
+    """Outbox backlog, dead letters and per-type delivery counts"""
+    try:
+        return await app.state.outbox.report()
+    except Exception as e:
+        raise DatabaseError(f"Error in retrieving outbox statistics: {str(e)}")
+
+@app.get("/admin/queue-events")
+async def get_queue_event_stats(current_user: str = Depends(get_current_admin)):
+    """Listener state and fan-out counters of this process"""
+    return app.state.queue_events.report()
+
+@app.get("/admin/reference-cache")
+async def get_reference_cache_stats(current_user: str = Depends(get_current_admin)):
+    """Size and invalidation counters of this process's city and genre cache"""
+    return app.state.reference_cache.report()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Request, latency, query and pool metrics in Prometheus text format"""
+    pool = app.state.pool.primary.stats
+    return PlainTextResponse(
+        metrics.render({
+            "bookstore_db_pool_in_use": ("Primary pool connections in use", pool.in_use),
+            "bookstore_db_pool_waiting": ("Requests waiting for a primary pool connection", pool.waiting),
+            "bookstore_idempotent_replays_memory": (
+                "Idempotent requests replayed from the in-process cache",
+                app.state.idempotency.hits["memory"]
+            ),
+            "bookstore_idempotent_replays_database": (
+                "Idempotent requests replayed from idempotency_keys",
+                app.state.idempotency.hits["database"]
+            ),
+            **SingleFlight.gauges(),
+            "bookstore_queue_event_subscribers": (
+                "Open queue event streams",
+                app.state.queue_events.report()["subscribers"]
+            ),
+            "bookstore_queue_event_messages_dropped": (
+                "Queue event messages dropped for slow clients",
+                app.state.queue_events.dropped
+            ),
+            "bookstore_requests_shed_in_flight": (
+                "Requests shed with 503 because too many were in flight",
+                admission.shed["in_flight"]
+            ),
+            "bookstore_requests_shed_pool": (
+                "Requests shed with 503 because of primary pool pressure",
+                admission.shed["pool"]
+            ),
+            "bookstore_rate_limited_login": (
+                "Login attempts rejected with 429",
+                rate_limits["login"].limited
+            ),
+            "bookstore_rate_limited_reservations": (
+                "Reservation requests rejected with 429",
+                rate_limits["reservations"].limited
+            ),
+        }),
+        media_type="text/plain; version=0.0.4"
+    )
 
 @app.get("/test-auth/")
 async def test_auth(username: str = Depends(get_current_user)):
@@ -558,5 +1190,5 @@ async def test_auth(username: str = Depends(get_current_user)):
         raise AuthenticationError("Error in validating token")
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    import server
+    server.main()
\ No newline at end of file
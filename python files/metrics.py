@@ -0,0 +1,142 @@
+"""In-process request metrics with Prometheus text exposition.
+
+Everything here is updated from the event loop thread only, so plain
+integer and float updates are safe without locks. Histogram buckets are
+preallocated lists; recording is a bisect and two additions.
+"""
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from fastapi import Request
+from typing import Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+# Per-request query counter. The middleware sets a fresh one-element list;
+# the connection query logger increments it.
+request_queries: ContextVar[Optional[List[int]]] = ContextVar("request_queries", default=None)
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class RouteMetrics:
+    __slots__ = ('statuses', 'latency', 'queries')
+
+    def __init__(self):
+        self.statuses: Dict[int, int] = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+
+class Metrics:
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self.in_flight = 0
+        self.pool_wait = Histogram(LATENCY_BUCKETS)
+
+    def route(self, method: str, path: str) -> RouteMetrics:
+        key = (method, path)
+        route = self.routes.get(key)
+        if route is None:
+            route = self.routes[key] = RouteMetrics()
+        return route
+
+    def count_query(self, *_):
+        counter = request_queries.get()
+        if counter is not None:
+            counter[0] += 1
+
+    def render(self, gauges: Optional[Dict[str, Tuple[str, float]]] = None) -> str:
+        """Prometheus text format; ``gauges`` maps name -> (help, value)"""
+        lines = [
+            "# HELP bookstore_http_requests_total Requests handled, by route and status",
+            "# TYPE bookstore_http_requests_total counter",
+        ]
+        for (method, path), route in self.routes.items():
+            for status, count in route.statuses.items():
+                lines.append(
+                    f'bookstore_http_requests_total{{method="{method}",route="{path}",status="{status}"}} {count}'
+                )
+
+        lines += [
+            "# HELP bookstore_http_request_duration_seconds Request latency by route",
+            "# TYPE bookstore_http_request_duration_seconds histogram",
+        ]
+        for (method, path), route in self.routes.items():
+            lines += _histogram_lines(
+                "bookstore_http_request_duration_seconds", route.latency,
+                f'method="{method}",route="{path}"'
+            )
+
+        lines += [
+            "# HELP bookstore_db_queries_per_request Database statements issued per request",
+            "# TYPE bookstore_db_queries_per_request histogram",
+        ]
+        for (method, path), route in self.routes.items():
+            lines += _histogram_lines(
+                "bookstore_db_queries_per_request", route.queries,
+                f'method="{method}",route="{path}"'
+            )
+
+        lines += [
+            "# HELP bookstore_db_pool_wait_seconds Time spent waiting for a pool connection",
+            "# TYPE bookstore_db_pool_wait_seconds histogram",
+        ]
+        lines += _histogram_lines("bookstore_db_pool_wait_seconds", self.pool_wait, "")
+
+        lines += [
+            "# HELP bookstore_http_requests_in_flight Requests currently being handled",
+            "# TYPE bookstore_http_requests_in_flight gauge",
+            f"bookstore_http_requests_in_flight {self.in_flight}",
+        ]
+        for name, (help_text, value) in (gauges or {}).items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+def _histogram_lines(name: str, histogram: Histogram, labels: str) -> List[str]:
+    prefix = labels + "," if labels else ""
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{suffix} {histogram.sum}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
+    return lines
+
+metrics = Metrics()
+
+async def metrics_middleware(request: Request, call_next):
+    metrics.in_flight += 1
+    counter = [0]
+    request_queries.set(counter)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.in_flight -= 1
+        # FastAPI stores the matched route in the scope; label by its
+        # template so path parameters do not explode the label space
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        route_metrics = metrics.route(request.method, path)
+        route_metrics.statuses[status] = route_metrics.statuses.get(status, 0) + 1
+        route_metrics.latency.observe(elapsed)
+        route_metrics.queries.observe(counter[0])
@@ -1,18 +1,122 @@
 from fastapi import Request
 from fastapi.responses import JSONResponse
 from exceptions import BookStoreException
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+import config
+import copy
+import json
 import logging
+import queue
+import time
+import traceback
 from datetime import datetime
 
-# Set up logger
-logging.basicConfig(
-    filename='error.log',
-    level=logging.ERROR,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including all ``extra`` fields"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            exc_type, exc, tb = record.exc_info
+            entry["exception"] = {
+                "type": exc_type.__name__,
+                "message": str(exc),
+                "traceback": "".join(traceback.format_exception(exc_type, exc, tb))
+            }
+        return json.dumps(entry, default=str)
+
+class RepeatSampler(logging.Filter):
+    """Sample repeated identical errors so an error storm cannot flood the log.
+
+    Within each window the first ``burst`` records with the same message,
+    path and exception type pass; after that only one in ``rate`` does,
+    carrying the number of records suppressed since the last one.
+    """
+    def __init__(self, window: float, burst: int, rate: int):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.rate = max(rate, 1)
+        self._seen: Dict[tuple, list] = {}  # key -> [window_start, count, suppressed]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        exc_type = record.exc_info[0].__name__ if record.exc_info else None
+        key = (record.msg, getattr(record, "path", None), exc_type)
+        now = record.created
+        state = self._seen.get(key)
+        if state is None or now - state[0] > self.window:
+            if len(self._seen) > 10000:
+                self._seen.clear()
+            state = self._seen[key] = [now, 0, 0]
+        state[1] += 1
+        if state[1] <= self.burst or state[1] % self.rate == 0:
+            if state[2]:
+                record.suppressed = state[2]
+                state[2] = 0
+            return True
+        state[2] += 1
+        return False
+
+class _DeferredFormatQueueHandler(QueueHandler):
+    """Enqueue records without formatting them on the event loop.
+
+    The default ``prepare`` formats the message and traceback in the calling
+    thread; here that work is left to the listener thread.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return copy.copy(record)
+
+_listener: Optional[QueueListener] = None
+
+def setup_logging():
+    """Route application logs through a queue to a rotating JSON-lines file"""
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    file_handler = RotatingFileHandler(
+        config.LOG_FILE,
+        maxBytes=config.LOG_MAX_BYTES,
+        backupCount=config.LOG_BACKUP_COUNT,
+        encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    queue_handler = _DeferredFormatQueueHandler(log_queue)
+    queue_handler.addFilter(RepeatSampler(
+        config.LOG_SAMPLE_WINDOW_SECONDS,
+        config.LOG_SAMPLE_BURST,
+        config.LOG_SAMPLE_RATE
+    ))
+    root = logging.getLogger()
+    root.setLevel(config.LOG_LEVEL)
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 async def error_handler(request: Request, call_next):
+    start = time.perf_counter()
     try:
         return await call_next(request)
     except BookStoreException as exc:
@@ -20,9 +124,10 @@ async def error_handler(request: Request, call_next):
         logger.error(
             f"BookStore Error: {exc.message}",
             extra={
-                "timestamp": datetime.now().isoformat(),
                 "path": request.url.path,
                 "method": request.method,
+                "status": exc.status_code,
+                "latency_ms": round((time.perf_counter() - start) * 1000, 3),
                 "details": exc.details
             }
         )
@@ -35,16 +140,18 @@ async def error_handler(request: Request, call_next):
                 "details": exc.details,
                 "path": request.url.path,
                 "timestamp": datetime.now().isoformat()
-            }
+            },
+            headers=exc.headers
         )
     except Exception as exc:
         # Log unexpected errors
         logger.error(
-            f"Unexpected Error: {str(exc)}",
+            f"Unexpected Error: {type(exc).__name__}",
             extra={
-                "timestamp": datetime.now().isoformat(),
                 "path": request.url.path,
-                "method": request.method
+                "method": request.method,
+                "status": 500,
+                "latency_ms": round((time.perf_counter() - start) * 1000, 3)
             },
             exc_info=True
         )
@@ -57,4 +164,4 @@ async def error_handler(request: Request, call_next):
                 "path": request.url.path,
                 "timestamp": datetime.now().isoformat()
             }
-        )
\ No newline at end of file
+        )
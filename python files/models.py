@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from enum import Enum
 
 # Previous models
@@ -26,6 +26,19 @@ class QueuePosition(BaseModel):
     position: int
     estimated_wait: Optional[str]
 
+class BulkReservationEnd(BaseModel):
+    reservation_ids: List[int]
+
+class BulkTokenRevoke(BaseModel):
+    usernames: List[str]
+
+class BatchOperation(BaseModel):
+    op: str
+    params: Dict[str, Any] = {}
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
 # New models
 class CityBase(BaseModel):
     name: str
@@ -35,6 +48,11 @@ class CityBase(BaseModel):
 class CityCreate(CityBase):
     pass
 
+class CityUpdate(BaseModel):
+    name: Optional[str] = None
+    province: Optional[str] = None
+    country: Optional[str] = None
+
 class CityResponse(CityBase):
     city_id: int
     created_at: datetime
@@ -46,6 +64,10 @@ class GenreBase(BaseModel):
 class GenreCreate(GenreBase):
     pass
 
+class GenreUpdate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+
 class GenreResponse(GenreBase):
     genre_id: int
     created_at: datetime
@@ -65,6 +87,15 @@ class AuthorUpdate(BaseModel):
     bank_account_number: Optional[str]
     bio: Optional[str]
 
+class CityBulkUpsert(BaseModel):
+    cities: List[CityCreate]
+
+class GenreBulkUpsert(BaseModel):
+    genres: List[GenreCreate]
+
+class AuthorBulkUpsert(BaseModel):
+    authors: List[AuthorCreate]
+
 class AuthorResponse(AuthorBase):
     author_id: int
     user: dict  # Author's user information
@@ -0,0 +1,159 @@
+"""Transactional outbox and the background dispatcher that drains it.
+
+Services call ``record_event`` with the connection of the transaction
+that makes the change, so an event exists exactly when its change was
+committed. ``OutboxDispatcher`` claims pending rows in batches with
+``FOR UPDATE SKIP LOCKED``, so several workers can drain the table
+concurrently without handing the same row to two of them. The claim
+counts an attempt and pushes ``available_at`` out by a lease, and is
+committed before any consumer runs, so no lock or pooled connection is held
+while consumers work. The dispatcher then passes each event to the
+in-process consumers subscribed to its type and settles the batch: it
+deletes the rows that were delivered and schedules retries for the rest.
+
+Delivery is at least once. If the process dies before the batch is
+settled, the lease runs out and the event is delivered again, so consumers
+must be idempotent. A consumer that raises fails the event for every
+consumer. The event is retried with growing back-off, and after
+``max_attempts`` it stays in the table as a dead letter with its
+``last_error``. A batch must finish within the lease, or its events may be
+handed out a second time.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from queries import registry
+from responses import dumps
+
+logger = logging.getLogger(__name__)
+
+Consumer = Callable[[str, dict], Awaitable[None]]
+
+async def record_event(conn, event_type: str, payload: Dict[str, Any]):
+    """Queue an event; call inside the transaction that makes the change"""
+    await registry.fetchval(conn, "outbox_insert", event_type, dumps(payload).decode('utf-8'))
+
+class OutboxDispatcher:
+    def __init__(self, pool, batch_size: int = 100, poll_interval: float = 1.0,
+                 max_attempts: int = 10, lease: float = 60.0):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.consumers: Dict[str, List[Consumer]] = defaultdict(list)
+        self.delivered: Dict[str, int] = defaultdict(int)
+        self.failed: Dict[str, int] = defaultdict(int)
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, event_type: str, consumer: Consumer):
+        """Register ``consumer(event_type, payload)``; ``"*"`` receives every event"""
+        self.consumers[event_type].append(consumer)
+
+    async def dispatch_batch(self) -> int:
+        """Deliver one batch of due events; returns how many were claimed"""
+        async with self.pool.acquire() as conn:
+            events = await conn.fetch(
+                """
+                UPDATE outbox o
+                SET attempts = o.attempts + 1,
+                    available_at = NOW() + make_interval(secs => $3)
+                FROM (
+                    SELECT event_id
+                    FROM outbox
+                    WHERE attempts < $2 AND available_at <= NOW()
+                    ORDER BY event_id
+                    LIMIT $1
+                    FOR UPDATE SKIP LOCKED
+                ) due
+                WHERE o.event_id = due.event_id
+                RETURNING o.event_id, o.event_type, o.payload, o.attempts
+                """,
+                self.batch_size, self.max_attempts, self.lease
+            )
+        if not events:
+            return 0
+
+        done, failed_ids, errors = [], [], []
+        for event in sorted(events, key=lambda event: event['event_id']):
+            event_type = event['event_type']
+            try:
+                payload = json.loads(event['payload'])
+                for consumer in self.consumers.get(event_type, []) + self.consumers.get("*", []):
+                    await consumer(event_type, payload)
+            except Exception as exc:
+                logger.warning(
+                    f"Outbox consumer failed for {event_type}",
+                    extra={"event_id": event['event_id'], "attempts": event['attempts']},
+                    exc_info=True
+                )
+                self.failed[event_type] += 1
+                failed_ids.append(event['event_id'])
+                errors.append(f"{type(exc).__name__}: {exc}"[:500])
+            else:
+                self.delivered[event_type] += 1
+                done.append(event['event_id'])
+
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                if done:
+                    await conn.execute("DELETE FROM outbox WHERE event_id = ANY($1::bigint[])", done)
+                if failed_ids:
+                    # Quadratic back-off in seconds: 1, 4, 9, ...
+                    await conn.execute(
+                        """
+                        UPDATE outbox o
+                        SET last_error = f.error,
+                            available_at = NOW() + make_interval(secs => o.attempts ^ 2)
+                        FROM unnest($1::bigint[], $2::text[]) AS f(event_id, error)
+                        WHERE o.event_id = f.event_id
+                        """,
+                        failed_ids, errors
+                    )
+        return len(events)
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await self.dispatch_batch()
+            except Exception:
+                # Anything but cancellation: log it and keep the dispatcher alive
+                logger.exception("Outbox dispatch failed")
+                claimed = 0
+            # A full batch means there is probably more waiting
+            if claimed < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def report(self) -> dict:
+        async with self.pool.acquire_read() as conn:
+            backlog = await conn.fetchrow(
+                """
+                SELECT COUNT(*) FILTER (WHERE attempts < $1) AS pending,
+                       COUNT(*) FILTER (WHERE attempts >= $1) AS dead,
+                       MIN(created_at) FILTER (WHERE attempts < $1) AS oldest_pending
+                FROM outbox
+                """,
+                self.max_attempts
+            )
+        return {
+            **dict(backlog),
+            "consumers": {event_type: len(consumers) for event_type, consumers in self.consumers.items()},
+            "delivered": dict(self.delivered),
+            "failed": dict(self.failed)
+        }
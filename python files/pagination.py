@@ -0,0 +1,34 @@
+import base64
+import json
+from fastapi import HTTPException
+from typing import List, Optional
+
+def encode_cursor(values: list) -> str:
+    """Encode the sort key of the last returned row as an opaque token"""
+    raw = json.dumps(values, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(token: Optional[str], size: int) -> Optional[list]:
+    """Decode a token produced by encode_cursor, checking its shape"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return values
+
+def clamp_limit(limit: int, maximum: int = 500) -> int:
+    return max(1, min(limit, maximum))
+
+def keyset_page(rows: List[dict], limit: int, key: tuple) -> dict:
+    """Trim a LIMIT n + 1 result to n rows and build the cursor for the next page"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][column] for column in key])
+    return {"items": rows, "next_cursor": next_cursor}
@@ -0,0 +1,268 @@
+import asyncpg
+import time
+from typing import Any, Dict, List, Optional
+
+# Hot statements, prepared once per pooled connection in the pool's init
+# callback. Update statements use one fixed shape each: a NULL argument
+# keeps the current column value.
+QUERIES: Dict[str, str] = {
+    # Authentication
+    "token_revoked": """
+        SELECT 1 FROM revoked_tokens
+        WHERE username = $1 AND revoked_at > $2
+        LIMIT 1
+    """,
+    "admin_principal": """
+        SELECT u.role,
+               EXISTS (
+                   SELECT 1 FROM revoked_tokens
+                   WHERE username = $1 AND revoked_at > $2
+               ) AS revoked
+        FROM users u
+        WHERE u.username = $1
+    """,
+    "user_by_username": "SELECT * FROM users WHERE username = $1",
+    "customer_by_username": """
+        SELECT c.customer_id
+        FROM customers c
+        JOIN users u ON c.user_id = u.user_id
+        WHERE u.username = $1
+    """,
+
+    # Books and reservations
+    "books_list": "SELECT * FROM books",
+    "book_units": "SELECT units FROM books WHERE book_id = $1",
+    "customer_subscription": """
+        SELECT subscription_model, subscription_end_time
+        FROM customers WHERE customer_id = $1
+    """,
+    "active_reservation_count": """
+        SELECT COUNT(*) AS count
+        FROM reservations
+        WHERE customer_id = $1 AND end_time > NOW()
+    """,
+    "customer_wallet": "SELECT wallet FROM customers WHERE customer_id = $1",
+
+    # Reservation queue. Premium customers are served first, then by request
+    # time; admin_services.get_book_status pages the waiting list the same way.
+    "queue_insert": """
+        INSERT INTO reservation_queue (customer_id, book_id, days)
+        VALUES ($1, $2, $3)
+        RETURNING queue_id
+    """,
+    "queue_waiting": "SELECT EXISTS (SELECT 1 FROM reservation_queue WHERE book_id = $1)",
+    "queue_head": """
+        SELECT q.queue_id, q.customer_id, q.days
+        FROM reservation_queue q
+        JOIN customers c ON q.customer_id = c.customer_id
+        WHERE q.book_id = $1
+        ORDER BY CASE WHEN c.subscription_model = 'premium' THEN 0 ELSE 1 END,
+                 q.request_time, q.queue_id
+        LIMIT 1
+    """,
+    "queue_positions": """
+        SELECT queue_id, book_id, position, queue_length, days, request_time
+        FROM (
+            SELECT q.queue_id, q.customer_id, q.book_id, q.days, q.request_time,
+                   row_number() OVER (
+                       PARTITION BY q.book_id
+                       ORDER BY CASE WHEN c.subscription_model = 'premium' THEN 0 ELSE 1 END,
+                                q.request_time, q.queue_id
+                   ) AS position,
+                   COUNT(*) OVER (PARTITION BY q.book_id) AS queue_length
+            FROM reservation_queue q
+            JOIN customers c ON q.customer_id = c.customer_id
+            WHERE q.book_id IN (
+                SELECT book_id FROM reservation_queue
+                WHERE customer_id = $1 AND ($2::int IS NULL OR book_id = $2)
+            )
+        ) ranked
+        WHERE customer_id = $1
+        ORDER BY book_id, position
+    """,
+    "queue_book_positions": """
+        SELECT customer_id, MIN(position) AS position, MAX(queue_length) AS queue_length
+        FROM (
+            SELECT q.customer_id,
+                   row_number() OVER (
+                       ORDER BY CASE WHEN c.subscription_model = 'premium' THEN 0 ELSE 1 END,
+                                q.request_time, q.queue_id
+                   ) AS position,
+                   COUNT(*) OVER () AS queue_length
+            FROM reservation_queue q
+            JOIN customers c ON q.customer_id = c.customer_id
+            WHERE q.book_id = $1
+        ) ranked
+        WHERE customer_id = ANY($2::int[])
+        GROUP BY customer_id
+    """,
+
+    # Subscription
+    "subscription_info": """
+        SELECT subscription_model, subscription_end_time, wallet
+        FROM customers
+        WHERE customer_id = $1
+    """,
+
+    # Idempotency keys. The last argument is the retention in seconds; an
+    # expired key is overwritten, a live one makes the insert return no row.
+    "idempotency_lookup": """
+        SELECT request_hash, status_code, response,
+               EXTRACT(EPOCH FROM NOW() - created_at)::float8 AS age
+        FROM idempotency_keys
+        WHERE username = $1 AND idempotency_key = $2
+          AND created_at > NOW() - make_interval(secs => $3)
+    """,
+    "idempotency_record": """
+        INSERT INTO idempotency_keys
+            (username, idempotency_key, endpoint, request_hash, status_code, response)
+        VALUES ($1, $2, $3, $4, $5, $6)
+        ON CONFLICT (username, idempotency_key) DO UPDATE
+        SET endpoint = EXCLUDED.endpoint,
+            request_hash = EXCLUDED.request_hash,
+            status_code = EXCLUDED.status_code,
+            response = EXCLUDED.response,
+            created_at = NOW()
+        WHERE idempotency_keys.created_at <= NOW() - make_interval(secs => $7)
+        RETURNING 1
+    """,
+
+    # Transactional outbox, written inside the caller's transaction
+    "outbox_insert": """
+        INSERT INTO outbox (event_type, payload)
+        VALUES ($1, $2::jsonb)
+    """,
+
+    # Reference data updates
+    "update_city": """
+        UPDATE cities
+        SET name = COALESCE($2, name),
+            province = COALESCE($3, province),
+            country = COALESCE($4, country)
+        WHERE city_id = $1
+        RETURNING *
+    """,
+    "update_genre": """
+        UPDATE genres
+        SET name = COALESCE($2, name),
+            description = COALESCE($3, description)
+        WHERE genre_id = $1
+        RETURNING *
+    """,
+    "update_author": """
+        UPDATE authors
+        SET city_id = COALESCE($2, city_id),
+            bank_account_number = COALESCE($3, bank_account_number),
+            goodreads_link = COALESCE($4, goodreads_link),
+            bio = COALESCE($5, bio)
+        WHERE author_id = $1
+        RETURNING author_id
+    """,
+}
+
+class RegistryConnection(asyncpg.Connection):
+    """Pool connection that holds the registry's prepared statements"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements: Dict[str, Any] = {}
+
+class QueryStats:
+    __slots__ = ('prepares', 'prepare_time', 'executions', 'execute_time')
+
+    def __init__(self):
+        self.prepares = 0
+        self.prepare_time = 0.0
+        self.executions = 0
+        self.execute_time = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "prepares": self.prepares,
+            "prepare_ms": round(self.prepare_time * 1000, 3),
+            "executions": self.executions,
+            "execute_ms": round(self.execute_time * 1000, 3),
+            "mean_execute_ms": round(self.execute_time * 1000 / self.executions, 3)
+                               if self.executions else None
+        }
+
+class QueryRegistry:
+    """Central registry of named statements.
+
+    Pass ``init_connection`` as the pool's ``init`` callback and
+    ``RegistryConnection`` as its ``connection_class``; every statement is
+    then parsed and planned once per connection instead of on first use.
+    Connections that were not initialized this way fall back to asyncpg's
+    own statement cache.
+    """
+
+    def __init__(self, queries: Dict[str, str] = QUERIES):
+        self.queries = queries
+        self._names_by_sql = {sql: name for name, sql in queries.items()}
+        self.stats = {name: QueryStats() for name in queries}
+
+    async def _prepare(self, conn, name: str):
+        stats = self.stats[name]
+        start = time.perf_counter()
+        statement = await conn.prepare(self.queries[name])
+        stats.prepare_time += time.perf_counter() - start
+        stats.prepares += 1
+        return statement
+
+    async def init_connection(self, conn):
+        if not hasattr(conn, 'prepared_statements'):
+            return
+        for name in self.queries:
+            conn.prepared_statements[name] = await self._prepare(conn, name)
+
+    async def _run(self, conn, method: str, name: str, args: tuple):
+        prepared = getattr(conn, 'prepared_statements', None)
+        stats = self.stats[name]
+        start = time.perf_counter()
+        if prepared is None:
+            result = await getattr(conn, method)(self.queries[name], *args)
+        else:
+            statement = prepared.get(name)
+            if statement is None:
+                statement = prepared[name] = await self._prepare(conn, name)
+                start = time.perf_counter()
+            result = await getattr(statement, method)(*args)
+        stats.execute_time += time.perf_counter() - start
+        stats.executions += 1
+        return result
+
+    async def fetch(self, conn, name: str, *args) -> List[asyncpg.Record]:
+        return await self._run(conn, 'fetch', name, args)
+
+    async def fetchrow(self, conn, name: str, *args):
+        return await self._run(conn, 'fetchrow', name, args)
+
+    async def fetchval(self, conn, name: str, *args):
+        return await self._run(conn, 'fetchval', name, args)
+
+    async def plan_cache_stats(self, conn) -> Optional[List[dict]]:
+        """Generic vs custom plan counts for this connection's prepared statements.
+
+        The counters were added to pg_prepared_statements in PostgreSQL 14;
+        older servers get None.
+        """
+        if conn.get_server_version().major < 14:
+            return None
+        rows = await conn.fetch(
+            """
+            SELECT statement, generic_plans, custom_plans
+            FROM pg_prepared_statements
+            """
+        )
+        return [
+            {
+                "name": self._names_by_sql[row['statement']],
+                "generic_plans": row['generic_plans'],
+                "custom_plans": row['custom_plans']
+            }
+            for row in rows if row['statement'] in self._names_by_sql
+        ]
+
+    def report(self) -> Dict[str, dict]:
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
+
+registry = QueryRegistry()
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+import re
+import time
+import asyncpg
+import config
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$.])\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace and replace inline literals so equivalent statements group together"""
+    query = _STRING_LITERAL.sub("?", query)
+    query = _NUMBER_LITERAL.sub("?", query)
+    return _WHITESPACE.sub(" ", query).strip()
+
+class QueryAggregate:
+    __slots__ = ('calls', 'errors', 'total', 'max', 'slow_calls',
+                 'plan', 'plan_captured_at', 'explain_attempted_at')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow_calls = 0
+        self.plan = None
+        self.plan_captured_at: Optional[float] = None
+        self.explain_attempted_at: Optional[float] = None
+
+class SlowQueryLog:
+    """Per-statement timing aggregated from asyncpg's query logger.
+
+    ``record`` is installed on every pooled connection. When a statement
+    runs longer than the threshold, an ``EXPLAIN (ANALYZE, BUFFERS)`` sample
+    is captured on a separate connection inside a read-only transaction that
+    is always rolled back, so data-modifying statements are never re-run.
+    """
+
+    def __init__(self, threshold_ms: float, explain_cooldown: float):
+        self.threshold = threshold_ms / 1000
+        self.explain_cooldown = explain_cooldown
+        self.queries: Dict[str, QueryAggregate] = {}
+        self._normalized: Dict[str, str] = {}
+        self._explain_conn: Optional[asyncpg.Connection] = None
+        self._explaining = False
+
+    def _key(self, query: str) -> str:
+        key = self._normalized.get(query)
+        if key is None:
+            key = normalize_query(query)
+            if len(self._normalized) < 10000:
+                self._normalized[query] = key
+        return key
+
+    def record(self, logged):
+        key = self._key(logged.query)
+        aggregate = self.queries.get(key)
+        if aggregate is None:
+            aggregate = self.queries[key] = QueryAggregate()
+        aggregate.calls += 1
+        aggregate.total += logged.elapsed
+        if logged.elapsed > aggregate.max:
+            aggregate.max = logged.elapsed
+        if logged.exception is not None:
+            aggregate.errors += 1
+            return
+
+        if logged.elapsed >= self.threshold:
+            aggregate.slow_calls += 1
+            now = time.monotonic()
+            if not self._explaining and (
+                aggregate.explain_attempted_at is None
+                or now - aggregate.explain_attempted_at > self.explain_cooldown
+            ):
+                aggregate.explain_attempted_at = now
+                self._explaining = True
+                asyncio.get_running_loop().create_task(
+                    self._explain(aggregate, logged.query, logged.args)
+                )
+
+    async def _explain(self, aggregate: QueryAggregate, query: str, args):
+        try:
+            if self._explain_conn is None or self._explain_conn.is_closed():
+                self._explain_conn = await asyncpg.connect(
+                    user=config.DB_USER,
+                    password=config.DB_PASSWORD,
+                    database=config.DB_NAME,
+                    host=config.DB_HOST,
+                    port=config.DB_PORT,
+                    statement_cache_size=0
+                )
+            transaction = self._explain_conn.transaction(readonly=True)
+            await transaction.start()
+            try:
+                plan = await self._explain_conn.fetchval(
+                    f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", *(args or ())
+                )
+            finally:
+                await transaction.rollback()
+            aggregate.plan = json.loads(plan) if isinstance(plan, str) else plan
+            aggregate.plan_captured_at = time.time()
+        except (asyncpg.exceptions.PostgresError, asyncpg.exceptions.InterfaceError) as e:
+            # Writes fail in the read-only transaction; keep the reason instead of a plan
+            aggregate.plan = {"unavailable": str(e)}
+        except (OSError, asyncio.TimeoutError):
+            logger.warning("Could not open the EXPLAIN side connection")
+        finally:
+            self._explaining = False
+
+    def top(self, limit: int = 20, order: str = "total") -> List[dict]:
+        sort_keys = {
+            "total": lambda item: item[1].total,
+            "mean": lambda item: item[1].total / item[1].calls,
+            "max": lambda item: item[1].max,
+            "calls": lambda item: item[1].calls,
+        }
+        ranked = sorted(self.queries.items(), key=sort_keys.get(order, sort_keys["total"]), reverse=True)
+        return [
+            {
+                "query": query,
+                "calls": aggregate.calls,
+                "errors": aggregate.errors,
+                "slow_calls": aggregate.slow_calls,
+                "total_ms": round(aggregate.total * 1000, 3),
+                "mean_ms": round(aggregate.total * 1000 / aggregate.calls, 3),
+                "max_ms": round(aggregate.max * 1000, 3),
+                "plan": aggregate.plan,
+                "plan_captured_at": aggregate.plan_captured_at
+            }
+            for query, aggregate in ranked[:limit]
+        ]
+
+    async def close(self):
+        if self._explain_conn is not None:
+            await self._explain_conn.close()
+            self._explain_conn = None
+
+slow_queries = SlowQueryLog(
+    config.SLOW_QUERY_THRESHOLD_MS,
+    config.SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS
+)
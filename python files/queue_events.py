@@ -0,0 +1,285 @@
+"""Push queue position and promotion updates to waiting customers.
+
+Whatever changes a book's queue calls ``publish_queue_event`` inside its
+transaction. Postgres delivers a NOTIFY only on commit, so listeners never
+hear about a change that was rolled back.
+
+Each process keeps one ``QueueEventHub`` with one dedicated LISTEN
+connection; the pool is never used for it. A notification names the book
+that changed, plus any customers promoted or dropped. Promotions and drops
+are forwarded as they arrive. Changed books are then refreshed in the
+background with one query each, however many notifications arrived for
+them in the meantime and however many customers are watching, and a
+message goes only to subscribers whose position actually moved. Positions
+are read from ``reservation_queue`` on the primary, so every worker sees
+the same queue. An idle waiter costs a bounded ``asyncio.Queue`` and no
+queries.
+
+Other process-wide listeners, such as the reference data cache, register
+their channel with ``listen`` and share the same connection.
+
+Messages for a slow client are dropped oldest first once its queue is
+full. Every change carries the full current position, so a client that
+missed one message is corrected by the next.
+"""
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+import asyncpg
+
+import config
+from queries import registry
+from responses import dumps
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "reservation_queue"
+
+async def publish_queue_event(conn, event: dict):
+    """Notify every process that a book's queue changed; sent on commit"""
+    await conn.execute("SELECT pg_notify($1, $2)", CHANNEL, dumps(event).decode('utf-8'))
+
+def format_event(message: dict) -> str:
+    return f"event: {message['type']}\ndata: {dumps(message).decode('utf-8')}\n\n"
+
+class QueueEventHub:
+    def __init__(self, pool, max_pending: int = 100, keepalive: float = 15.0,
+                 reconnect_interval: float = 5.0):
+        self.pool = pool
+        self.max_pending = max_pending
+        self.keepalive = keepalive
+        self.reconnect_interval = reconnect_interval
+        # customer_id -> one queue per open stream
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        # book_id -> {customer_id: last position sent}
+        self._positions: Dict[int, Dict[int, int]] = {}
+        # Books changed since the fan-out task last ran
+        self._dirty: Set[int] = set()
+        self._wakeup = asyncio.Event()
+        self._conn: Optional[asyncpg.Connection] = None
+        # Other channels on the same connection: channel -> (callback, resync)
+        self._channels: Dict[str, tuple] = {}
+        self._tasks = []
+        self.notifications = 0
+        self.refreshes = 0
+        self.sent = 0
+        self.dropped = 0
+        self.connects = 0
+
+    def listen(self, channel: str, callback: Callable,
+               resync: Optional[Callable[[], Awaitable]] = None):
+        """Deliver another channel's notifications to ``callback``.
+
+        ``resync`` is awaited after every connect, since notifications sent
+        while the listener was disconnected are lost.
+        """
+        self._channels[channel] = (callback, resync)
+
+    def subscribe(self, customer_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.max_pending)
+        self._subscribers.setdefault(customer_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, customer_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(customer_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[customer_id]
+            for book_id in list(self._positions):
+                tracked = self._positions[book_id]
+                tracked.pop(customer_id, None)
+                if not tracked:
+                    del self._positions[book_id]
+
+    def _send(self, customer_id: int, message: dict):
+        for queue in self._subscribers.get(customer_id, ()):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(message)
+            self.sent += 1
+
+    def _mark_dirty(self, book_ids):
+        if self._subscribers:
+            self._dirty.update(book_ids)
+            self._wakeup.set()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.notifications += 1
+        try:
+            event = json.loads(payload)
+            book_id = event['book_id']
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed queue notification", extra={"payload": payload})
+            return
+
+        tracked = self._positions.get(book_id, {})
+        for entry in event.get('promoted', ()):
+            tracked.pop(entry['customer_id'], None)
+            self._send(entry['customer_id'], {
+                "type": "promoted",
+                "book_id": book_id,
+                "reservation_id": entry['reservation_id']
+            })
+        for entry in event.get('dropped', ()):
+            tracked.pop(entry['customer_id'], None)
+            self._send(entry['customer_id'], {
+                "type": "dropped",
+                "book_id": book_id,
+                "reason": entry['reason']
+            })
+        self._mark_dirty((book_id,))
+
+    async def _refresh_book(self, conn, book_id: int):
+        """Send position changes for one book to the customers watching it"""
+        self.refreshes += 1
+        rows = await registry.fetch(
+            conn, "queue_book_positions", book_id, list(self._subscribers)
+        )
+        tracked = self._positions.get(book_id, {})
+        current = {}
+        for row in rows:
+            customer_id = row['customer_id']
+            current[customer_id] = row['position']
+            if tracked.get(customer_id) != row['position']:
+                self._send(customer_id, {
+                    "type": "position",
+                    "book_id": book_id,
+                    "position": row['position'],
+                    "queue_length": row['queue_length']
+                })
+        for customer_id in tracked.keys() - current.keys():
+            self._send(customer_id, {"type": "left", "book_id": book_id})
+
+        if current:
+            self._positions[book_id] = current
+        else:
+            self._positions.pop(book_id, None)
+
+    async def _fanout(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            books, self._dirty = self._dirty, set()
+            try:
+                # The primary: the notifying transaction has committed there
+                async with self.pool.primary.acquire() as conn:
+                    for book_id in books:
+                        await self._refresh_book(conn, book_id)
+            except Exception:
+                logger.exception("Queue event fan-out failed")
+                # Keep the changes and retry after a pause
+                self._dirty.update(books)
+                await asyncio.sleep(self.reconnect_interval)
+                self._wakeup.set()
+
+    async def _resync(self):
+        """Catch up on whatever changed while the listener was disconnected"""
+        if not self._subscribers:
+            return
+        async with self.pool.primary.acquire() as conn:
+            queued = await conn.fetch(
+                "SELECT DISTINCT book_id FROM reservation_queue WHERE customer_id = ANY($1::int[])",
+                list(self._subscribers)
+            )
+        self._mark_dirty(set(self._positions) | {row['book_id'] for row in queued})
+
+    async def _connect(self):
+        conn = await asyncpg.connect(
+            user=config.DB_USER,
+            password=config.DB_PASSWORD,
+            database=config.DB_NAME,
+            host=config.DB_HOST,
+            port=config.DB_PORT
+        )
+        try:
+            await conn.add_listener(CHANNEL, self._on_notify)
+            for channel, (callback, _) in self._channels.items():
+                await conn.add_listener(channel, callback)
+        except BaseException:
+            await conn.close()
+            raise
+        self._conn = conn
+
+    async def _listen(self):
+        while True:
+            if self._conn is None or self._conn.is_closed():
+                self._conn = None
+                try:
+                    await self._connect()
+                    self.connects += 1
+                    await self._resync()
+                    for _, resync in self._channels.values():
+                        if resync is not None:
+                            await resync()
+                except Exception:
+                    logger.exception("Queue event listener could not connect")
+                    # Reconnect and resync everything on the next pass
+                    if self._conn is not None:
+                        await self._conn.close()
+                        self._conn = None
+            await asyncio.sleep(self.reconnect_interval)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._listen()),
+                asyncio.create_task(self._fanout())
+            ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+        self._conn = None
+
+    async def stream(self, request, customer_id: int) -> AsyncIterator[str]:
+        """Server-sent events for one customer until the client goes away"""
+        # Subscribe before the snapshot so no change can fall between them
+        queue = self.subscribe(customer_id)
+        try:
+            # Start from a snapshot so the client does not wait for a change
+            async with self.pool.primary.acquire() as conn:
+                snapshot = await registry.fetch(conn, "queue_positions", customer_id, None)
+            for entry in snapshot:
+                # Rows come in position order; track the customer's best one
+                self._positions.setdefault(entry['book_id'], {}).setdefault(customer_id, entry['position'])
+                yield format_event({
+                    "type": "position",
+                    "book_id": entry['book_id'],
+                    "position": entry['position'],
+                    "queue_length": entry['queue_length']
+                })
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # Comment line; keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event(message)
+        finally:
+            self.unsubscribe(customer_id, queue)
+
+    def report(self) -> dict:
+        return {
+            "listening": self._conn is not None and not self._conn.is_closed(),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "notifications": self.notifications,
+            "refreshes": self.refreshes,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "connects": self.connects
+        }
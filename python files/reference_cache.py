@@ -0,0 +1,236 @@
+import asyncio
+import json
+import logging
+import asyncpg
+from bisect import bisect_right
+from fastapi import HTTPException
+from typing import Dict, Iterable, List, Optional, Set
+from pagination import decode_cursor, clamp_limit, keyset_page
+from responses import dumps
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "reference_data"
+
+# Cached table -> primary key column
+TABLES = {"cities": "city_id", "genres": "genre_id"}
+
+# NOTIFY payloads must stay under 8000 bytes; larger changes reload the table
+MAX_NOTIFY_IDS = 500
+
+async def publish_reference_change(conn, table: str, ids: List[int]):
+    """Tell every process which cached rows changed; sent on commit"""
+    change = {"table": table, "ids": ids if len(ids) <= MAX_NOTIFY_IDS else None}
+    await conn.execute(
+        "SELECT pg_notify($1, $2)",
+        CHANNEL, dumps(change).decode('utf-8')
+    )
+
+class ReferenceDataCache:
+    """Per-process snapshot of the small, read-mostly reference tables.
+
+    Loaded once at startup. The create/update/delete methods of CityService
+    and GenreService patch the local copy through the ``*_changed`` and
+    ``*_deleted`` hooks and publish the changed ids with
+    ``publish_reference_change``. Every process, the writer included,
+    then re-reads those rows from the primary. A full reload runs whenever
+    the LISTEN connection reconnects, covering changes missed meanwhile.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, retry_interval: float = 5.0):
+        self.pool = pool
+        self.retry_interval = retry_interval
+        self.cities: Dict[int, dict] = {}
+        self.genres: Dict[int, dict] = {}
+        # Sorted (name, id) keys used for keyset listings
+        self._city_keys: List[tuple] = []
+        self._genre_keys: List[tuple] = []
+        # Ids announced over NOTIFY and not yet re-read; None
+        # means the whole table
+        self._pending: Dict[str, Optional[Set[int]]] = {table: set() for table in TABLES}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.notifications = 0
+        self.reloads = 0
+
+    async def load(self):
+        async with self.pool.acquire() as conn:
+            cities = await conn.fetch("SELECT * FROM cities")
+            genres = await conn.fetch("SELECT * FROM genres")
+        self.cities = {c['city_id']: dict(c) for c in cities}
+        self.genres = {g['genre_id']: dict(g) for g in genres}
+        self._city_keys = self._sorted_keys(self.cities)
+        self._genre_keys = self._sorted_keys(self.genres)
+
+    def on_notify(self, connection, pid, channel, payload):
+        """LISTEN callback: queue the announced rows for a re-read"""
+        self.notifications += 1
+        try:
+            change = json.loads(payload)
+            table = change['table']
+            pending = self._pending[table]
+            if change['ids'] is None:
+                self._pending[table] = None
+            elif pending is not None:
+                pending.update(int(row_id) for row_id in change['ids'])
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed reference data notification", extra={"payload": payload})
+            return
+        self._wakeup.set()
+
+    async def resync(self):
+        """Reload everything; called after the listener (re)connects"""
+        await self.load()
+        self.reloads += 1
+
+    async def _refresh(self, conn, table: str, ids: Optional[Set[int]]):
+        id_column = TABLES[table]
+        if ids is None:
+            rows = {row[id_column]: dict(row) for row in await conn.fetch(f"SELECT * FROM {table}")}
+            if table == "cities":
+                self.cities = rows
+                self._city_keys = self._sorted_keys(rows)
+            else:
+                self.genres = rows
+                self._genre_keys = self._sorted_keys(rows)
+            return
+        rows = await conn.fetch(
+            f"SELECT * FROM {table} WHERE {id_column} = ANY($1::int[])",
+            list(ids)
+        )
+        found = {row[id_column]: dict(row) for row in rows}
+        if table == "cities":
+            self.cities_changed(found.values())
+            for city_id in ids - found.keys():
+                self.city_deleted(city_id)
+        else:
+            self.genres_changed(found.values())
+            for genre_id in ids - found.keys():
+                self.genre_deleted(genre_id)
+
+    async def _apply(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            pending = self._pending
+            self._pending = {table: set() for table in TABLES}
+            try:
+                # acquire() is the primary, where the notifying write committed
+                async with self.pool.acquire() as conn:
+                    for table, ids in pending.items():
+                        if ids is None or ids:
+                            await self._refresh(conn, table, ids)
+            except Exception:
+                logger.exception("Reference data refresh failed")
+                for table, ids in pending.items():
+                    if ids is None or self._pending[table] is None:
+                        self._pending[table] = None
+                    else:
+                        self._pending[table].update(ids)
+                await asyncio.sleep(self.retry_interval)
+                self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._apply())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def report(self) -> dict:
+        return {
+            "cities": len(self.cities),
+            "genres": len(self.genres),
+            "notifications": self.notifications,
+            "reloads": self.reloads
+        }
+
+    @staticmethod
+    def _sorted_keys(rows: Dict[int, dict]) -> List[tuple]:
+        return sorted((row['name'], row_id) for row_id, row in rows.items())
+
+    @staticmethod
+    def _page(keys: List[tuple], rows: Dict[int, dict], limit: int,
+              after: Optional[str], id_column: str) -> dict:
+        limit = clamp_limit(limit)
+        cursor = decode_cursor(after, 2)
+        try:
+            start = bisect_right(keys, tuple(cursor)) if cursor else 0
+        except TypeError:
+            raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+        page = [rows[row_id] for _, row_id in keys[start:start + limit + 1]]
+        return keyset_page(page, limit, ('name', id_column))
+
+    # Cities
+    def get_city(self, city_id: int) -> Optional[dict]:
+        return self.cities.get(city_id)
+
+    async def fetch_city(self, city_id: int) -> Optional[dict]:
+        """Cached city, falling back to the database for rows not seen yet"""
+        city = self.cities.get(city_id)
+        if city is None:
+            async with self.pool.acquire() as conn:
+                row = await conn.fetchrow(
+                    "SELECT * FROM cities WHERE city_id = $1",
+                    city_id
+                )
+            if row:
+                city = dict(row)
+                self.city_changed(city)
+        return city
+
+    def list_cities(self, limit: int = 10, after: Optional[str] = None) -> dict:
+        return self._page(self._city_keys, self.cities, limit, after, 'city_id')
+
+    def city_changed(self, city: dict):
+        self.cities[city['city_id']] = city
+        self._city_keys = self._sorted_keys(self.cities)
+
+    def cities_changed(self, cities: Iterable[dict]):
+        for city in cities:
+            self.cities[city['city_id']] = city
+        self._city_keys = self._sorted_keys(self.cities)
+
+    def city_deleted(self, city_id: int):
+        if self.cities.pop(city_id, None) is not None:
+            self._city_keys = self._sorted_keys(self.cities)
+
+    # Genres
+    def get_genre(self, genre_id: int) -> Optional[dict]:
+        return self.genres.get(genre_id)
+
+    async def fetch_genre(self, genre_id: int) -> Optional[dict]:
+        """Cached genre, falling back to the database for rows not seen yet"""
+        genre = self.genres.get(genre_id)
+        if genre is None:
+            async with self.pool.acquire() as conn:
+                row = await conn.fetchrow(
+                    "SELECT * FROM genres WHERE genre_id = $1",
+                    genre_id
+                )
+            if row:
+                genre = dict(row)
+                self.genre_changed(genre)
+        return genre
+
+    def list_genres(self, limit: int = 10, after: Optional[str] = None) -> dict:
+        return self._page(self._genre_keys, self.genres, limit, after, 'genre_id')
+
+    def genre_changed(self, genre: dict):
+        self.genres[genre['genre_id']] = genre
+        self._genre_keys = self._sorted_keys(self.genres)
+
+    def genres_changed(self, genres: Iterable[dict]):
+        for genre in genres:
+            self.genres[genre['genre_id']] = genre
+        self._genre_keys = self._sorted_keys(self.genres)
+
+    def genre_deleted(self, genre_id: int):
+        if self.genres.pop(genre_id, None) is not None:
+            self._genre_keys = self._sorted_keys(self.genres)
@@ -0,0 +1,69 @@
+"""JSON response class that serializes asyncpg records straight to bytes.
+
+Returning a list of Records from a handler makes FastAPI walk every value
+through ``jsonable_encoder`` and then ``json.dumps``, building a second copy
+of the payload on the way. Handlers that return ``FastJSONResponse(rows)``
+skip that path: the response is sent as is, and the encoder converts
+Records, Decimal and datetime values while it writes.
+
+orjson is used when it is installed; otherwise the stdlib encoder runs
+with the same conversions. Decimal is encoded like FastAPI does it: whole
+values become integers and the rest floats.
+"""
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+from uuid import UUID
+
+import asyncpg
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    import json
+
+def _encode_decimal(value: Decimal):
+    return int(value) if value.as_tuple().exponent >= 0 else float(value)
+
+def _orjson_default(value: Any):
+    if isinstance(value, asyncpg.Record):
+        return dict(value.items())
+    if isinstance(value, Decimal):
+        return _encode_decimal(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _json_default(value: Any):
+    if isinstance(value, asyncpg.Record):
+        return dict(value.items())
+    if isinstance(value, Decimal):
+        return _encode_decimal(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if orjson is not None:
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(content: Any) -> bytes:
+        return json.dumps(
+            content,
+            default=_json_default,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(',', ':')
+        ).encode('utf-8')
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
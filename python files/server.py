@@ -0,0 +1,110 @@
+"""Multi-process launcher for the bookstore API.
+
+    python server.py --workers 4 --db-budget 80
+    python server.py --mode gunicorn --workers 4
+
+Each worker gets a connection pool sized from the global connection budget,
+and startup refuses to run several workers while state the API relies on
+still lives in process memory.
+
+Start several workers through this launcher, or set WEB_CONCURRENCY, which
+both uvicorn and the app read. A bare ``uvicorn --workers N`` or
+``gunicorn -w N`` is invisible to the workers: each one believes it is
+alone, so neither the guard below nor the pool budget applies.
+"""
+import argparse
+import os
+import sys
+import config
+
+# Connections each worker opens to the primary outside its pool: the queue
+# event LISTEN connection and the slow-query EXPLAIN connection
+SIDE_CONNECTIONS = 2
+
+# State kept in process memory, with what breaks when requests for one user
+# can land on different worker processes.
+PROCESS_LOCAL_STATE = {
+    "auth.otp_storage": "an OTP issued by one worker cannot be verified by another",
+    "PoolRouter._recent_writes": "a read that lands on another worker can go to the replica "
+                                 "and miss the user's own recent write",
+    "middleware RotatingFileHandler": "several processes rotating the same BOOKSTORE_LOG_FILE "
+                                      "lose or corrupt log records",
+}
+
+def check_worker_safety(workers: int, allow_process_local_state: bool = False):
+    """Reject multi-worker setups that depend on process-local state"""
+    if workers <= 1 or allow_process_local_state or not PROCESS_LOCAL_STATE:
+        return
+    problems = "\n".join(f"  - {name}: {reason}" for name, reason in PROCESS_LOCAL_STATE.items())
+    raise RuntimeError(
+        f"Refusing to start {workers} workers; this state is process-local:\n{problems}\n"
+        "Run a single worker, or set BOOKSTORE_ALLOW_PROCESS_LOCAL_STATE=1 "
+        "to accept these limits (a sticky load balancer that keeps each user "
+        "on one worker covers the OTP and read-your-writes cases)."
+    )
+
+def pool_sizes(workers: int, budget: int, min_size: int, max_size: int,
+               side_connections: int = 0):
+    """Per-worker (min_size, max_size) that keeps all workers within the budget.
+
+    ``side_connections`` are opened by each worker outside its pool and are
+    taken from its share first. A configured max_size below the share is kept.
+    """
+    if budget <= 0:
+        return min_size, max_size
+    per_worker = budget // workers - side_connections
+    if per_worker < 1:
+        raise RuntimeError(
+            f"A budget of {budget} connections cannot serve {workers} workers "
+            f"with {side_connections} connection(s) each outside the pool"
+        )
+    max_size = min(max_size, per_worker)
+    return min(min_size, max_size), max_size
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the bookstore API")
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=config.WORKERS)
+    parser.add_argument("--db-budget", type=int, default=config.DB_CONNECTION_BUDGET,
+                        help="total database connections shared by all workers")
+    parser.add_argument("--replica-db-budget", type=int, default=config.REPLICA_CONNECTION_BUDGET,
+                        help="the same for the read replica, if one is configured")
+    parser.add_argument("--mode", choices=("uvicorn", "gunicorn"), default="uvicorn",
+                        help="uvicorn's own worker supervisor, or gunicorn with UvicornWorker")
+    args = parser.parse_args(argv)
+
+    check_worker_safety(args.workers, config.ALLOW_PROCESS_LOCAL_STATE)
+    min_size, max_size = pool_sizes(
+        args.workers, args.db_budget, config.DB_POOL_MIN_SIZE, config.DB_POOL_MAX_SIZE,
+        SIDE_CONNECTIONS
+    )
+    # The replica lag check uses the replica pool; nothing else connects there
+    replica_min_size, replica_max_size = pool_sizes(
+        args.workers, args.replica_db_budget,
+        config.REPLICA_POOL_MIN_SIZE, config.REPLICA_POOL_MAX_SIZE
+    )
+
+    # Workers read their settings from the environment they inherit
+    os.environ["BOOKSTORE_WORKERS"] = str(args.workers)
+    os.environ["BOOKSTORE_DB_POOL_MIN_SIZE"] = str(min_size)
+    os.environ["BOOKSTORE_DB_POOL_MAX_SIZE"] = str(max_size)
+    os.environ["BOOKSTORE_REPLICA_POOL_MIN_SIZE"] = str(replica_min_size)
+    os.environ["BOOKSTORE_REPLICA_POOL_MAX_SIZE"] = str(replica_max_size)
+    print(f"Starting {args.workers} worker(s), pool size {min_size}-{max_size} per worker")
+    if config.REPLICA_HOST:
+        print(f"Replica pool size {replica_min_size}-{replica_max_size} per worker")
+
+    if args.mode == "gunicorn":
+        os.execvp("gunicorn", [
+            "gunicorn", "main:app",
+            "--worker-class", "uvicorn.workers.UvicornWorker",
+            "--workers", str(args.workers),
+            "--bind", f"{args.host}:{args.port}",
+        ])
+
+    import uvicorn
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,187 +3,197 @@ from typing import Optional, List, Dict
 import asyncpg
 from fastapi import HTTPException
 import json
+from queries import registry
+from idempotency import IdempotencyRecord
+from outbox import record_event
+from queue_events import publish_queue_event
 
 class ReservationService:
     def __init__(self, pool):
         self.pool = pool
-        self.reservation_queues: Dict[int, List[dict]] = {}  # book_id -> list of queued reservations
 
-    async def can_make_reservation(self, customer_id: int, book_id: int, days: int) -> bool:
-        async with self.pool.acquire() as conn:
-            # Check customer subscription status
-            customer = await conn.fetchrow(
-                "SELECT subscription_model, subscription_end_time FROM customers WHERE customer_id = $1",
-                customer_id
+    async def enqueue(self, conn, customer_id: int, book_id: int, days: int) -> int:
+        """Add a request to the book's queue and return its 1-based position"""
+        queue_id = await registry.fetchval(
+            conn, "queue_insert", customer_id, book_id, days
+        )
+        positions = await registry.fetch(
+            conn, "queue_positions", customer_id, book_id
+        )
+        return next(p['position'] for p in positions if p['queue_id'] == queue_id)
+
+    async def queue_positions(self, conn, customer_id: int,
+                              book_id: Optional[int] = None) -> List[dict]:
+        """Queued requests of a customer with their current 1-based positions"""
+        rows = await registry.fetch(conn, "queue_positions", customer_id, book_id)
+        return [dict(row) for row in rows]
+
+    # The checks below run on the caller's connection: taking a second one
+    # from the pool while holding the first can deadlock a busy pool
+    async def can_make_reservation(self, conn, customer_id: int, book_id: int, days: int) -> bool:
+        # Check customer subscription status
+        customer = await registry.fetchrow(
+            conn, "customer_subscription", customer_id
+        )
+        
+        if not customer:
+            raise HTTPException(status_code=404, detail="Customer not found")
+
+        if customer['subscription_model'] == 'free':
+            raise HTTPException(status_code=403, detail="Free users cannot make reservations")
+
+        max_days = 7 if customer['subscription_model'] == 'plus' else 14
+        if days > max_days:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Maximum reservation time for you is {max_days} days"
+            )
+
+        # Check simultaneous reservations
+        current_reservations = await registry.fetch(
+            conn, "active_reservation_count", customer_id
+        )
+        max_simultaneous = 5 if customer['subscription_model'] == 'plus' else 10
+        if current_reservations[0]['count'] >= max_simultaneous:
+            raise HTTPException(
+                status_code=400,
+                detail=f"You cannot reserve more than {max_simultaneous} books simultaneously"
             )
-            
-            if not customer:
-                raise HTTPException(status_code=404, detail="Customer not found")
 
-            if customer['subscription_model'] == 'free':
-                raise HTTPException(status_code=403, detail="Free users cannot make reservations")
+        return True
 
-            max_days = 7 if customer['subscription_model'] == 'plus' else 14
-            if days > max_days:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Maximum reservation time for you is {max_days} days"
-                )
+    async def calculate_price(self, conn, customer_id: int, days: int) -> float:
+        base_price = 1000 * days  # 1000 tomans per day
+        
+        # Check customer discounts
+        customer = await registry.fetchrow(
+            conn, "customer_subscription", customer_id
+        )
 
-            # Check simultaneous reservations
-            current_reservations = await conn.fetch(
+        if customer['subscription_model'] == 'premium':
+            base_price = 2000 * days  # 2000 tomans per day for Premium users
+        
+        if customer['subscription_model'] == 'plus':
+            # Check number of books read in the last month
+            month_books = await conn.fetchval(
                 """
-                SELECT COUNT(*) as count 
+                SELECT COUNT(DISTINCT book_id) 
                 FROM reservations 
-                WHERE customer_id = $1 AND end_time > NOW()
+                WHERE customer_id = $1 
+                AND end_time BETWEEN NOW() - INTERVAL '30 days' AND NOW()
                 """,
                 customer_id
             )
-            max_simultaneous = 5 if customer['subscription_model'] == 'plus' else 10
-            if current_reservations[0]['count'] >= max_simultaneous:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"You cannot reserve more than {max_simultaneous} books simultaneously"
-                )
-
-            return True
+            
+            if month_books >= 3:
+                base_price *= 0.7  # 30% discount
+            
+            # Check amount paid in the last two months
+            total_paid = await conn.fetchval(
+                """
+                SELECT SUM(price) 
+                FROM reservations 
+                WHERE customer_id = $1 
+                AND start_time BETWEEN NOW() - INTERVAL '60 days' AND NOW()
+                """,
+                customer_id
+            )
+            
+            if total_paid and total_paid >= 300000:
+                base_price = 0  # Free
+        
+        return base_price
 
-    async def calculate_price(self, customer_id: int, days: int) -> float:
-        base_price = 1000 * days  # 1000 tomans per day
+    async def _reserve(self, conn, customer_id: int, book_id: int, days: int,
+                       status: str = "instant", event: str = "reservation.created",
+                       idempotency: Optional[IdempotencyRecord] = None) -> dict:
+        """Charge the customer and take one unit of the book in one transaction"""
+        price = await self.calculate_price(conn, customer_id, days)
         
-        async with self.pool.acquire() as conn:
-            # Check customer discounts
-            customer = await conn.fetchrow(
-                "SELECT subscription_model FROM customers WHERE customer_id = $1",
-                customer_id
+        # Check wallet balance
+        wallet = await registry.fetchval(
+            conn, "customer_wallet", customer_id
+        )
+        
+        if wallet < price:
+            raise HTTPException(
+                status_code=400,
+                detail="Insufficient wallet balance"
             )
 
-            if customer['subscription_model'] == 'premium':
-                base_price = 2000 * days  # 2000 tomans per day for Premium users
+        # Create reservation and deduct balance
+        start_time = datetime.now()
+        end_time = start_time + timedelta(days=days)
+        
+        async with conn.transaction():
+            # Guarded decrement: a concurrent request may have taken the last unit
+            units_left = await conn.fetchval(
+                "UPDATE books SET units = units - 1 WHERE book_id = $1 AND units > 0 RETURNING units",
+                book_id
+            )
+            
+            if units_left is None:
+                raise HTTPException(status_code=409, detail="Book is no longer available")
             
-            if customer['subscription_model'] == 'plus':
-                # Check number of books read in the last month
-                month_books = await conn.fetchval(
-                    """
-                    SELECT COUNT(DISTINCT book_id) 
-                    FROM reservations 
-                    WHERE customer_id = $1 
-                    AND end_time BETWEEN NOW() - INTERVAL '30 days' AND NOW()
-                    """,
-                    customer_id
-                )
-                
-                if month_books >= 3:
-                    base_price *= 0.7  # 30% discount
-                
-                # Check amount paid in the last two months
-                total_paid = await conn.fetchval(
-                    """
-                    SELECT SUM(price) 
-                    FROM reservations 
-                    WHERE customer_id = $1 
-                    AND start_time BETWEEN NOW() - INTERVAL '60 days' AND NOW()
-                    """,
-                    customer_id
-                )
-                
-                if total_paid and total_paid >= 300000:
-                    base_price = 0  # Free
+            reservation_id = await conn.fetchval(
+                """
+                INSERT INTO reservations (customer_id, book_id, start_time, end_time, price)
+                VALUES ($1, $2, $3, $4, $5)
+                RETURNING reservation_id
+                """,
+                customer_id, book_id, start_time, end_time, price
+            )
             
-            return base_price
+            await conn.execute(
+                "UPDATE customers SET wallet = wallet - $1 WHERE customer_id = $2",
+                price, customer_id
+            )
 
-    async def create_reservation(self, customer_id: int, book_id: int, days: int):
-        if not await self.can_make_reservation(customer_id, book_id, days):
-            raise HTTPException(status_code=403, detail="Reservation not possible")
+            result = {
+                "reservation_id": reservation_id,
+                "book_id": book_id,
+                "customer_id": customer_id,
+                "start_time": start_time,
+                "end_time": end_time,
+                "price": price,
+                "status": status
+            }
+            await record_event(conn, event, result)
+            if idempotency is not None:
+                await idempotency.save(conn, result)
 
+        return result
+
+    async def create_reservation(self, customer_id: int, book_id: int, days: int,
+                                 idempotency: Optional[IdempotencyRecord] = None):
         async with self.pool.acquire() as conn:
+            if not await self.can_make_reservation(conn, customer_id, book_id, days):
+                raise HTTPException(status_code=403, detail="Reservation not possible")
+
             # Check book availability
-            book = await conn.fetchrow(
-                "SELECT units FROM books WHERE book_id = $1",
-                book_id
+            book = await registry.fetchrow(
+                conn, "book_units", book_id
             )
 
             if not book:
                 raise HTTPException(status_code=404, detail="Book not found")
 
-            if book['units'] > 0:
-                # Instant reservation
-                price = await self.calculate_price(customer_id, days)
-                
-                # Check wallet balance
-                wallet = await conn.fetchval(
-                    "SELECT wallet FROM customers WHERE customer_id = $1",
-                    customer_id
-                )
-                
-                if wallet < price:
-                    raise HTTPException(
-                        status_code=400,
-                        detail="Insufficient wallet balance"
+            # Customers already waiting get a returned unit first, even before
+            # the reservation.ended event has promoted them
+            if book['units'] > 0 and not await registry.fetchval(conn, "queue_waiting", book_id):
+                try:
+                    return await self._reserve(
+                        conn, customer_id, book_id, days, idempotency=idempotency
                     )
+                except HTTPException as e:
+                    if e.status_code != 409:
+                        raise
+                    # A concurrent request took the last unit; wait in line instead
 
-                # Create reservation and deduct balance
-                start_time = datetime.now()
-                end_time = start_time + timedelta(days=days)
-                
-                async with conn.transaction():
-                    reservation_id = await conn.fetchval(
-                        """
-                        INSERT INTO reservations (customer_id, book_id, start_time, end_time, price)
-                        VALUES ($1, $2, $3, $4, $5)
-                        RETURNING reservation_id
-                        """,
-                        customer_id, book_id, start_time, end_time, price
-                    )
-                    
-                    await conn.execute(
-                        "UPDATE books SET units = units - 1 WHERE book_id = $1",
-                        book_id
-                    )
-                    
-                    await conn.execute(
-                        "UPDATE customers SET wallet = wallet - $1 WHERE customer_id = $2",
-                        price, customer_id
-                    )
+            async with conn.transaction():
+                position = await self.enqueue(conn, customer_id, book_id, days)
 
-                return {
-                    "reservation_id": reservation_id,
-                    "book_id": book_id,
-                    "customer_id": customer_id,
-                    "start_time": start_time,
-                    "end_time": end_time,
-                    "price": price,
-                    "status": "instant"
-                }
-            
-            else:
-                # Add to queue
-                customer = await conn.fetchrow(
-                    "SELECT subscription_model FROM customers WHERE customer_id = $1",
-                    customer_id
-                )
-                
-                queue_item = {
-                    "customer_id": customer_id,
-                    "days": days,
-                    "request_time": datetime.now(),
-                    "subscription_type": customer['subscription_model']
-                }
-                
-                if book_id not in self.reservation_queues:
-                    self.reservation_queues[book_id] = []
-                
-                self.reservation_queues[book_id].append(queue_item)
-                self.reservation_queues[book_id].sort(
-                    key=lambda x: (
-                        0 if x['subscription_type'] == 'premium' else 1,
-                        x['request_time']
-                    )
-                )
-                
-                position = self.reservation_queues[book_id].index(queue_item) + 1
-                
-                return {
+                result = {
                     "reservation_id": None,
                     "book_id": book_id,
                     "customer_id": customer_id,
@@ -192,4 +202,73 @@ class ReservationService:
                     "price": None,
                     "status": "queued",
                     "queue_position": position
-                }
\ No newline at end of file
+                }
+                await record_event(conn, "reservation.queued", {
+                    "customer_id": customer_id,
+                    "book_id": book_id,
+                    "days": days,
+                    "queue_position": position
+                })
+                if idempotency is not None:
+                    await idempotency.save(conn, result)
+                await publish_queue_event(conn, {"book_id": book_id})
+
+            # A unit returned after the check above may already have found
+            # the queue empty; nothing else would hand it out
+            units = await registry.fetchval(conn, "book_units", book_id)
+
+        if units > 0:
+            await self.promote_waiting(book_id)
+        return result
+
+    async def promote_waiting(self, book_id: int) -> List[dict]:
+        """Turn queued requests for a book into reservations while units are free.
+
+        Each promotion locks the book row, so concurrent promotions and
+        reservations for the same book take units one at a time. A request
+        whose customer is no longer allowed to reserve, or can no longer
+        pay, is dropped from the queue.
+        """
+        promoted = []
+        async with self.pool.acquire() as conn:
+            while True:
+                async with conn.transaction():
+                    units = await conn.fetchval(
+                        "SELECT units FROM books WHERE book_id = $1 FOR UPDATE",
+                        book_id
+                    )
+                    if not units or units <= 0:
+                        break
+                    head = await registry.fetchrow(conn, "queue_head", book_id)
+                    if head is None:
+                        break
+
+                    await conn.execute(
+                        "DELETE FROM reservation_queue WHERE queue_id = $1",
+                        head['queue_id']
+                    )
+                    try:
+                        await self.can_make_reservation(
+                            conn, head['customer_id'], book_id, head['days']
+                        )
+                        result = await self._reserve(
+                            conn, head['customer_id'], book_id, head['days'],
+                            status="promoted", event="reservation.promoted"
+                        )
+                    except HTTPException as e:
+                        # Committing the delete drops the request
+                        await publish_queue_event(conn, {
+                            "book_id": book_id,
+                            "dropped": [{"customer_id": head['customer_id'], "reason": e.detail}]
+                        })
+                        continue
+
+                    await publish_queue_event(conn, {
+                        "book_id": book_id,
+                        "promoted": [{
+                            "customer_id": head['customer_id'],
+                            "reservation_id": result['reservation_id']
+                        }]
+                    })
+                    promoted.append(result)
+        return promoted
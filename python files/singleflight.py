@@ -0,0 +1,71 @@
+"""Single-flight coalescing for identical concurrent reads.
+
+When several requests ask for the same thing at the same moment, only the
+first one (the leader) runs the query. The others join its in-flight
+future and get the same result object, so callers must treat it as
+read-only. Nothing is cached: the key is forgotten as soon as the query
+finishes, so a call that starts after that runs a fresh query.
+
+The query runs in its own task, so a leader whose client disconnects does
+not cancel the result for everyone who joined it. It also runs with the
+leader's context, including its replica routing. A caller that wrote within
+the read-your-writes window passes ``share=False`` and runs its own query:
+a joined read may have gone to the replica, or started before that write
+committed.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+class SingleFlight:
+    # name -> group, for exporting counters
+    groups: Dict[str, 'SingleFlight'] = {}
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.joins = 0
+        self.unshared = 0
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        SingleFlight.groups[name] = self
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]],
+                 share: bool = True) -> Any:
+        self.calls += 1
+        if not share:
+            self.unshared += 1
+            return await fn()
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.joins += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        self._in_flight.pop(key, None)
+        # Mark the exception as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def report(self) -> dict:
+        return {
+            "calls": self.calls,
+            "joins": self.joins,
+            "unshared": self.unshared,
+            "in_flight": len(self._in_flight)
+        }
+
+    @classmethod
+    def gauges(cls) -> Dict[str, Tuple[str, float]]:
+        """Counters of every group in the shape ``Metrics.render`` expects"""
+        result = {}
+        for name, group in cls.groups.items():
+            prefix = f"bookstore_singleflight_{name}"
+            result[f"{prefix}_calls"] = (f"Calls to single-flight group {name}", group.calls)
+            result[f"{prefix}_joins"] = (f"{name} calls that joined an in-flight query", group.joins)
+            result[f"{prefix}_unshared"] = (
+                f"{name} calls that ran alone after a recent write", group.unshared
+            )
+        return result
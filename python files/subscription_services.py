@@ -3,6 +3,9 @@ import asyncpg
 from datetime import datetime, timedelta
 from typing import Optional
 from decimal import Decimal
+from queries import registry
+from idempotency import IdempotencyRecord, transaction
+from outbox import record_event
 
 class SubscriptionService:
     def __init__(self, pool: asyncpg.Pool):
@@ -14,14 +17,9 @@ class SubscriptionService:
 
     async def get_subscription_info(self, customer_id: int) -> dict:
         """Get customer subscription information"""
-        async with self.pool.acquire() as conn:
-            customer = await conn.fetchrow(
-                """
-                SELECT subscription_model, subscription_end_time, wallet
-                FROM customers 
-                WHERE customer_id = $1
-                """,
-                customer_id
+        async with self.pool.acquire_read() as conn:
+            customer = await registry.fetchrow(
+                conn, "subscription_info", customer_id
             )
             
             if not customer:
@@ -29,7 +27,8 @@ class SubscriptionService:
                 
             return dict(customer)
 
-    async def upgrade_subscription(self, customer_id: int, new_model: str, months: int = 1) -> dict:
+    async def upgrade_subscription(self, customer_id: int, new_model: str, months: int = 1,
+                                   idempotency: Optional[IdempotencyRecord] = None) -> dict:
         """Upgrade or renew subscription"""
         if new_model not in ['plus', 'premium']:
             raise HTTPException(status_code=400, detail="Invalid subscription model")
@@ -76,35 +75,49 @@ class SubscriptionService:
                     new_model, new_end_time, total_price, customer_id
                 )
                 
-                return dict(updated_customer)
+                result = dict(updated_customer)
+                await record_event(conn, "subscription.upgraded", {
+                    "customer_id": customer_id,
+                    "subscription_model": new_model,
+                    "subscription_end_time": new_end_time,
+                    "months": months,
+                    "price": total_price
+                })
+                if idempotency is not None:
+                    await idempotency.save(conn, result)
+                return result
 
-    async def add_wallet_balance(self, customer_id: int, amount: Decimal) -> dict:
+    async def add_wallet_balance(self, customer_id: int, amount: Decimal,
+                                 idempotency: Optional[IdempotencyRecord] = None) -> dict:
         """Increase wallet balance"""
         if amount <= 0:
             raise HTTPException(status_code=400, detail="Amount must be greater than zero")
             
         async with self.pool.acquire() as conn:
-            customer = await conn.fetchrow(
-                """
-                UPDATE customers 
-                SET wallet = wallet + $1
-                WHERE customer_id = $2
-                RETURNING *
-                """,
-                amount, customer_id
-            )
-            
-            if not customer:
-                raise HTTPException(status_code=404, detail="Customer not found")
+            async with transaction(conn, idempotency):
+                customer = await conn.fetchrow(
+                    """
+                    UPDATE customers 
+                    SET wallet = wallet + $1
+                    WHERE customer_id = $2
+                    RETURNING *
+                    """,
+                    amount, customer_id
+                )
                 
-            return dict(customer)
+                if not customer:
+                    raise HTTPException(status_code=404, detail="Customer not found")
+                    
+                result = dict(customer)
+                if idempotency is not None:
+                    await idempotency.save(conn, result)
+                return result
 
     async def get_wallet_balance(self, customer_id: int) -> Decimal:
         """Get wallet balance"""
-        async with self.pool.acquire() as conn:
-            balance = await conn.fetchval(
-                "SELECT wallet FROM customers WHERE customer_id = $1",
-                customer_id
+        async with self.pool.acquire_read() as conn:
+            balance = await registry.fetchval(
+                conn, "customer_wallet", customer_id
             )
             
             if balance is None: